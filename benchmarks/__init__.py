@@ -0,0 +1,6 @@
+"""Benchmarks for the MuSig2 DIDComm protocols.
+
+Run the end-to-end protocol benchmark with:
+
+    python -m benchmarks.protocol_benchmark --participants 3 10 100 1000 --output results.json
+"""
@@ -0,0 +1,150 @@
+"""Microbenchmarks of the MuSig2 primitives used by cohorts and signing sessions.
+
+Warm samples repeat an operation on one fixture after a few discarded
+warmup calls. Cold samples time a single call per newly built fixture, with
+fresh keys, nonces and transaction, and the first of them is the first call
+in the interpreter. Each cold call gets its own copy of the transaction, so
+no sighash midstates are cached by the fixture or an earlier operation. The
+two are reported separately.
+
+buidl uses libsecp256k1 through `buidl.cecc` when it is available and
+falls back to the pure Python `buidl.pecc`. `--compare-backends` runs the
+benchmark once per backend, each in its own interpreter.
+"""
+import argparse
+import importlib.abc
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+from .stats import summarize
+
+
+DEFAULT_SIZES = [2, 5, 10, 50]
+
+
+class _BlockModule(importlib.abc.MetaPathFinder):
+    """Makes a module fail to import, as if it was not installed."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname == self.name:
+            raise ModuleNotFoundError(f"{fullname} blocked by the benchmark", name=fullname)
+        return None
+
+
+def time_call(operation, fixture) -> float:
+    start = time.perf_counter()
+    operation(fixture)
+    return time.perf_counter() - start
+
+
+def run_size(participant_count: int, operations: List[str], repetitions: int, warmup: int, cold_repetitions: int) -> Dict:
+    """Benchmark the operations for one cohort size."""
+    from .crypto_fixture import OPERATIONS, SigningFixture
+
+    cold: Dict[str, List[float]] = {name: [] for name in operations}
+    for _ in range(cold_repetitions):
+        fixture = SigningFixture(participant_count)
+        for name in operations:
+            fixture.fresh_tx()
+            cold[name].append(time_call(OPERATIONS[name], fixture))
+
+    warm: Dict[str, List[float]] = {name: [] for name in operations}
+    fixture = SigningFixture(participant_count)
+    for name in operations:
+        for _ in range(warmup):
+            OPERATIONS[name](fixture)
+        warm[name] = [time_call(OPERATIONS[name], fixture) for _ in range(repetitions)]
+
+    return {
+        "participants": participant_count,
+        "operations": {
+            name: {"cold": summarize(cold[name]), "warm": summarize(warm[name])}
+            for name in operations
+        },
+    }
+
+
+def run_backend(args) -> Dict:
+    """Run every cohort size with the backend selected for this interpreter."""
+    if args.backend == "pure":
+        sys.meta_path.insert(0, _BlockModule("buidl.cecc"))
+    from buidl.ecc import S256Point
+    from .crypto_fixture import OPERATIONS
+
+    operations = args.operations or list(OPERATIONS)
+    unknown = [name for name in operations if name not in OPERATIONS]
+    if unknown:
+        raise ValueError(f"Unknown operations {unknown}. Choose from {list(OPERATIONS)}.")
+
+    results = []
+    for participant_count in args.participants:
+        print(f"Benchmarking {participant_count} participants with the {args.backend} backend", file=sys.stderr)
+        results.append(run_size(participant_count, operations, args.repetitions, args.warmup, args.cold_repetitions))
+    return {
+        "backend": args.backend,
+        "ecc_module": S256Point.__module__,
+        "repetitions": args.repetitions,
+        "warmup": args.warmup,
+        "cold_repetitions": args.cold_repetitions,
+        "results": results,
+    }
+
+
+def run_isolated(backend: str, args) -> Dict:
+    """Run the benchmark for one backend in a fresh interpreter."""
+    command = [
+        sys.executable, "-m", "benchmarks.crypto_benchmark",
+        "--participants", *[str(n) for n in args.participants],
+        "--repetitions", str(args.repetitions),
+        "--warmup", str(args.warmup),
+        "--cold-repetitions", str(args.cold_repetitions),
+        "--backend", backend,
+        "--single",
+    ]
+    if args.operations:
+        command += ["--operations", *args.operations]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, check=True)
+    return json.loads(completed.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MuSig2 primitive microbenchmarks")
+    parser.add_argument("--participants", type=int, nargs="+", default=DEFAULT_SIZES, help="Cohort sizes to benchmark")
+    parser.add_argument("--operations", nargs="+", help="Operations to benchmark, all by default")
+    parser.add_argument("--repetitions", type=int, default=50, help="Timed warm calls per operation")
+    parser.add_argument("--warmup", type=int, default=3, help="Discarded calls before the warm samples")
+    parser.add_argument("--cold-repetitions", type=int, default=5, help="Fresh fixtures timed per cohort size")
+    parser.add_argument("--backend", choices=["auto", "pure"], default="auto", help="auto uses libsecp256k1 when buidl can load it")
+    parser.add_argument("--compare-backends", action="store_true", help="Run with both backends, each in its own interpreter")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_backend(args)))
+        return
+
+    backends = ["auto", "pure"] if args.compare_backends else [args.backend]
+    report = {
+        "benchmark": "crypto",
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backends": [run_isolated(backend, args) for backend in backends],
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
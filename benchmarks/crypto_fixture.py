@@ -0,0 +1,75 @@
+import secrets
+from typing import Callable, Dict
+from buidl.ecc import N, PrivateKey
+from buidl.taproot import MuSigTapScript
+from buidl.tx import SIGHASH_DEFAULT
+from musig2_protocols.protocols.keygen.models.cohort import Musig2Cohort
+from musig2_protocols.protocols.sign.models.signature_authorization import AWAITING_PARTIAL_SIGNATURES
+
+
+class SigningFixture:
+    """A finalized cohort with a signing session carried through to a verified signature.
+
+    Every intermediate value of the session is kept so each MuSig2 step can be
+    timed in isolation with realistic inputs.
+    """
+
+    def __init__(self, participant_count: int, btc_network: str = "signet"):
+        """Build the cohort and run the signing session.
+
+        Args:
+            participant_count: The number of cohort participants
+            btc_network: The Bitcoin network of the cohort
+        """
+        self.private_keys = [PrivateKey(secrets.randbelow(N - 1) + 1) for _ in range(participant_count)]
+        self.cohort = Musig2Cohort(min_participants=participant_count, btc_network=btc_network)
+        for i, private_key in enumerate(self.private_keys):
+            self.cohort.add_participant(f"did:example:participant-{i}", private_key.point)
+        self.cohort.finalize_cohort()
+
+        self.session = self.cohort.start_signing_session()
+        self.musig = self.session.get_musig_script()
+        self.merkle_root = self.session.get_merkle_root()
+        self.sig_hash = self.session.pending_tx.sig_hash(0, SIGHASH_DEFAULT)
+
+        self.nonces = [self.musig.generate_nonces() for _ in self.private_keys]
+        for participant, (_, nonce_points) in zip(self.cohort.participants, self.nonces):
+            self.session.add_nonce_contribution(participant, [point.sec().hex() for point in nonce_points])
+        self.aggregated_nonce = self.session.generate_aggregated_nonce()
+        self.session.status = AWAITING_PARTIAL_SIGNATURES
+
+        self.r = self.musig.compute_r(self.aggregated_nonce, self.sig_hash)
+        self.ks = [self.musig.compute_k(nonce_secrets, self.aggregated_nonce, self.sig_hash) for nonce_secrets, _ in self.nonces]
+        self.partial_signatures = [
+            self.musig.sign(private_key, k, self.r, self.sig_hash, self.merkle_root)
+            for private_key, k in zip(self.private_keys, self.ks)
+        ]
+        for participant, partial_signature in zip(self.cohort.participants, self.partial_signatures):
+            self.session.add_partial_signature(participant, partial_signature)
+        self.s_sum = sum(self.partial_signatures)
+        # Finalizes the key path witness and verifies the transaction
+        self.signature = self.session.generate_final_signature()
+        self.fresh_tx()
+
+    def fresh_tx(self):
+        """Replace `tx` with a copy of the signed transaction without buidl's cached sighash midstates.
+
+        Building the fixture hashed and verified `session.pending_tx`, so
+        timing it would measure the cached path.
+        """
+        self.tx = self.session.pending_tx.clone()
+
+
+# Operations timed by the crypto benchmark, each a single call on a fixture
+OPERATIONS: Dict[str, Callable[[SigningFixture], object]] = {
+    "tap_root_multisig_address": lambda f: f.cohort.calculate_beacon_address(),
+    "musig_key_aggregation": lambda f: MuSigTapScript(f.cohort.cohort_keys),
+    "generate_nonces": lambda f: f.musig.generate_nonces(),
+    "nonce_sums": lambda f: f.musig.nonce_sums([nonce_points for _, nonce_points in f.nonces]),
+    "compute_r": lambda f: f.musig.compute_r(f.aggregated_nonce, f.sig_hash),
+    "compute_k": lambda f: f.musig.compute_k(f.nonces[0][0], f.aggregated_nonce, f.sig_hash),
+    "sign": lambda f: f.musig.sign(f.private_keys[0], f.ks[0], f.r, f.sig_hash, f.merkle_root),
+    "get_signature": lambda f: f.musig.get_signature(f.s_sum, f.r, f.sig_hash, f.merkle_root),
+    "sig_hash": lambda f: f.tx.sig_hash(0, SIGHASH_DEFAULT),
+    "verify": lambda f: f.tx.verify(),
+}
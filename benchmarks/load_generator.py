@@ -0,0 +1,635 @@
+"""Load generator hosting many virtual participants in one process.
+
+Virtual participants share one DIDCommService, one listener and one copy of
+each cohort, and keep only their DID, cohort keys, nonces and pending
+requests. They run the real protocol against a coordinator: subscribe,
+opt in to cohort adverts, validate cohort sets, request signatures,
+contribute nonces and partial signatures.
+
+The coordinator is in-process by default, connected over the loopback
+transport or localhost websockets. It can also be a coordinator in another
+process or host, given by its DID, for example one started with
+`--role coordinator`. In-process results include the virtual participants'
+CPU, so use a separate coordinator process to size coordinator hardware.
+
+Subscribers join at a configured rate, then signature requests are sent at
+each rate in turn. Each step reports request throughput and latency, and for
+an in-process coordinator, messages handled, sessions finished and signing
+round latency. Failures are injected with faulty participants, which stop
+answering signing sessions, and dropped messages. Latency is injected
+before each message is handled.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import secrets
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from buidl.ecc import N, PrivateKey, S256Point
+from buidl.tx import Tx
+from musig2_protocols.beacon_coordinator import BeaconCoordinator
+from musig2_protocols.didcomm_service import DIDCommService
+from musig2_protocols.log import DEBUG, configure_logging, shutdown_logging
+from musig2_protocols.messaging import HEX_ENCODING, SUPPORTED_ENCODINGS
+from musig2_protocols.protocols.keygen.message_types import SUBSCRIBE, SUBSCRIBE_ACCEPT, COHORT_ADVERT, OPT_IN, COHORT_SET
+from musig2_protocols.protocols.keygen.messages.cohort_advert import CohortAdvertMessage
+from musig2_protocols.protocols.keygen.messages.cohort_set import CohortSetMessage
+from musig2_protocols.protocols.keygen.messages.opt_in import CohortOptInMessage
+from musig2_protocols.protocols.keygen.messages.subscribe import SubscribeMessage
+from musig2_protocols.protocols.keygen.messages.subscribe_accept import SubscribeAcceptMessage
+from musig2_protocols.protocols.keygen.models.cohort import Musig2Cohort, COHORT_SET_STATUS
+from musig2_protocols.protocols.sign.message_types import REQUEST_SIGNATURE, AUTHORIZATION_REQUEST, NONCE_CONTRIBUTION, AGGREGATED_NONCE, SIGNATURE_AUTHORIZATION
+from musig2_protocols.protocols.sign.messages.aggregated_nonce import AggregatedNonceMessage
+from musig2_protocols.protocols.sign.messages.authorization_request import AuthorizationRequestMessage
+from musig2_protocols.protocols.sign.messages.nonce_contribution import NonceContributionMessage
+from musig2_protocols.protocols.sign.messages.request_signature import RequestSignatureMessage
+from musig2_protocols.protocols.sign.messages.signature_authorization import SignatureAuthorizationMessage
+from musig2_protocols.protocols.sign.models.signature_authorization import SignatureAuthorizationSession, SIGNATURE_COMPLETE
+from musig2_protocols.signing_scheduler import BatchWindow
+from .loopback import LoopbackNetwork
+from .stats import Stage, peak_rss_bytes, summarize
+
+
+COORDINATOR_MESSAGE_TYPES = [SUBSCRIBE, OPT_IN, REQUEST_SIGNATURE, NONCE_CONTRIBUTION, SIGNATURE_AUTHORIZATION]
+
+
+class LoadProfile:
+    """The load applied by the generator."""
+
+    def __init__(
+        self,
+        subscribers: int = 1000,
+        join_rate: float = 500,
+        cohorts: int = 10,
+        cohort_size: int = 10,
+        threshold: int = None,
+        overjoin: float = 2.0,
+        request_rates: List[float] = None,
+        step_duration: float = 10,
+        faulty_fraction: float = 0.0,
+        drop_rate: float = 0.0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        encoding: str = HEX_ENCODING,
+        request_timeout: float = 60,
+    ):
+        """Initialize a load profile.
+
+        Args:
+            subscribers: Virtual participants subscribing to the coordinator
+            join_rate: Subscriptions sent per second
+            cohorts: Cohorts announced by the coordinator
+            cohort_size: Participants per cohort
+            threshold: k of the cohorts' k-of-n fallback leaves, so sessions survive faulty participants (optional)
+            overjoin: Participants opting in to each advert, as a multiple of the cohort size
+            request_rates: Signature requests per second, one load step per rate
+            step_duration: Seconds each load step lasts
+            faulty_fraction: Fraction of participants that join cohorts but never answer signing sessions
+            drop_rate: Probability that a message to a virtual participant is dropped
+            latency: Mean seconds added before a virtual participant handles a message
+            jitter: Standard deviation of the added latency, in seconds
+            encoding: Encoding profile the virtual participants advertise for binary fields
+            request_timeout: Seconds after which an unsigned request is given up, so its participant can send another
+        """
+        if not 0 <= faulty_fraction <= 1 or not 0 <= drop_rate <= 1:
+            raise ValueError("faulty_fraction and drop_rate must be between 0 and 1.")
+        if overjoin < 1:
+            raise ValueError("overjoin must be at least 1, otherwise cohorts cannot form.")
+        if request_timeout <= 0:
+            raise ValueError("request_timeout must be positive.")
+        if encoding not in SUPPORTED_ENCODINGS:
+            raise ValueError(f"Unsupported encoding {encoding}.")
+        self.subscribers = subscribers
+        self.join_rate = join_rate
+        self.cohorts = cohorts
+        self.cohort_size = cohort_size
+        self.threshold = threshold
+        self.overjoin = overjoin
+        self.request_rates = request_rates or [10, 50, 100]
+        self.step_duration = step_duration
+        self.faulty_fraction = faulty_fraction
+        self.drop_rate = drop_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.encoding = encoding
+        self.request_timeout = request_timeout
+
+
+class VirtualParticipant:
+    """The state one participant needs to take part in cohorts. Cohorts themselves are shared by the host."""
+
+    __slots__ = ("did", "faulty", "subscribed_at", "keys", "sessions", "pending")
+
+    def __init__(self, did: str, faulty: bool):
+        self.did = did
+        self.faulty = faulty
+        self.subscribed_at: Optional[float] = None
+        # Cohort key by cohort id
+        self.keys: Dict[str, PrivateKey] = {}
+        # Signing session by cohort id
+        self.sessions: Dict[str, SignatureAuthorizationSession] = {}
+        # (data, sent at, load step) of the pending signature request by cohort id
+        self.pending: Dict[str, Tuple[str, float, int]] = {}
+
+
+class LoadRecorder:
+    """Collects the samples of each load step."""
+
+    def __init__(self):
+        self.step = 0
+        self.subscribe_latencies: List[float] = []
+        self.requests_sent: Dict[int, int] = defaultdict(int)
+        self.requests_skipped: Dict[int, int] = defaultdict(int)
+        self.requests_expired: Dict[int, int] = defaultdict(int)
+        self.included: Dict[int, List[float]] = defaultdict(list)
+        self.signed: Dict[int, List[float]] = defaultdict(list)
+        self.coordinator_messages = 0
+        self.sessions_completed: Dict[int, int] = defaultdict(int)
+        self.sessions_failed: Dict[int, int] = defaultdict(int)
+        self.rounds: Dict[int, List[float]] = defaultdict(list)
+        self.loop_lag: Dict[int, List[float]] = defaultdict(list)
+
+    async def sample_loop_lag(self, interval: float = 0.05):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag[self.step].append(max(0.0, loop.time() - scheduled))
+
+
+class MeasuredCoordinator(BeaconCoordinator):
+    """In-process coordinator that reports finished signing sessions to the recorder."""
+
+    recorder: LoadRecorder = None
+
+    def _record_session_finished(self, signing_session, failure_reason=None):
+        super()._record_session_finished(signing_session, failure_reason)
+        if self.recorder is not None:
+            step = self.recorder.step
+            if signing_session.status == SIGNATURE_COMPLETE:
+                self.recorder.sessions_completed[step] += 1
+            else:
+                self.recorder.sessions_failed[step] += 1
+            self.recorder.rounds[step].append(time.monotonic() - signing_session.created_at)
+
+    def watch(self, recorder: LoadRecorder):
+        """Count the messages the coordinator receives."""
+        self.recorder = recorder
+
+        async def count(message, contact_context, thread_context):
+            recorder.coordinator_messages += 1
+        for message_type in COORDINATOR_MESSAGE_TYPES:
+            self.didcomm.register_message_handler(message_type, count)
+
+
+class CohortDriver:
+    """Announces cohorts once enough participants have subscribed. Sessions are started by a batch window."""
+
+    def __init__(self, coordinator: BeaconCoordinator, cohorts: int, cohort_size: int, threshold: int = None, batch_window: BatchWindow = None, announce_interval: float = 0.1):
+        """Initialize the driver.
+
+        Args:
+            coordinator: The coordinator announcing the cohorts
+            cohorts: The number of cohorts to announce
+            cohort_size: Participants per cohort
+            threshold: k of the cohorts' k-of-n fallback leaves (optional)
+            batch_window: Window starting the cohorts' signing sessions, set as the scheduler default
+            announce_interval: Seconds between cohort announcements
+        """
+        self.coordinator = coordinator
+        self.cohorts = cohorts
+        self.cohort_size = cohort_size
+        self.threshold = threshold
+        self.announce_interval = announce_interval
+        if batch_window is not None:
+            coordinator.signing_scheduler.default_window = batch_window
+
+    async def run(self, min_subscribers: int):
+        """Announce the cohorts, waiting until `min_subscribers` participants have subscribed."""
+        while len(self.coordinator.subscribers) < max(min_subscribers, self.cohort_size):
+            await asyncio.sleep(0.05)
+        for _ in range(self.cohorts):
+            await self.coordinator.announce_new_cohort(min_participants=self.cohort_size, threshold=self.threshold)
+            await asyncio.sleep(self.announce_interval)
+
+
+class VirtualParticipantHost:
+    """Hosts many virtual participants behind one DIDCommService, dispatching messages by recipient DID."""
+
+    def __init__(self, profile: LoadProfile, recorder: LoadRecorder, name: str = "VirtualParticipants", host: str = "localhost", port: int = 8770):
+        """Initialize the host.
+
+        Args:
+            profile: The injected failures, latency and cohort membership
+            recorder: Receives the latency samples
+            name: Agent name of the shared DIDCommService
+            host: Host of the shared listener, part of every virtual participant's DID
+            port: Port of the shared listener
+        """
+        self.profile = profile
+        self.recorder = recorder
+        self.didcomm = DIDCommService(name, host, port)
+        self.participants: Dict[str, VirtualParticipant] = {}
+        self.subscribed: List[VirtualParticipant] = []
+        self.coordinator_did: Optional[str] = None
+        # Encoding profile the coordinator accepted
+        self.encoding = HEX_ENCODING
+        # Cohorts are identical for all members, so each is validated once and shared
+        self.cohorts: Dict[str, Musig2Cohort] = {}
+        self.members: Dict[str, List[VirtualParticipant]] = defaultdict(list)
+        # Participants chosen to opt in to each advertised cohort
+        self._opt_ins: Dict[str, Set[str]] = {}
+        self._cohort_set_waiters: List[Tuple[int, asyncio.Future]] = []
+
+        for message_type, handler in [
+            (SUBSCRIBE_ACCEPT, self._handle_subscribe_accept),
+            (COHORT_ADVERT, self._handle_cohort_advert),
+            (COHORT_SET, self._handle_cohort_set),
+            (AUTHORIZATION_REQUEST, self._handle_authorization_request),
+            (AGGREGATED_NONCE, self._handle_aggregated_nonce),
+        ]:
+            self.didcomm.register_message_handler(message_type, self._dispatch(handler))
+
+    async def add_participants(self, count: int):
+        """Generate the virtual participants' DIDs and keys."""
+        for _ in range(count):
+            did = await self.didcomm.generate_did()
+            self.participants[did] = VirtualParticipant(did, random.random() < self.profile.faulty_fraction)
+
+    def _dispatch(self, handler):
+        async def dispatch(message, contact_context, thread_context):
+            participant = self.participants.get(message.to)
+            if participant is None:
+                return
+            if self.profile.drop_rate and random.random() < self.profile.drop_rate:
+                return
+            if self.profile.latency or self.profile.jitter:
+                await asyncio.sleep(max(0.0, random.gauss(self.profile.latency, self.profile.jitter)))
+            await handler(participant, message)
+        dispatch.__qualname__ = f"{type(self).__name__}.{handler.__name__}"
+        return dispatch
+
+    async def subscribe(self, coordinator_did: str, join_rate: float):
+        """Subscribe every virtual participant to the coordinator at `join_rate` per second."""
+        self.coordinator_did = coordinator_did
+        start = time.perf_counter()
+        for i, participant in enumerate(self.participants.values()):
+            # Paced from the start time so slow sends do not lower the rate
+            delay = start + i / join_rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            participant.subscribed_at = time.perf_counter()
+            msg = SubscribeMessage(to=coordinator_did, frm=participant.did, encodings=[self.profile.encoding])
+            await self.didcomm.send_message(msg.to_dict(), coordinator_did, participant.did)
+
+    async def wait_for_cohorts(self, count: int, timeout: float):
+        """Wait until `count` cohorts are set."""
+        if self._cohorts_set() >= count:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._cohort_set_waiters.append((count, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Only {self._cohorts_set()} of {count} cohorts were set within {timeout}s.")
+
+    def _cohorts_set(self) -> int:
+        return sum(1 for cohort in self.cohorts.values() if cohort.status == COHORT_SET_STATUS)
+
+    def ready_requests(self) -> List[Tuple[VirtualParticipant, str]]:
+        """Healthy members of set cohorts without a pending signature request.
+
+        Requests pending for longer than the profile's request timeout, for
+        example of sessions that failed or lost a message, are given up and
+        counted as expired for the step that sent them.
+        """
+        expired_before = time.perf_counter() - self.profile.request_timeout
+        ready = []
+        for cohort_id, members in self.members.items():
+            if self.cohorts[cohort_id].status != COHORT_SET_STATUS:
+                continue
+            for participant in members:
+                if participant.faulty:
+                    continue
+                pending = participant.pending.get(cohort_id)
+                if pending is not None and pending[1] < expired_before:
+                    del participant.pending[cohort_id]
+                    participant.sessions.pop(cohort_id, None)
+                    self.recorder.requests_expired[pending[2]] += 1
+                    pending = None
+                if pending is None:
+                    ready.append((participant, cohort_id))
+        return ready
+
+    async def request_signature(self, participant: VirtualParticipant, cohort_id: str):
+        data = secrets.token_hex(16)
+        participant.pending[cohort_id] = (data, time.perf_counter(), self.recorder.step)
+        msg = RequestSignatureMessage(to=self.cohorts[cohort_id].coordinator_did, frm=participant.did, thread_id=None, cohort_id=cohort_id, data=data)
+        await self.didcomm.send_message(msg.to_dict(), msg.to, participant.did)
+
+    async def _handle_subscribe_accept(self, participant: VirtualParticipant, message: SubscribeAcceptMessage):
+        if self.profile.encoding in (message.encodings or ()):
+            self.encoding = self.profile.encoding
+        if participant.subscribed_at is not None:
+            self.recorder.subscribe_latencies.append(time.perf_counter() - participant.subscribed_at)
+            participant.subscribed_at = None
+            self.subscribed.append(participant)
+
+    async def _handle_cohort_advert(self, participant: VirtualParticipant, advert: CohortAdvertMessage):
+        if advert.frm != self.coordinator_did:
+            return
+        chosen = self._opt_ins.get(advert.cohort_id)
+        if chosen is None:
+            # Pick the participants opting in on the first advert, so each cohort gets overjoin x size opt-ins
+            self.cohorts[advert.cohort_id] = Musig2Cohort(
+                id=advert.cohort_id, btc_network=advert.btc_network, coordinator_did=advert.frm, beacon_type=advert.beacon_type, threshold=advert.threshold
+            )
+            opt_in_count = min(len(self.subscribed), round(advert.cohort_size * self.profile.overjoin))
+            chosen = self._opt_ins[advert.cohort_id] = {p.did for p in random.sample(self.subscribed, opt_in_count)}
+        if participant.did not in chosen:
+            return
+        key = PrivateKey(secrets.randbelow(N - 1) + 1)
+        participant.keys[advert.cohort_id] = key
+        msg = CohortOptInMessage(to=advert.frm, frm=participant.did, cohort_id=advert.cohort_id, thread_id=None, participant_pk=key.point.sec().hex())
+        await self.didcomm.send_message(msg.to_dict(self.encoding), advert.frm, participant.did)
+
+    async def _handle_cohort_set(self, participant: VirtualParticipant, cohort_set: CohortSetMessage):
+        cohort = self.cohorts.get(cohort_set.cohort_id)
+        key = participant.keys.get(cohort_set.cohort_id)
+        if cohort is None or key is None:
+            return
+        if key.point.sec().hex() not in cohort_set.cohort_keys:
+            raise ValueError(f"Cohort {cohort.id} does not contain the key of {participant.did}.")
+        if cohort.status != COHORT_SET_STATUS:
+            cohort.validate_cohort([], cohort_set.cohort_keys, cohort_set.beacon_address)
+        self.members[cohort.id].append(participant)
+        for waiter in list(self._cohort_set_waiters):
+            count, future = waiter
+            if self._cohorts_set() >= count:
+                self._cohort_set_waiters.remove(waiter)
+                if not future.done():
+                    future.set_result(None)
+
+    async def _handle_authorization_request(self, participant: VirtualParticipant, request: AuthorizationRequestMessage):
+        if participant.faulty:
+            return
+        cohort = self.cohorts.get(request.cohort_id)
+        if cohort is None or request.cohort_id not in participant.keys:
+            return
+        pending = participant.pending.get(cohort.id)
+        # Without an SMT proof every pending request is in the session
+        if pending is not None and (request.smt_proof is None or request.smt_proof.get("value") is not None):
+            self.recorder.included[pending[2]].append(time.perf_counter() - pending[1])
+        signing_session = SignatureAuthorizationSession(cohort=cohort, id=request.session_id, pending_tx=Tx.parse_hex(request.pending_tx, network=cohort.btc_network))
+        nonce_secrets, nonce_points = cohort.get_cohort_musig2_script().generate_nonces()
+        signing_session.set_nonce_secrets(nonce_secrets)
+        participant.sessions[cohort.id] = signing_session
+        msg = NonceContributionMessage(
+            to=cohort.coordinator_did,
+            frm=participant.did,
+            session_id=signing_session.id,
+            cohort_id=cohort.id,
+            nonce_contribution=[point.sec().hex() for point in nonce_points],
+        )
+        await self.didcomm.send_message(msg.to_dict(self.encoding), cohort.coordinator_did, participant.did)
+
+    async def _handle_aggregated_nonce(self, participant: VirtualParticipant, aggregated_nonce_msg: AggregatedNonceMessage):
+        if participant.faulty:
+            return
+        signing_session = participant.sessions.pop(aggregated_nonce_msg.cohort_id, None)
+        if signing_session is None or signing_session.id != aggregated_nonce_msg.session_id:
+            return
+        cohort = signing_session.cohort
+        key = participant.keys[cohort.id]
+        signing_session.set_aggregated_nonce([S256Point.parse(bytes.fromhex(nonce)) for nonce in aggregated_nonce_msg.aggregated_nonce])
+        if aggregated_nonce_msg.signer_keys is not None:
+            if key.point.sec().hex() not in aggregated_nonce_msg.signer_keys:
+                return
+            signing_session.use_script_path([S256Point.parse(bytes.fromhex(signer_key)) for signer_key in aggregated_nonce_msg.signer_keys])
+        partial_signature = signing_session.generate_partial_signature(key)
+        msg = SignatureAuthorizationMessage(
+            to=cohort.coordinator_did,
+            frm=participant.did,
+            cohort_id=cohort.id,
+            session_id=signing_session.id,
+            partial_signature=partial_signature,
+        )
+        await self.didcomm.send_message(msg.to_dict(self.encoding), cohort.coordinator_did, participant.did)
+        pending = participant.pending.pop(cohort.id, None)
+        if pending is not None:
+            self.recorder.signed[pending[2]].append(time.perf_counter() - pending[1])
+
+
+async def send_requests(host: VirtualParticipantHost, rate: float, duration: float):
+    """Send signature requests at `rate` per second from random ready participants."""
+    recorder = host.recorder
+    start = time.perf_counter()
+    sent = 0
+    while True:
+        due = start + sent / rate
+        if due - start >= duration:
+            return
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        sent += 1
+        ready = host.ready_requests()
+        if not ready:
+            # Every healthy member already has a request in flight
+            recorder.requests_skipped[recorder.step] += 1
+            continue
+        await host.request_signature(*random.choice(ready))
+        recorder.requests_sent[recorder.step] += 1
+
+
+async def run_load(profile: LoadProfile, transport: str = "loopback", coordinator_did: str = None, host: str = "localhost", base_port: int = 8770, batch_window: BatchWindow = None, setup_timeout: float = 300, drain: float = 5) -> Dict:
+    """Subscribe the virtual participants, form cohorts and step through the request rates."""
+    recorder = LoadRecorder()
+    participants = VirtualParticipantHost(profile, recorder, host=host, port=base_port + 1)
+    coordinator = None
+    tasks = []
+    actors = [participants]
+    if coordinator_did is None:
+        coordinator = await MeasuredCoordinator.create(name="Coordinator", host=host, port=base_port)
+        coordinator.watch(recorder)
+        coordinator_did = coordinator.did
+        actors.append(coordinator)
+    if transport == "loopback":
+        network = LoopbackNetwork()
+        for actor in actors:
+            network.attach(actor.didcomm)
+    else:
+        tasks.append(asyncio.create_task(participants.didcomm.start_websocket_connection()))
+        if coordinator is not None:
+            tasks.append(asyncio.create_task(coordinator.didcomm.start_websocket_connection()))
+        # Give the servers time to start up
+        await asyncio.sleep(1)
+    tasks.append(asyncio.create_task(recorder.sample_loop_lag()))
+
+    try:
+        generate_start = time.perf_counter()
+        await participants.add_participants(profile.subscribers)
+        generate_s = time.perf_counter() - generate_start
+
+        with Stage("setup", lambda: recorder.coordinator_messages) as setup:
+            if coordinator is not None:
+                driver = CohortDriver(coordinator, profile.cohorts, profile.cohort_size, profile.threshold, batch_window)
+                tasks.append(asyncio.create_task(driver.run(profile.subscribers)))
+            await participants.subscribe(coordinator_did, profile.join_rate)
+            await participants.wait_for_cohorts(profile.cohorts, setup_timeout)
+
+        steps = []
+        for step, rate in enumerate(profile.request_rates, start=1):
+            recorder.step = step
+            with Stage(f"rate {rate}", lambda: recorder.coordinator_messages) as stage:
+                await send_requests(participants, rate, profile.step_duration)
+            steps.append((rate, stage))
+        # Requests still in flight are credited to the step that sent them
+        await asyncio.sleep(drain)
+    finally:
+        for task in tasks:
+            task.cancel()
+        for actor in actors:
+            await actor.didcomm.cleanup()
+            await actor.didcomm.scheduler.close()
+
+    in_process = coordinator is not None
+    return {
+        "subscribers": profile.subscribers,
+        "cohorts": profile.cohorts,
+        "cohort_size": profile.cohort_size,
+        "threshold": profile.threshold,
+        "faulty_fraction": profile.faulty_fraction,
+        "drop_rate": profile.drop_rate,
+        "latency_ms": profile.latency * 1000,
+        "jitter_ms": profile.jitter * 1000,
+        "encoding": profile.encoding,
+        "transport": transport,
+        "coordinator": "in-process" if in_process else coordinator_did,
+        "did_generation_s": round(generate_s, 6),
+        "setup": {
+            **setup.to_dict(),
+            "subscribed": len(participants.subscribed),
+            "subscribe": summarize(recorder.subscribe_latencies),
+            "event_loop_lag": summarize(recorder.loop_lag[0]),
+        },
+        "steps": [step_report(recorder, step, rate, stage, in_process) for step, (rate, stage) in enumerate(steps, start=1)],
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+
+def step_report(recorder: LoadRecorder, step: int, rate: float, stage: Stage, in_process: bool) -> Dict:
+    report = {
+        "target_rate": rate,
+        "requests_sent": recorder.requests_sent[step],
+        "requests_skipped": recorder.requests_skipped[step],
+        "requests_expired": recorder.requests_expired[step],
+        "requests_per_s": round(recorder.requests_sent[step] / stage.wall_s, 1),
+        "signed_per_s": round(len(recorder.signed[step]) / stage.wall_s, 1),
+        "included": summarize(recorder.included[step]),
+        "signed": summarize(recorder.signed[step]),
+        "cpu_s": round(stage.cpu_s, 6),
+        "event_loop_lag": summarize(recorder.loop_lag[step]),
+    }
+    if in_process:
+        report["coordinator"] = {
+            "messages": stage.messages,
+            "messages_per_s": round(stage.messages / stage.wall_s, 1),
+            "sessions_completed": recorder.sessions_completed[step],
+            "sessions_failed": recorder.sessions_failed[step],
+            "signing_round": summarize(recorder.rounds[step]),
+        }
+    return report
+
+
+async def serve_coordinator(args):
+    """Run a coordinator for load generators in other processes, announcing cohorts once they subscribe."""
+    coordinator = await BeaconCoordinator.create(name="Coordinator", host=args.host, port=args.base_port)
+    driver = CohortDriver(coordinator, args.cohorts, args.cohort_size, args.threshold, batch_window(args))
+    print(coordinator.did, flush=True)
+    await asyncio.gather(coordinator.start(metrics_port=args.metrics_port), driver.run(args.subscribers))
+
+
+def batch_window(args) -> BatchWindow:
+    return BatchWindow(max_delay=args.batch_delay, max_batch_size=args.max_batch_size, nonce_deadline=args.nonce_deadline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load a MuSig2 coordinator with many virtual participants")
+    parser.add_argument("--role", choices=["load", "coordinator"], default="load", help="Generate load, or serve a coordinator for load generators in other processes")
+    parser.add_argument("--subscribers", type=int, default=1000, help="Virtual participants, or subscribers to wait for before announcing cohorts")
+    parser.add_argument("--join-rate", type=float, default=500, help="Subscriptions per second")
+    parser.add_argument("--cohorts", type=int, default=10, help="Cohorts to announce")
+    parser.add_argument("--cohort-size", type=int, default=10, help="Participants per cohort")
+    parser.add_argument("--threshold", type=int, help="k of k-of-n fallback leaves, lets sessions finish without faulty participants")
+    parser.add_argument("--overjoin", type=float, default=2.0, help="Opt-ins per advert, as a multiple of the cohort size")
+    parser.add_argument("--request-rates", type=float, nargs="+", default=[10, 50, 100], help="Signature requests per second, one step each")
+    parser.add_argument("--step-duration", type=float, default=10, help="Seconds per request rate")
+    parser.add_argument("--request-timeout", type=float, default=60, help="Seconds after which an unsigned request is given up and its participant can send another")
+    parser.add_argument("--drain", type=float, default=5, help="Seconds to wait for in-flight requests after the last step")
+    parser.add_argument("--faulty-fraction", type=float, default=0.0, help="Fraction of participants that never answer signing sessions")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Probability of dropping a message to a virtual participant")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean latency added before a virtual participant handles a message")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Standard deviation of the added latency")
+    parser.add_argument("--batch-delay", type=float, default=0.5, help="Seconds a cohort batches requests before starting a session")
+    parser.add_argument("--max-batch-size", type=int, help="Most requests in one signing session")
+    parser.add_argument("--nonce-deadline", type=float, help="Seconds to wait for nonces before the k-of-n fallback")
+    parser.add_argument("--encoding", choices=SUPPORTED_ENCODINGS, default=HEX_ENCODING, help="Encoding profile of nonces, signatures and transactions the virtual participants advertise")
+    parser.add_argument("--transport", choices=["loopback", "websocket"], default="loopback", help="In-process loopback or websockets")
+    parser.add_argument("--coordinator-did", help="DID of a coordinator in another process, in-process by default")
+    parser.add_argument("--host", default="localhost", help="Host the listeners bind to and advertise in their DIDs")
+    parser.add_argument("--base-port", type=int, default=8770, help="Coordinator port, the virtual participants listen on the next port")
+    parser.add_argument("--metrics-port", type=int, help="Serve the coordinator's Prometheus metrics on this port (coordinator role)")
+    parser.add_argument("--setup-timeout", type=float, default=300, help="Seconds to wait for the cohorts to be set")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="Log protocol messages to stderr")
+    args = parser.parse_args()
+
+    if args.verbose:
+        configure_logging(DEBUG)
+    try:
+        if args.role == "coordinator":
+            asyncio.run(serve_coordinator(args))
+            return
+        if args.coordinator_did is not None and args.transport != "websocket":
+            parser.error("--coordinator-did needs --transport websocket")
+        profile = LoadProfile(
+            subscribers=args.subscribers,
+            join_rate=args.join_rate,
+            cohorts=args.cohorts,
+            cohort_size=args.cohort_size,
+            threshold=args.threshold,
+            overjoin=args.overjoin,
+            request_rates=args.request_rates,
+            step_duration=args.step_duration,
+            faulty_fraction=args.faulty_fraction,
+            drop_rate=args.drop_rate,
+            latency=args.latency_ms / 1000,
+            jitter=args.jitter_ms / 1000,
+            encoding=args.encoding,
+            request_timeout=args.request_timeout,
+        )
+        result = asyncio.run(run_load(profile, args.transport, args.coordinator_did, args.host, args.base_port, batch_window(args), args.setup_timeout, args.drain))
+    finally:
+        shutdown_logging()
+
+    report = {
+        "benchmark": "load",
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "result": result,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
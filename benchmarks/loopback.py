@@ -0,0 +1,45 @@
+import asyncio
+from typing import Dict
+from musig2_protocols.didcomm_service import DIDCommService
+
+
+class LoopbackConnection:
+    """In-process stand-in for a websocket client connection.
+
+    Frames are delivered to the receiving service in order by a reader task,
+    the same way the websocket server's per-connection loop delivers them.
+    """
+
+    def __init__(self, service: DIDCommService):
+        self.service = service
+        self._frames: asyncio.Queue = asyncio.Queue()
+        self._reader = asyncio.create_task(self._read())
+
+    async def send(self, frame):
+        self._frames.put_nowait(frame)
+
+    async def close(self):
+        self._reader.cancel()
+
+    async def _read(self):
+        while True:
+            frame = await self._frames.get()
+            await self.service.receive_packed_message(frame)
+
+
+class LoopbackNetwork:
+    """Connects DIDCommServices in the same event loop without opening sockets."""
+
+    def __init__(self):
+        self.services: Dict[str, DIDCommService] = {}
+
+    def attach(self, service: DIDCommService):
+        """Route connections to the service's websocket URL through the loopback network."""
+        self.services[service.didcomm_websocket_url] = service
+        service.connect = self.connect
+
+    async def connect(self, endpoint: str) -> LoopbackConnection:
+        service = self.services.get(endpoint)
+        if service is None:
+            raise ConnectionRefusedError(f"No loopback service listening on {endpoint}")
+        return LoopbackConnection(service)
@@ -0,0 +1,246 @@
+"""End-to-end benchmark of cohort formation and signing.
+
+Builds a coordinator and N participants in one process and drives
+subscribe, cohort advert, opt-in, cohort set and a signing session over
+every participant. Each cohort size runs in its own subprocess, so peak
+RSS is per size. Results are written as JSON.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List
+from buidl.hd import HDPrivateKey, secure_mnemonic
+from musig2_protocols.beacon_coordinator import BeaconCoordinator
+from musig2_protocols.beacon_participant import BeaconParticipant
+from musig2_protocols.log import DEBUG, configure_logging, shutdown_logging
+from musig2_protocols.protocols.keygen.message_types import SUBSCRIBE_ACCEPT, COHORT_ADVERT, OPT_IN, COHORT_SET
+from musig2_protocols.protocols.keygen.models.cohort import COHORT_SET_STATUS
+from musig2_protocols.protocols.sign.message_types import REQUEST_SIGNATURE, AUTHORIZATION_REQUEST, NONCE_CONTRIBUTION, AGGREGATED_NONCE, SIGNATURE_AUTHORIZATION
+from musig2_protocols.protocols.sign.models.signature_authorization import SIGNATURE_COMPLETE, FAILED
+from .loopback import LoopbackNetwork
+from .stats import Stage, peak_rss_bytes, summarize
+
+
+DEFAULT_SIZES = [3, 10, 100, 1000]
+COORDINATOR_MESSAGE_TYPES = [OPT_IN, REQUEST_SIGNATURE, NONCE_CONTRIBUTION, SIGNATURE_AUTHORIZATION]
+PARTICIPANT_MESSAGE_TYPES = [SUBSCRIBE_ACCEPT, COHORT_ADVERT, COHORT_SET, AUTHORIZATION_REQUEST, AGGREGATED_NONCE]
+
+
+class MessageTimeline:
+    """Arrival times of protocol messages, keyed by message type and participant DID.
+
+    Messages received by the coordinator are keyed by their sender, messages
+    received by a participant by that participant.
+    """
+
+    def __init__(self):
+        self.arrivals: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self.message_count = 0
+        self._waiters: List = []
+
+    def watch_coordinator(self, coordinator: BeaconCoordinator):
+        async def record(message, contact_context, thread_context):
+            self.record(message.type, message.frm)
+        for message_type in COORDINATOR_MESSAGE_TYPES:
+            coordinator.didcomm.register_message_handler(message_type, record)
+
+    def watch_participant(self, participant: BeaconParticipant):
+        async def record(message, contact_context, thread_context):
+            self.record(message.type, participant.did)
+        for message_type in PARTICIPANT_MESSAGE_TYPES:
+            participant.didcomm.register_message_handler(message_type, record)
+
+    def record(self, message_type: str, participant_did: str):
+        self.arrivals[message_type].setdefault(participant_did, time.perf_counter())
+        self.message_count += 1
+        for waiter in list(self._waiters):
+            waiting_type, count, future = waiter
+            if waiting_type == message_type and len(self.arrivals[message_type]) >= count:
+                self._waiters.remove(waiter)
+                if not future.done():
+                    future.set_result(None)
+
+    async def wait_for(self, message_type: str, count: int, timeout: float):
+        """Wait until `count` participants have a recorded arrival of `message_type`."""
+        if len(self.arrivals[message_type]) >= count:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((message_type, count, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Only {len(self.arrivals[message_type])} of {count} {message_type} messages arrived within {timeout}s.")
+
+    def latencies(self, message_type: str, since) -> List[float]:
+        """Arrival latencies from a single start time, or from a per-participant start time."""
+        latencies = []
+        for did, arrival in self.arrivals[message_type].items():
+            start = since.get(did) if isinstance(since, dict) else since
+            if start is not None:
+                latencies.append(arrival - start)
+        return latencies
+
+    def last(self, message_type: str) -> float:
+        return max(self.arrivals[message_type].values())
+
+
+async def wait_until(condition, timeout: float, interval: float = 0.001):
+    """Poll a condition that is not tied to a message arrival."""
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Timed out waiting for the protocol to complete.")
+        await asyncio.sleep(interval)
+
+
+async def run_protocol(participant_count: int, transport: str = "loopback", base_port: int = 9000, timeout: float = 300) -> Dict:
+    """Form a cohort of `participant_count` participants and sign one beacon signal with it."""
+    setup_start = time.perf_counter()
+    network = LoopbackNetwork() if transport == "loopback" else None
+    coordinator = await BeaconCoordinator.create(name="Coordinator", port=base_port)
+    participants = []
+    for i in range(participant_count):
+        root_hdpriv = HDPrivateKey.from_mnemonic(secure_mnemonic())
+        participants.append(await BeaconParticipant.create(root_hdpriv=root_hdpriv, name=f"Participant-{i}", port=base_port + 1 + i))
+
+    timeline = MessageTimeline()
+    timeline.watch_coordinator(coordinator)
+    for participant in participants:
+        timeline.watch_participant(participant)
+
+    actors = [coordinator] + participants
+    server_tasks = []
+    if network is not None:
+        for actor in actors:
+            network.attach(actor.didcomm)
+    else:
+        server_tasks = [asyncio.create_task(actor.start()) for actor in actors]
+        # Give the servers time to start up
+        await asyncio.sleep(1)
+    setup_s = time.perf_counter() - setup_start
+
+    phases: Dict[str, List[float]] = {}
+    stages: Dict[str, Stage] = {}
+    total = Stage("total", lambda: timeline.message_count)
+    try:
+        with total:
+            with Stage("subscribe", lambda: timeline.message_count) as stage:
+                subscribe_start = time.perf_counter()
+                await asyncio.gather(*(participant.subscribe_to_coordinator(coordinator.did) for participant in participants))
+                await timeline.wait_for(SUBSCRIBE_ACCEPT, participant_count, timeout)
+            stages["subscribe"] = stage
+            phases["subscribe"] = timeline.latencies(SUBSCRIBE_ACCEPT, subscribe_start)
+
+            with Stage("keygen", lambda: timeline.message_count) as stage:
+                announce_start = time.perf_counter()
+                cohort = await coordinator.announce_new_cohort(min_participants=participant_count)
+                await timeline.wait_for(COHORT_SET, participant_count, timeout)
+                await wait_until(lambda: all(participant.cohorts.get(cohort.id).status == COHORT_SET_STATUS for participant in participants), timeout)
+            stages["keygen"] = stage
+            phases["cohort_advert"] = timeline.latencies(COHORT_ADVERT, announce_start)
+            phases["opt_in"] = timeline.latencies(OPT_IN, timeline.arrivals[COHORT_ADVERT])
+            # COHORT_SET goes out once the last opt-in has arrived
+            phases["cohort_set"] = timeline.latencies(COHORT_SET, timeline.last(OPT_IN))
+
+            with Stage("signing", lambda: timeline.message_count) as stage:
+                request_start = time.perf_counter()
+                await asyncio.gather(*(participant.request_cohort_signature(cohort.id, f"update {i}") for i, participant in enumerate(participants)))
+                await timeline.wait_for(REQUEST_SIGNATURE, participant_count, timeout)
+                await wait_until(lambda: len(cohort.pending_signature_requests) == participant_count, timeout)
+                session_start = time.perf_counter()
+                signing_session = await coordinator.start_signing_session(cohort.id)
+                await wait_until(lambda: signing_session.status in (SIGNATURE_COMPLETE, FAILED), timeout)
+                if signing_session.status != SIGNATURE_COMPLETE:
+                    raise RuntimeError(f"Signing session {signing_session.id} failed.")
+            stages["signing"] = stage
+            phases["request_signature"] = timeline.latencies(REQUEST_SIGNATURE, request_start)
+            phases["authorization_request"] = timeline.latencies(AUTHORIZATION_REQUEST, session_start)
+            phases["nonce_contribution"] = timeline.latencies(NONCE_CONTRIBUTION, timeline.arrivals[AUTHORIZATION_REQUEST])
+            # AGGREGATED_NONCE goes out once the last nonce contribution has arrived
+            phases["aggregated_nonce"] = timeline.latencies(AGGREGATED_NONCE, timeline.last(NONCE_CONTRIBUTION))
+            phases["signature_authorization"] = timeline.latencies(SIGNATURE_AUTHORIZATION, timeline.arrivals[AGGREGATED_NONCE])
+    finally:
+        for task in server_tasks:
+            task.cancel()
+        for actor in actors:
+            await actor.didcomm.cleanup()
+            await actor.didcomm.scheduler.close()
+
+    return {
+        "participants": participant_count,
+        "transport": transport,
+        "setup_s": round(setup_s, 6),
+        "total": total.to_dict(),
+        "stages": {name: stage.to_dict() for name, stage in stages.items()},
+        "phases": {name: summarize(samples) for name, samples in phases.items()},
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+
+def run_isolated(participant_count: int, args) -> Dict:
+    """Run one cohort size in a fresh interpreter so peak RSS is not shared between sizes."""
+    command = [
+        sys.executable, "-m", "benchmarks.protocol_benchmark",
+        "--participants", str(participant_count),
+        "--transport", args.transport,
+        "--base-port", str(args.base_port),
+        "--timeout", str(args.timeout),
+        "--single",
+    ]
+    if args.verbose:
+        command.append("--verbose")
+    completed = subprocess.run(command, stdout=subprocess.PIPE, check=True)
+    return json.loads(completed.stdout)
+
+
+def run_single(participant_count: int, args) -> Dict:
+    if args.verbose:
+        configure_logging(DEBUG)
+    try:
+        return asyncio.run(run_protocol(participant_count, args.transport, args.base_port, args.timeout))
+    finally:
+        shutdown_logging()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end MuSig2 DIDComm protocol benchmark")
+    parser.add_argument("--participants", type=int, nargs="+", default=DEFAULT_SIZES, help="Cohort sizes to benchmark")
+    parser.add_argument("--transport", choices=["loopback", "websocket"], default="loopback", help="In-process loopback or localhost websockets")
+    parser.add_argument("--base-port", type=int, default=9000, help="Coordinator port, participants use the following ports")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for each stage")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="Log protocol messages to stderr")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(args.participants[0], args)))
+        return
+
+    results = []
+    for participant_count in args.participants:
+        print(f"Benchmarking {participant_count} participants", file=sys.stderr)
+        results.append(run_isolated(participant_count, args))
+
+    report = {
+        "benchmark": "protocol",
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import math
+import resource
+import sys
+import time
+from typing import Dict, List, Optional
+
+
+def summarize(samples: List[float]) -> Dict:
+    """Summarize latency samples, given in seconds, as milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        # Nearest rank
+        rank = max(1, math.ceil(p / 100 * len(ordered)))
+        return round(ordered[rank - 1] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Stage:
+    """Measures wall time, CPU time and messages received over one protocol stage."""
+
+    def __init__(self, name: str, message_count):
+        self.name = name
+        self._message_count = message_count
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._messages = self._message_count()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_s = time.perf_counter() - self._wall
+        self.cpu_s = time.process_time() - self._cpu
+        self.messages = self._message_count() - self._messages
+        return False
+
+    def to_dict(self) -> Dict:
+        return {
+            "wall_s": round(self.wall_s, 6),
+            "cpu_s": round(self.cpu_s, 6),
+            "messages": self.messages,
+            "messages_per_s": round(self.messages / self.wall_s, 1) if self.wall_s else None,
+        }
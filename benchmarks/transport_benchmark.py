@@ -0,0 +1,290 @@
+"""Benchmarks of the websocket transport settings.
+
+`envelopes` sends AUTHORIZATION_REQUEST messages with pending transactions
+of each `--tx-bytes` size and a full SMT proof, packed and sent between two
+DIDComm services over localhost websockets, once per compression profile.
+It reports the envelope size, the bytes on the wire, round trip latency
+and CPU time per message. Envelopes are encrypted, so deflate can only win
+back the base64url overhead of the ciphertext.
+
+`idle` holds `--connections` idle websocket connections open for
+`--duration` seconds, once per `--ping-intervals` value, and reports the CPU
+time and wire bytes the keepalive pings cost. Both ends ping, as two agents
+connected to each other do.
+
+Wire bytes are counted by a TCP proxy between the two ends, so TLS records
+are counted too when `--certfile` and `--keyfile` are given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import websockets
+from musig2_protocols.didcomm_service import DIDCommService
+from musig2_protocols.messaging import BASE64URL_ENCODING, HEX_ENCODING
+from musig2_protocols.protocols.sign.message_types import AUTHORIZATION_REQUEST
+from musig2_protocols.protocols.sign.messages.authorization_request import AuthorizationRequestMessage
+from musig2_protocols.transport import WebsocketTransport
+from .stats import peak_rss_bytes, summarize
+
+
+DEFAULT_TX_BYTES = [1000, 20000, 100000]
+DEFAULT_PING_INTERVALS = [20.0, 5.0, 0.0]
+
+# Compression settings compared by the envelopes benchmark
+PROFILES: Dict[str, Dict] = {
+    "uncompressed": {"compression": False},
+    "deflate": {},
+    "deflate-fast": {"compression_level": 1},
+    "deflate-max": {"compression_level": 9, "compression_window_bits": 15},
+}
+
+# Connections opened at once by the idle benchmark, within the listen backlog
+CONNECT_BATCH = 100
+
+
+class CountingProxy:
+    """TCP proxy counting the bytes sent each way."""
+
+    def __init__(self, target_port: int):
+        self.target_port = target_port
+        self.to_server = 0
+        self.to_client = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks = set()
+
+    async def start(self, port: int):
+        self._server = await asyncio.start_server(self._accept, "localhost", port, backlog=1024)
+
+    async def _accept(self, client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection("localhost", self.target_port)
+        for task in (
+            asyncio.create_task(self._pipe(client_reader, server_writer, "to_server")),
+            asyncio.create_task(self._pipe(server_reader, client_writer, "to_client")),
+        ):
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _pipe(self, reader, writer, direction: str):
+        try:
+            while data := await reader.read(65536):
+                setattr(self, direction, getattr(self, direction) + len(data))
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def reset(self):
+        self.to_server = 0
+        self.to_client = 0
+
+    @property
+    def total(self) -> int:
+        return self.to_server + self.to_client
+
+    async def close(self):
+        self._server.close()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def transport_for(profile: Dict, args) -> WebsocketTransport:
+    """Transport settings of a profile, with TLS when a certificate is given."""
+    settings = dict(profile)
+    if args.certfile:
+        settings.update(tls_certfile=args.certfile, tls_keyfile=args.keyfile, tls_cafile=args.certfile)
+    return WebsocketTransport(**settings)
+
+
+def authorization_request(to: str, frm: str, tx_bytes: int, encoding: str) -> Dict:
+    """An AUTHORIZATION_REQUEST with a pending transaction of tx_bytes and a proof of the full 256 level SMT."""
+    smt_proof = {
+        "key": os.urandom(32).hex(),
+        "value": os.urandom(32).hex(),
+        "bitmap": "ff" * 32,
+        "siblings": [os.urandom(32).hex() for _ in range(256)],
+    }
+    message = AuthorizationRequestMessage(to, frm, str(uuid.uuid4()), str(uuid.uuid4()), os.urandom(tx_bytes).hex(), smt_proof)
+    return message.to_dict(encoding)
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def run_envelopes(profile_name: str, args, port: int) -> List[Dict]:
+    """Send AUTHORIZATION_REQUEST messages of each size with one compression profile."""
+    transport = transport_for(PROFILES[profile_name], args)
+    proxy = CountingProxy(port)
+    await proxy.start(port + 1)
+    proxy_url = f"{'wss' if args.certfile else 'ws'}://localhost:{port + 1}"
+
+    async def connect_through_proxy(endpoint: str):
+        return await websockets.connect(proxy_url, **transport.connect_options(endpoint))
+
+    receiver = DIDCommService("receiver", "localhost", port, tls=bool(args.certfile), transport=transport)
+    sender = DIDCommService("sender", "localhost", port + 2, transport=transport, connect=connect_through_proxy)
+    received: asyncio.Queue = asyncio.Queue()
+
+    async def handle(msg, contact_context, thread_context):
+        received.put_nowait(time.perf_counter())
+
+    receiver.register_message_handler(AUTHORIZATION_REQUEST, handle)
+    server = asyncio.create_task(receiver.start_websocket_connection())
+    await receiver.listening.wait()
+    to = await receiver.generate_did()
+    frm = await sender.generate_did()
+    results = []
+    try:
+        # Opens the connection, so the handshake is not counted
+        await sender.send_message(authorization_request(to, frm, 1, args.encoding), to, frm)
+        await asyncio.wait_for(received.get(), args.timeout)
+        for tx_bytes in args.tx_bytes:
+            message = authorization_request(to, frm, tx_bytes, args.encoding)
+            for _ in range(args.warmup):
+                await sender.send_message(message, to, frm)
+                await asyncio.wait_for(received.get(), args.timeout)
+            proxy.reset()
+            cpu_start = cpu_seconds()
+            samples = []
+            for _ in range(args.messages):
+                sent = time.perf_counter()
+                await sender.send_message(message, to, frm)
+                samples.append(await asyncio.wait_for(received.get(), args.timeout) - sent)
+            cpu = cpu_seconds() - cpu_start
+            results.append({
+                "profile": profile_name,
+                "tx_bytes": tx_bytes,
+                "plaintext_bytes": len(json.dumps(message, separators=(",", ":"))),
+                "wire_bytes_per_message": round(proxy.to_server / args.messages),
+                "cpu_ms_per_message": round(cpu / args.messages * 1000, 3),
+                "latency": summarize(samples),
+            })
+            print(f"{profile_name} {tx_bytes} bytes: {results[-1]['wire_bytes_per_message']} wire bytes", file=sys.stderr)
+    finally:
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+        await sender.cleanup()
+        await receiver.cleanup()
+        await proxy.close()
+    return results
+
+
+async def run_idle(ping_interval: float, args, port: int) -> Dict:
+    """Hold idle connections open with one ping interval."""
+    transport = transport_for({"ping_interval": ping_interval or None}, args)
+    scheme = "wss" if args.certfile else "ws"
+    proxy = CountingProxy(port)
+    await proxy.start(port + 1)
+
+    async def wait_closed(websocket):
+        await websocket.wait_closed()
+
+    server = await websockets.serve(wait_closed, "localhost", port, backlog=1024, **transport.serve_options(bool(args.certfile)))
+    url = f"{scheme}://localhost:{port + 1}"
+    connections = []
+    try:
+        for start in range(0, args.connections, CONNECT_BATCH):
+            count = min(CONNECT_BATCH, args.connections - start)
+            connections += await asyncio.gather(*(websockets.connect(url, **transport.connect_options(url)) for _ in range(count)))
+        # Let handshakes and their first writes settle before measuring
+        await asyncio.sleep(1)
+        proxy.reset()
+        cpu_start = cpu_seconds()
+        wall_start = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        wall = time.perf_counter() - wall_start
+        cpu = cpu_seconds() - cpu_start
+        closed = sum(1 for connection in connections if connection.state is not websockets.State.OPEN)
+        result = {
+            "ping_interval": ping_interval or None,
+            "connections": args.connections,
+            "seconds": round(wall, 3),
+            "closed": closed,
+            "cpu_percent": round(cpu / wall * 100, 2),
+            "wire_bytes_per_second": round(proxy.total / wall),
+            "wire_bytes_per_connection_minute": round(proxy.total / wall / args.connections * 60, 1),
+        }
+        print(f"ping_interval {ping_interval}: {result['cpu_percent']}% CPU, {result['wire_bytes_per_second']} wire bytes/s", file=sys.stderr)
+        return result
+    finally:
+        await asyncio.gather(*(connection.close() for connection in connections), return_exceptions=True)
+        server.close()
+        await server.wait_closed()
+        await proxy.close()
+
+
+def raise_file_limit(connections: int):
+    """Each idle connection uses four descriptors: client, proxy ends and server."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = connections * 4 + 256
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+
+async def run_benchmarks(args) -> Dict:
+    results = {}
+    port = args.base_port
+    if "envelopes" in args.benchmarks:
+        results["envelopes"] = []
+        for profile_name in args.profiles:
+            results["envelopes"] += await run_envelopes(profile_name, args, port)
+            port += 3
+    if "idle" in args.benchmarks:
+        raise_file_limit(args.connections)
+        results["idle"] = []
+        for ping_interval in args.ping_intervals:
+            results["idle"].append(await run_idle(ping_interval, args, port))
+            port += 2
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Websocket transport settings benchmark")
+    parser.add_argument("--benchmarks", nargs="+", choices=["envelopes", "idle"], default=["envelopes", "idle"], help="Benchmarks to run")
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES), help="Compression profiles of the envelopes benchmark")
+    parser.add_argument("--tx-bytes", type=int, nargs="+", default=DEFAULT_TX_BYTES, help="Sizes of the pending transaction")
+    parser.add_argument("--encoding", choices=[HEX_ENCODING, BASE64URL_ENCODING], default=HEX_ENCODING, help="Encoding of the binary message fields")
+    parser.add_argument("--messages", type=int, default=50, help="Messages sent per size and profile")
+    parser.add_argument("--warmup", type=int, default=5, help="Messages sent before measuring")
+    parser.add_argument("--connections", type=int, default=1000, help="Idle connections held open")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds the idle connections are held per ping interval")
+    parser.add_argument("--ping-intervals", type=float, nargs="+", default=DEFAULT_PING_INTERVALS, help="Keepalive ping intervals in seconds, 0 to not ping")
+    parser.add_argument("--certfile", help="Use TLS with this certificate, trusted by the client")
+    parser.add_argument("--keyfile", help="Private key of --certfile")
+    parser.add_argument("--base-port", type=int, default=9300, help="First port used, each run uses the following ones")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for each message")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmarks(args))
+    report = {
+        "benchmark": "transport",
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "tls": bool(args.certfile),
+        "encoding": args.encoding,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import asyncio
 from musig2_protocols.beacon_coordinator import BeaconCoordinator
 from musig2_protocols.beacon_participant import BeaconParticipant
+from musig2_protocols.log import INFO, configure_logging
 from buidl.hd import HDPrivateKey, secure_mnemonic
 
 async def main():
+    configure_logging(INFO)
     fred_mnemonic = secure_mnemonic()
     fred_hdpriv = HDPrivateKey.from_mnemonic(fred_mnemonic)
     lucia_mnemonic = secure_mnemonic()
@@ -1,10 +1,12 @@
 import asyncio
 from musig2_protocols.beacon_coordinator import BeaconCoordinator
 from musig2_protocols.beacon_participant import BeaconParticipant
+from musig2_protocols.log import INFO, configure_logging
 from buidl.hd import HDPrivateKey, secure_mnemonic
 from musig2_protocols.protocols.keygen.models.cohort import COHORT_SET_STATUS
 
 async def main():
+    configure_logging(INFO)
     fred_mnemonic = secure_mnemonic()
     fred_hdpriv = HDPrivateKey.from_mnemonic(fred_mnemonic)
     lucia_mnemonic = secure_mnemonic()
@@ -105,11 +107,11 @@ async def main():
 
 
     # await asyncio.sleep(1)
-    pending_request_count = len(coordinator.cohorts[0].pending_signature_requests)
+    pending_request_count = len(cohort.pending_signature_requests)
     while pending_request_count != 2:
         await asyncio.sleep(1)
         print(f"Pending request count: {pending_request_count}")
-        pending_request_count = len(coordinator.cohorts[0].pending_signature_requests)
+        pending_request_count = len(cohort.pending_signature_requests)
 
     print("Starting signing session")
     await coordinator.start_signing_session(cohort.id)
@@ -0,0 +1,145 @@
+import asyncio
+from typing import Dict, List, Optional
+from buidl.hd import HDPrivateKey
+from .beacon_participant import BeaconParticipant
+from .didcomm_service import DIDCommService
+from .router import MessageRouter
+from .transport import WebsocketTransport
+from .log import get_logger
+
+
+log = get_logger(__name__)
+
+
+class HostedDIDComm:
+    """The messaging service of one agent hosted by an AgentHost.
+
+    Offers the DIDCommService methods agents use. DIDs, keys, connections,
+    the resolver cache, the scheduler and the listener belong to the host.
+    Each hosted agent has its own router, so its handlers only receive
+    messages encrypted to its own DIDs.
+    """
+
+    def __init__(self, host: "AgentHost", name: str):
+        self.host = host
+        self.name = name
+        self.service = host.didcomm
+        self.scheduler = self.service.scheduler
+        self.message_router = MessageRouter(self.scheduler, agent=name)
+        self.dids: List[str] = []
+
+    @property
+    def didcomm_websocket_url(self) -> str:
+        return self.service.didcomm_websocket_url
+
+    async def generate_did(self, label: str = None):
+        """Generate a DID on the host's listener, routed to this agent."""
+        # Labels are kept per agent, the host's secrets are shared
+        did = await self.service.generate_did(f"{self.name}/{label}" if label is not None else None)
+        self.service.set_did_router(did, self.message_router)
+        self.dids.append(did)
+        return did
+
+    async def open_secrets(self, path: str, passphrase: str, key_method: str = "kdf:argon2i:mod"):
+        """Keep this agent's keys in the host's encrypted Askar store, see AgentHost.open_secrets."""
+        return await self.host.open_secrets(path, passphrase, key_method)
+
+    def start_did_pool(self, low_watermark: int = 16, high_watermark: int = 64):
+        """Pre-generate DIDs on the host's service, shared by all hosted agents."""
+        return self.service.start_did_pool(low_watermark, high_watermark)
+
+    def register_message_handler(self, message_type: str, handler):
+        """Register a handler function for a specific message type."""
+        self.message_router.add_route(message_type, handler)
+
+    def remove_message_handler(self, message_type: str):
+        """Remove a handler for a specific message type."""
+        if message_type in self.message_router.routes:
+            del self.message_router.routes[message_type]
+
+    async def send_message(self, message, to, frm):
+        await self.service.send_message(message, to, frm)
+
+    async def start_websocket_connection(self):
+        """Wait on the host's listener, starting it for the first agent."""
+        await self.host.serve()
+
+    async def cleanup(self):
+        """Stop routing this agent's DIDs. Connections are shared and closed by the host."""
+        for did in self.dids:
+            self.service.remove_did_router(did)
+
+
+class AgentHost:
+    """Runs many agents on one DIDCommService.
+
+    The agents share one listener, one outbound connection per endpoint,
+    one secrets manager, one resolver cache and one scheduler. Inbound
+    messages are dispatched to the agent owning the recipient key id.
+    """
+
+    def __init__(self, name: str = "AgentHost", host: str = "localhost", port: int = 8766, connect=None, transport: WebsocketTransport = None):
+        """Initialize the host.
+
+        Args:
+            name: Name of the shared messaging service
+            host: The interface the shared listener binds to, part of every hosted DID's endpoint
+            port: The port of the shared listener
+            connect: Opens connections to other endpoints, websockets by default
+            transport: Websocket settings of the shared listener and connections, websockets' defaults by default
+        """
+        self.didcomm = DIDCommService(name, host, port, connect=connect, transport=transport)
+        self.agents: Dict[str, HostedDIDComm] = {}
+        self._server: Optional[asyncio.Future] = None
+        self._secrets_path: Optional[str] = None
+        self._secrets_lock = asyncio.Lock()
+
+    async def open_secrets(self, path: str, passphrase: str, key_method: str = "kdf:argon2i:mod"):
+        """Keep the keys of every hosted agent in one encrypted Askar store.
+
+        The store is opened by the first call. Agents passing the same path
+        share it, their labelled DIDs are kept apart by agent name.
+
+        Args:
+            path: Path of the SQLite database file, created if it does not exist
+            passphrase: The store's passphrase, or a raw key with key_method "raw"
+            key_method: How the store key is derived from the passphrase
+
+        Raises:
+            ValueError: If the host's store is already open at another path
+        """
+        async with self._secrets_lock:
+            if self._secrets_path is None:
+                await self.didcomm.open_secrets(path, passphrase, key_method)
+                self._secrets_path = path
+            elif path != self._secrets_path:
+                raise ValueError(f"Hosted agents share the secrets store at {self._secrets_path}, not {path}.")
+        return self.didcomm.secrets
+
+    def add_agent(self, name: str) -> HostedDIDComm:
+        """Get a messaging service for a new hosted agent, to pass to its constructor."""
+        if name in self.agents:
+            raise ValueError(f"Agent {name} is already hosted.")
+        agent = HostedDIDComm(self, name)
+        self.agents[name] = agent
+        return agent
+
+    async def create_participant(self, root_hdpriv: HDPrivateKey, name: str) -> BeaconParticipant:
+        """Create a participant hosted on this host."""
+        return await BeaconParticipant.create(root_hdpriv=root_hdpriv, name=name, didcomm=self.add_agent(name))
+
+    async def serve(self):
+        """Run the shared listener. Every caller waits on the same server."""
+        if self._server is None:
+            log.info("agent_host_starting", agents=len(self.agents), url=self.didcomm.didcomm_websocket_url)
+            self._server = asyncio.ensure_future(self.didcomm.start_websocket_connection())
+        # Shielded so one agent stopping does not stop the listener for the others
+        await asyncio.shield(self._server)
+
+    async def close(self):
+        """Stop the listener, close the shared connections and the scheduler."""
+        if self._server is not None:
+            self._server.cancel()
+            self._server = None
+        await self.didcomm.cleanup()
+        await self.didcomm.scheduler.close()
@@ -1,18 +1,21 @@
+import asyncio
+import time
 import uuid
-from typing import List, Dict
+from typing import Any, Callable, List, Dict, Optional
 from .didcomm_service import DIDCommService
 from did_peer_2 import KeySpec, generate
 from didcomm_messaging.crypto.backend.askar import AskarCryptoService, AskarSecretKey
 from aries_askar import Key, KeyAlg
 from didcomm_messaging.multiformats import multibase
 from didcomm_messaging.multiformats import multicodec
-from .protocols.keygen.models.cohort import Musig2Cohort
+from .protocols.keygen.models.cohort import Musig2Cohort, COHORT_ADVERTISED, COHORT_STATUS
 from .protocols.keygen.messages.subscribe import SubscribeMessage
 from .protocols.keygen.messages.subscribe_accept import SubscribeAcceptMessage
 from .protocols.keygen.messages.cohort_advert import CohortAdvertMessage
 from .protocols.keygen.messages.opt_in import CohortOptInMessage
 from .protocols.keygen.message_types import SUBSCRIBE, OPT_IN
 from .context import InMemoryContextStorage
+from .messaging import HEX_ENCODING, SUPPORTED_ENCODINGS, negotiate_encoding
 from buidl.ecc import S256Point 
 from .protocols.sign.messages.request_signature import RequestSignatureMessage
 from .protocols.sign.message_types import REQUEST_SIGNATURE, NONCE_CONTRIBUTION, SIGNATURE_AUTHORIZATION
@@ -20,19 +23,63 @@ from .protocols.sign.models.signature_authorization import SignatureAuthorizatio
 from .protocols.sign.messages.nonce_contribution import NonceContributionMessage
 from .protocols.sign.messages.aggregated_nonce import AggregatedNonceMessage
 from .protocols.sign.messages.signature_authorization import SignatureAuthorizationMessage
-from .protocols.sign.models.signature_authorization import AWAITING_PARTIAL_SIGNATURES, NONCE_CONTRIBUTIONS_RECEIVED, PARTIAL_SIGNATURES_RECEIVED
+from .protocols.sign.models.signature_authorization import AWAITING_NONCE_CONTRIBUTIONS, AWAITING_PARTIAL_SIGNATURES, NONCE_CONTRIBUTIONS_RECEIVED, PARTIAL_SIGNATURES_RECEIVED, SIGNATURE_COMPLETE, FAILED
+from .protocols.keygen.models.threshold import threshold_leaf_count
+from .registry import CohortRegistry, DIDRegistry
+from .signing_scheduler import BatchWindow, SigningScheduler
+from .state import StateStore
+from .metrics import REGISTRY, ROUND_BUCKETS, MetricsExporter
+from .tracing import TRACER, session_attributes
+from .log import get_logger, lazy
+
+
+log = get_logger(__name__)
+
+SESSION_STATUSES = [AWAITING_NONCE_CONTRIBUTIONS, NONCE_CONTRIBUTIONS_RECEIVED, AWAITING_PARTIAL_SIGNATURES, PARTIAL_SIGNATURES_RECEIVED, SIGNATURE_COMPLETE, FAILED]
+COHORTS = REGISTRY.gauge("musig2_cohorts", "Cohorts by status.", ["agent", "status"])
+SIGNING_SESSIONS = REGISTRY.gauge("musig2_signing_sessions", "Latest signing session of each cohort, by status.", ["agent", "status"])
+SIGNING_ROUND_SECONDS = REGISTRY.histogram("musig2_signing_round_seconds", "Time from starting a signing session to its final signature or failure.", ["agent", "outcome"], buckets=ROUND_BUCKETS)
+SIGNING_FAILURES = REGISTRY.counter("musig2_signing_failures_total", "Signing sessions that failed, by reason.", ["agent", "reason"])
 
 class BeaconCoordinator:
     """Coordinates MuSig2 protocol operations between participants."""
 
-    async def __init__(self, name: str, host: str = "localhost", port: int = 8767):
-        """Initialize the coordinator with DIDComm messaging service."""
-        self.didcomm = DIDCommService(name, host, port)
-        self.subscribers: List[str] = []
-        self.cohorts: List[Musig2Cohort] = []
+    # Label of the coordinator's DID, kept by a secrets store across restarts
+    DID_LABEL = "coordinator"
+
+    async def __init__(self, name: str, host: str = "localhost", port: int = 8767, secrets_path: str = None, secrets_passphrase: str = None, state_dir: str = None, didcomm: DIDCommService = None):
+        """Initialize the coordinator with DIDComm messaging service.
+
+        Args:
+            name: The coordinator's name
+            host: The interface the coordinator's listener binds to
+            port: The port of the coordinator's listener
+            secrets_path: Keep keys in an encrypted store at this path, so the coordinator's DID survives restarts (optional)
+            secrets_passphrase: The passphrase of the secrets store
+            state_dir: Keep subscribers, cohorts and signing sessions in this directory and
+                resume them on restart. Use with secrets_path, so the coordinator's DID is kept too (optional)
+            didcomm: A messaging service to use instead of its own, e.g. with tuned transport settings (optional)
+        """
+        self.didcomm = didcomm or DIDCommService(name, host, port)
+        if secrets_path is not None:
+            await self.didcomm.open_secrets(secrets_path, secrets_passphrase)
+        self.subscribers = DIDRegistry()
+        # Encoding profile negotiated with each subscriber, hex if not listed
+        self.peer_encodings: Dict[str, str] = {}
+        self.cohorts = CohortRegistry()
+        # Generates the ids of announced cohorts. A CoordinatorShard replaces it, so a worker announces cohorts it owns.
+        self.cohort_id_factory: Callable[[], str] = lambda: str(uuid.uuid4())
         self.active_signing_sessions: Dict[str, SignatureAuthorizationSession] = {}
+        # Starts signing sessions from per-cohort batch windows. Cohorts without a window are signed manually.
+        self.signing_scheduler = SigningScheduler(self._start_scheduled_signing_session, expire_session=self._expire_signing_session)
         # TODO: Coodinator should be able to have many DIDs
-        self.did = await self.didcomm.generate_did()
+        self.did = await self.didcomm.generate_did(label=self.DID_LABEL)
+        self.metrics_exporter = None
+        self.state: Optional[StateStore] = None
+        if state_dir is not None:
+            self.state = StateStore(state_dir)
+            self._restore_state(self.state.load())
+        self._register_metrics()
 
         # Register message handlers
         self.didcomm.register_message_handler(
@@ -57,62 +104,203 @@ class BeaconCoordinator:
         )
 
 
-    async def start(self):
-        """Start the coordinator's DIDComm messaging service."""
+    async def start(self, metrics_port: int = None):
+        """Start the coordinator's DIDComm messaging service.
+
+        Args:
+            metrics_port: Serve Prometheus metrics on this local port (optional)
+        """
+        if metrics_port is not None:
+            self.metrics_exporter = MetricsExporter(port=metrics_port)
+            await self.metrics_exporter.start()
+        if self.state is not None:
+            # Runs once the listener is starting, so participants can answer
+            asyncio.get_running_loop().create_task(self.resume_signing_sessions())
         await self.didcomm.start_websocket_connection()
 
-    async def _handle_subscribe(self, message: Dict, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
-        """Handle subscription requests from participants."""
-        msg_sender = message["from"]
-        if msg_sender not in self.subscribers:
-            self.subscribers.append(msg_sender)
+    def _save_cohort(self, cohort: Musig2Cohort):
+        if self.state is not None:
+            self.state.put(f"cohort:{cohort.id}", cohort.to_dict)
+
+    def _save_session(self, signing_session: SignatureAuthorizationSession):
+        if self.state is not None:
+            self.state.put(f"session:{signing_session.cohort.id}", signing_session.to_dict)
 
+    def _restore_state(self, records: Dict[str, Any]):
+        """Restore subscribers, cohorts, batch windows and signing sessions from the state store."""
+        sessions = {}
+        for key, record in records.items():
+            kind, _, record_id = key.partition(":")
+            if kind == "subscriber":
+                self.subscribers.add(record_id)
+                # Records written before encoding negotiation hold True
+                if isinstance(record, str):
+                    self.peer_encodings[record_id] = record
+            elif kind == "cohort":
+                self.cohorts.add(Musig2Cohort.from_dict(record))
+            elif kind == "window":
+                self.signing_scheduler.set_window(record_id, BatchWindow(**record))
+            elif kind == "session":
+                sessions[record_id] = record
+        for cohort_id, record in sessions.items():
+            cohort = self.cohorts.get(cohort_id)
+            if cohort is None:
+                continue
+            signing_session = SignatureAuthorizationSession.from_dict(record, cohort)
+            cohort.signing_session = signing_session
+            self.active_signing_sessions[cohort_id] = signing_session
+        log.info("state_restored", subscribers=len(self.subscribers), cohorts=len(self.cohorts), sessions=len(self.active_signing_sessions))
+
+    async def resume_signing_sessions(self):
+        """Continue the signing sessions restored in flight, and batching of restored pending requests.
+
+        Each round is resumed where it was left. Participants that have not
+        answered the current round get its message again. Sessions waiting
+        for partial signatures get a new nonce round instead, since
+        participants drop their nonce secrets on restart and once they signed.
+        """
+        for cohort_id, signing_session in list(self.active_signing_sessions.items()):
+            status = signing_session.status
+            if status in (SIGNATURE_COMPLETE, FAILED):
+                continue
+            cohort = signing_session.cohort
+            self.signing_scheduler.session_resumed(cohort)
+            log.info("signing_session_resumed", cohort_id=cohort_id, session_id=signing_session.id, status=status)
+            if status == AWAITING_NONCE_CONTRIBUTIONS:
+                for participant in signing_session.signers:
+                    if participant not in signing_session.nonce_contributions:
+                        msg = signing_session.get_authorization_request(frm=self.did, to=participant)
+                        await self.didcomm.send_message(msg.to_dict(self._encoding_for(participant)), participant, self.did)
+                window = self.signing_scheduler.get_window(cohort_id)
+                if window is not None and window.nonce_deadline is not None and cohort.has_threshold_leaves():
+                    asyncio.create_task(self._enforce_nonce_deadline(signing_session, window.nonce_deadline))
+            elif status == NONCE_CONTRIBUTIONS_RECEIVED:
+                await self.send_aggregated_nonce(signing_session)
+            elif status == AWAITING_PARTIAL_SIGNATURES:
+                await self._restart_nonce_round(signing_session, "resumed")
+            elif status == PARTIAL_SIGNATURES_RECEIVED:
+                self._finalize_session(signing_session)
+        for cohort in self.cohorts:
+            if cohort.pending_signature_requests:
+                self.signing_scheduler.request_added(cohort)
+
+    def _register_metrics(self):
+        """Export cohort and session counts, read from the registries at scrape time."""
+        name = self.didcomm.name
+        for status in COHORT_STATUS:
+            COHORTS.labels(name, status).set_function(lambda status=status: len(self.cohorts.with_status(status)))
+        for status in SESSION_STATUSES:
+            SIGNING_SESSIONS.labels(name, status).set_function(
+                lambda status=status: sum(1 for session in list(self.active_signing_sessions.values()) if session.status == status)
+            )
+
+    def _record_session_finished(self, signing_session: SignatureAuthorizationSession, failure_reason: str = None):
+        """Record the round duration of a finished session and hand the cohort back to the scheduler."""
+        outcome = "complete" if signing_session.status == SIGNATURE_COMPLETE else "failed"
+        SIGNING_ROUND_SECONDS.labels(self.didcomm.name, outcome).observe(time.monotonic() - signing_session.created_at)
+        if failure_reason is not None:
+            SIGNING_FAILURES.labels(self.didcomm.name, failure_reason).inc()
+        if signing_session.status == FAILED and signing_session.processed_requests:
+            # Signed in a later session instead
+            signing_session.cohort.requeue_requests(signing_session.processed_requests)
+            self._save_cohort(signing_session.cohort)
+        self.signing_scheduler.session_finished(signing_session.cohort)
+        self._save_session(signing_session)
+
+    def _expire_signing_session(self, cohort_id: str):
+        """Fail a session the signing scheduler gave up on, releasing its cohort for the next window."""
+        signing_session = self.active_signing_sessions.get(cohort_id)
+        if signing_session is None or signing_session.status in (SIGNATURE_COMPLETE, FAILED):
+            return
+        log.warning("signing_session_timed_out", cohort_id=cohort_id, session_id=signing_session.id, status=signing_session.status)
+        signing_session.status = FAILED
+        self._record_session_finished(signing_session, "timeout")
+
+    async def _handle_subscribe(self, message: SubscribeMessage, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
+        """Handle subscription requests from participants."""
+        msg_sender = message.frm
+        if self.add_subscriber(msg_sender, negotiate_encoding(message.encodings)):
             await self.accept_subscription(msg_sender)
 
-    async def _handle_join_cohort(self, message: Dict, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
+    def add_subscriber(self, did: str, encoding: str = HEX_ENCODING) -> bool:
+        """Add a subscriber without answering it, e.g. one accepted by another worker.
+
+        Args:
+            did: The subscriber's DID
+            encoding: The encoding profile negotiated with the subscriber
+
+        Returns:
+            Whether the subscriber is new
+        """
+        if not self.subscribers.add(did):
+            return False
+        self.peer_encodings[did] = encoding
+        if self.state is not None:
+            self.state.put(f"subscriber:{did}", lambda: encoding)
+        return True
+
+    def _encoding_for(self, did: str) -> str:
+        """The encoding profile to send binary fields to a participant in."""
+        return self.peer_encodings.get(did, HEX_ENCODING)
+
+    async def _handle_join_cohort(self, opt_in_msg: CohortOptInMessage, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
         """Handle join cohort requests from participants."""
-        opt_in_msg = CohortOptInMessage.from_dict(message)
         cohort_id = opt_in_msg.cohort_id
         participant = opt_in_msg.frm
         participant_pk = opt_in_msg.participant_pk
         # Find the cohort
-        cohort = next((c for c in self.cohorts if c.id == cohort_id), None)
-        if cohort and participant not in cohort.participants:
-            cohort.participants.append(participant)
-            cohort.cohort_keys.append(S256Point.parse(bytes.fromhex(participant_pk)))
-            
+        cohort = self.cohorts.get(cohort_id)
+        if cohort and cohort.status != COHORT_ADVERTISED:
+            # Late opt-ins would change the keys of a cohort that is already set
+            log.debug("late_opt_in", cohort_id=cohort_id, frm=participant)
+            return
+        if cohort and self.cohorts.add_participant(cohort, participant, S256Point.parse(bytes.fromhex(participant_pk))):
+            self._save_cohort(cohort)
             # If we have enough participants, we can start the key generation
             if len(cohort.participants) >= cohort.min_participants: 
                 await self._start_key_generation(cohort)
 
-    async def _handle_request_signature(self, message: Dict, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
+    async def _handle_request_signature(self, signature_request: RequestSignatureMessage, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
         """Handle signature requests from participants."""
-        signature_request = RequestSignatureMessage.from_dict(message)
-        cohort = next((c for c in self.cohorts if c.id == signature_request.cohort_id), None)
+        cohort = self.cohorts.get(signature_request.cohort_id)
         if cohort:
             cohort.add_signature_request(signature_request)
-            print(f"Received signature request from {signature_request.frm} for cohort {signature_request.cohort_id}")
+            self._save_cohort(cohort)
+            log.debug("signature_request_received", cohort_id=signature_request.cohort_id, frm=signature_request.frm)
+            self.signing_scheduler.request_added(cohort)
         else:
-            print(f"Cohort {signature_request.cohort_id} not found.")
+            log.warning("cohort_not_found", cohort_id=signature_request.cohort_id, frm=signature_request.frm)
 
-    async def _handle_nonce_contribution(self, message: Dict, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
+    async def _handle_nonce_contribution(self, nonce_contribution_msg: NonceContributionMessage, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
         """Handle nonce contributions from participants."""
-        nonce_contribution_msg = NonceContributionMessage.from_dict(message)
         signing_session = self.active_signing_sessions.get(nonce_contribution_msg.cohort_id)
         if signing_session:
             if (signing_session.cohort.id != nonce_contribution_msg.cohort_id):
                 raise ValueError(f"Nonce contribution for wrong cohort {nonce_contribution_msg.cohort_id}.")
+            if signing_session.id != nonce_contribution_msg.session_id:
+                # Expected from participants that answered a round before it was restarted
+                log.info("stale_nonce_contribution", session_id=nonce_contribution_msg.session_id, expected=signing_session.id, frm=nonce_contribution_msg.frm)
+                return
+            if nonce_contribution_msg.frm not in signing_session.signers:
+                raise ValueError(f"Nonce contribution from {nonce_contribution_msg.frm} who is not a signer in session {signing_session.id}.")
+            if signing_session.status == AWAITING_PARTIAL_SIGNATURES and nonce_contribution_msg.frm not in signing_session.partial_signatures:
+                # The signer lost the nonce secrets of this round and sent fresh nonces instead of a partial signature
+                await self._restart_nonce_round(signing_session, "nonce_secrets_unavailable")
+                return
+            if signing_session.status != AWAITING_NONCE_CONTRIBUTIONS:
+                log.info("late_nonce_contribution", session_id=nonce_contribution_msg.session_id, frm=nonce_contribution_msg.frm)
+                return
             signing_session.add_nonce_contribution(nonce_contribution_msg.frm, nonce_contribution_msg.nonce_contribution)
-            print(f"Received nonce contribution from {nonce_contribution_msg.frm} for session {nonce_contribution_msg.session_id}")
+            self._save_session(signing_session)
+            log.debug("nonce_contribution_received", session_id=nonce_contribution_msg.session_id, frm=nonce_contribution_msg.frm)
 
             if signing_session.status == NONCE_CONTRIBUTIONS_RECEIVED:
                 await self.send_aggregated_nonce(signing_session)
         else:
-            print(f"Session {nonce_contribution_msg.session_id} not found.")
+            log.warning("session_not_found", session_id=nonce_contribution_msg.session_id, frm=nonce_contribution_msg.frm)
 
-    async def _handle_signature_authorization(self, message: Dict, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
+    async def _handle_signature_authorization(self, signature_authorization_msg: SignatureAuthorizationMessage, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
         """Handle signature authorization messages from participants."""
-        signature_authorization_msg = SignatureAuthorizationMessage.from_dict(message)
         signing_session = self.active_signing_sessions.get(signature_authorization_msg.cohort_id)
         if signing_session:
             if signing_session.id != signature_authorization_msg.session_id:
@@ -120,17 +308,31 @@ class BeaconCoordinator:
             if signing_session.status != AWAITING_PARTIAL_SIGNATURES:
                 raise ValueError(f"Partial signature received but not expected. Current status: {signing_session.status}")
             signing_session.add_partial_signature(signature_authorization_msg.frm, signature_authorization_msg.partial_signature)
-            print(f"Received partial signature from {signature_authorization_msg.frm} for session {signature_authorization_msg.session_id}")
+            self._save_session(signing_session)
+            log.debug("partial_signature_received", session_id=signature_authorization_msg.session_id, frm=signature_authorization_msg.frm)
             if signing_session.status == PARTIAL_SIGNATURES_RECEIVED:
+                self._finalize_session(signing_session)
+
+    def _finalize_session(self, signing_session: SignatureAuthorizationSession):
+        """Aggregate the partial signatures of a session into the final signature."""
+        try:
+            with TRACER.start_span("musig2.final_signature", attributes=session_attributes(signing_session.cohort.id, signing_session.id)):
                 signature = signing_session.generate_final_signature()
-                print(f"Final signature: {signature.serialize().hex()}")
+            log.info("final_signature", cohort_id=signing_session.cohort.id, session_id=signing_session.id, signature=lazy(lambda: signature.serialize().hex()))
+        finally:
+            failure_reason = None
+            if signing_session.status != SIGNATURE_COMPLETE:
+                signing_session.status = FAILED
+                failure_reason = "final_signature"
+            self._record_session_finished(signing_session, failure_reason)
 
     async def accept_subscription(self, msg_sender: str):
         """Accept a subscription request from a participant."""
-        print(f"Accepting subscription request from {msg_sender}")
+        log.info("subscription_accepted", subscriber=msg_sender)
         accept_msg = SubscribeAcceptMessage(
             to=msg_sender,
-            frm=self.did
+            frm=self.did,
+            encodings=list(SUPPORTED_ENCODINGS)
         )
         await self.didcomm.send_message(accept_msg.to_dict(), msg_sender, self.did)
 
@@ -140,33 +342,56 @@ class BeaconCoordinator:
         Args:
             signing_session: The signing session containing the cohort and nonce information
         """
-        aggregated_nonce = signing_session.generate_aggregated_nonce()
+        with TRACER.start_span("musig2.aggregate_nonces", attributes=session_attributes(signing_session.cohort.id, signing_session.id)):
+            signing_session.generate_aggregated_nonce()
         signing_session.status = AWAITING_PARTIAL_SIGNATURES
-        aggregated_nonces_hex = [point.sec().hex() for point in aggregated_nonce]
+        self._save_session(signing_session)
+        await self._send_aggregated_nonce_to(signing_session, signing_session.signers)
+
+    async def _send_aggregated_nonce_to(self, signing_session: SignatureAuthorizationSession, participants: List[str]):
+        aggregated_nonces_hex = [point.sec().hex() for point in signing_session.aggregated_nonce]
+        signer_keys = None
+        if signing_session.signer_keys is not None:
+            signer_keys = [point.sec().hex() for point in signing_session.signer_keys]
         
-        for participant in signing_session.cohort.participants:
+        for participant in participants:
             msg = AggregatedNonceMessage(
                 to=participant,
                 frm=self.did,
                 cohort_id=signing_session.cohort.id,
                 session_id=signing_session.id,
-                aggregated_nonce=aggregated_nonces_hex
+                aggregated_nonce=aggregated_nonces_hex,
+                signer_keys=signer_keys
             )
             await self.didcomm.send_message(
-                msg.to_dict(),
+                msg.to_dict(self._encoding_for(participant)),
                 participant,
                 self.did
             )
-            print(f"Successfully sent aggregated nonce message to {participant}")
 
-    async def announce_new_cohort(self, min_participants: int, btc_network: str = "signet", beacon_type: str = "SMTAggregateBeacon"):
-        """Announce a new cohort to all subscribers."""
-        print(f"Creating new cohort and announcing to {len(self.subscribers)} subscribers")
-        cohort = Musig2Cohort(min_participants=min_participants, btc_network=btc_network, beacon_type=beacon_type)
-        self.cohorts.append(cohort)
+    async def announce_new_cohort(self, min_participants: int, btc_network: str = "signet", beacon_type: str = "SMTAggregateBeacon", threshold: int = None, batch_window: BatchWindow = None):
+        """Announce a new cohort to all subscribers.
+
+        Args:
+            min_participants: The number of participants needed to form the cohort
+            btc_network: The Bitcoin network of the cohort
+            beacon_type: The beacon type advertised to subscribers
+            threshold: Commit to k-of-n MuSig2 fallback leaves with this k (optional)
+            batch_window: Start signing sessions automatically using this window (optional)
+        """
+        if threshold is not None:
+            threshold_leaf_count(min_participants, threshold)
+        log.info("announcing_cohort", subscribers=len(self.subscribers), min_participants=min_participants, threshold=threshold)
+        cohort = Musig2Cohort(id=self.cohort_id_factory(), min_participants=min_participants, btc_network=btc_network, beacon_type=beacon_type, threshold=threshold)
+        self.cohorts.add(cohort)
+        self._save_cohort(cohort)
+        if batch_window is not None:
+            self.signing_scheduler.set_window(cohort.id, batch_window)
+            if self.state is not None:
+                self.state.put(f"window:{cohort.id}", lambda: dict(vars(batch_window)))
         
-        for subscriber in self.subscribers:
-            print(f"Sending cohort announcement to {subscriber}")
+        # Iterate a snapshot so failed subscribers can be removed mid-broadcast
+        for subscriber in self.subscribers.snapshot():
             msg = CohortAdvertMessage(
                 to=subscriber,
                 frm=self.did,
@@ -174,7 +399,8 @@ class BeaconCoordinator:
                 cohort_size=cohort.min_participants,
                 thread_id=None,
                 btc_network=btc_network,
-                beacon_type=cohort.beacon_type
+                beacon_type=cohort.beacon_type,
+                threshold=cohort.threshold
             )
             try:
                 await self.didcomm.send_message(
@@ -182,11 +408,13 @@ class BeaconCoordinator:
                     subscriber,
                     self.did
                 )
-                print(f"Successfully sent cohort announcement {msg.type} to {subscriber}")
             except Exception as e:
-                print(f"Error sending cohort announcement to {subscriber}: {str(e)}")
+                log.warning("cohort_announcement_failed", cohort_id=cohort.id, subscriber=subscriber, error=str(e))
                 # Remove failed subscriber
-                self.subscribers.remove(subscriber)
+                self.subscribers.discard(subscriber)
+                self.peer_encodings.pop(subscriber, None)
+                if self.state is not None:
+                    self.state.delete(f"subscriber:{subscriber}")
 
         return cohort
 
@@ -194,45 +422,107 @@ class BeaconCoordinator:
 
     async def _start_key_generation(self, cohort: Musig2Cohort):
         """Start the key generation process for a cohort."""
-        print(f"Starting key generation for cohort {cohort.id}")
+        log.info("key_generation_started", cohort_id=cohort.id, participants=len(cohort.participants))
         cohort.finalize_cohort()
+        self._save_cohort(cohort)
         for participant in cohort.participants:
             msg = cohort.get_cohort_set_message(to=participant, frm=self.did)
-            print(f"Sending COHORT_SET message to {participant}")
             await self.didcomm.send_message(
-                msg.to_dict(),
+                msg.to_dict(self._encoding_for(participant)),
                 participant,
                 self.did
             )
-        print(f"Finished sending COHORT_SET message to {len(cohort.participants)} participants")
+        log.info("cohort_set", cohort_id=cohort.id, beacon_address=cohort.beacon_address)
 
 
     """
     Start a signing session for a cohort.
     Sends authorization requests to all participants in the cohort.
     """
-    async def start_signing_session(self, cohort_id: str):
-        """Start a signing session for a cohort."""
-        print(f"Attempting to start signing session for {cohort_id}")
-        cohort = next((c for c in self.cohorts if c.id == cohort_id), None)
+    async def start_signing_session(self, cohort_id: str, deadline: float = None, max_requests: int = None):
+        """Start a signing session for a cohort.
+
+        Args:
+            cohort_id: The cohort to start the signing session for
+            deadline: Seconds to wait for all nonce contributions before falling back to
+                a k-of-n leaf signed by the responsive participants (optional)
+            max_requests: The most pending requests to include in the session (optional)
+
+        Returns:
+            The started signing session, or None if the cohort was not found or
+            a session for it is still collecting nonces or signatures
+        """
+        cohort = self.cohorts.get(cohort_id)
+        active_session = self.active_signing_sessions.get(cohort_id)
+        if active_session is not None and active_session.status not in (SIGNATURE_COMPLETE, FAILED):
+            # Its requests are committed to the cohort's request tree, a second session would drop them
+            log.warning("signing_session_in_progress", cohort_id=cohort_id, session_id=active_session.id, status=active_session.status)
+            return None
         if cohort:
-            print(f"Cohort {cohort_id} found. Starting signing session.")
-            signing_session = cohort.start_signing_session()
-            print(f"Starting signing session {signing_session.id} for cohort {cohort_id}")
-            for participant in cohort.participants:
-                msg = signing_session.get_authorization_request(participant, self.did)
-                print(f"Sending authorization request to {participant}")
-                await self.didcomm.send_message(
-                    msg.to_dict(),
-                    participant,
-                    self.did)
-            self.active_signing_sessions[cohort_id] = signing_session
+            # Root span of the session's trace, the authorization requests carry it to the participants
+            with TRACER.start_span("musig2.start_signing_session", agent=self.didcomm.name, attributes=session_attributes(cohort_id)) as span:
+                with TRACER.start_span("musig2.build_beacon_signal"):
+                    signing_session = cohort.start_signing_session(max_requests)
+                span.set_attribute("musig2.session_id", signing_session.id)
+                log.info("signing_session_started", cohort_id=cohort_id, session_id=signing_session.id, requests=len(signing_session.processed_requests))
+                for participant in cohort.participants:
+                    msg = signing_session.get_authorization_request(frm=self.did, to=participant)
+                    await self.didcomm.send_message(
+                        msg.to_dict(self._encoding_for(participant)),
+                        participant,
+                        self.did)
+                self.active_signing_sessions[cohort_id] = signing_session
+                # Also for manual starts, so no batch window opens while the session runs
+                self.signing_scheduler.session_started(cohort)
+                self._save_cohort(cohort)
+                self._save_session(signing_session)
+                if deadline is not None and cohort.has_threshold_leaves():
+                    asyncio.create_task(self._enforce_nonce_deadline(signing_session, deadline))
+            return signing_session
         else:
-            print(f"Cohort {cohort_id} not found.")
+            log.warning("cohort_not_found", cohort_id=cohort_id)
+
+    async def _restart_nonce_round(self, signing_session: SignatureAuthorizationSession, reason: str):
+        """Replace a session whose nonces can no longer be used by a new one for the same transaction and requests."""
+        cohort = signing_session.cohort
+        restarted = signing_session.restart()
+        log.info("nonce_round_restarted", cohort_id=cohort.id, session_id=signing_session.id, new_session_id=restarted.id, reason=reason)
+        cohort.signing_session = restarted
+        self.active_signing_sessions[cohort.id] = restarted
+        self._save_session(restarted)
+        for participant in cohort.participants:
+            msg = restarted.get_authorization_request(frm=self.did, to=participant)
+            await self.didcomm.send_message(msg.to_dict(self._encoding_for(participant)), participant, self.did)
+        window = self.signing_scheduler.get_window(cohort.id)
+        if window is not None and window.nonce_deadline is not None and cohort.has_threshold_leaves():
+            asyncio.create_task(self._enforce_nonce_deadline(restarted, window.nonce_deadline))
+
+    async def _start_scheduled_signing_session(self, cohort_id: str, window: BatchWindow):
+        """Start a signing session when a cohort's batch window closes."""
+        return await self.start_signing_session(cohort_id, deadline=window.nonce_deadline, max_requests=window.max_batch_size)
+
+    def notify_block(self, height: int):
+        """Notify the coordinator of a new block height, closing block-aligned batch windows."""
+        self.signing_scheduler.notify_block(height)
+
+    async def _enforce_nonce_deadline(self, signing_session: SignatureAuthorizationSession, deadline: float):
+        """Fall back to the responsive participants if nonces are still missing after the deadline."""
+        await asyncio.sleep(deadline)
+        if signing_session.status != AWAITING_NONCE_CONTRIBUTIONS:
+            return
+        threshold = signing_session.cohort.get_signing_threshold()
+        if len(signing_session.nonce_contributions) < threshold:
+            log.warning("nonce_deadline_missed", session_id=signing_session.id, received=len(signing_session.nonce_contributions), required=threshold)
+            signing_session.status = FAILED
+            self._record_session_finished(signing_session, "nonce_deadline")
+            return
+        signers = signing_session.select_responsive_signers()
+        log.info("script_path_fallback", session_id=signing_session.id, signers=len(signers), participants=len(signing_session.cohort.participants))
+        await self.send_aggregated_nonce(signing_session)
 
     @classmethod
-    async def create(cls, name: str, host: str = "localhost", port: int = 8767):
+    async def create(cls, name: str, host: str = "localhost", port: int = 8767, secrets_path: str = None, secrets_passphrase: str = None, state_dir: str = None, didcomm: DIDCommService = None):
         """Create a new coordinator instance."""
         self = cls.__new__(cls)
-        await self.__init__(name, host, port)
+        await self.__init__(name, host, port, secrets_path, secrets_passphrase, state_dir, didcomm)
         return self 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from typing import List, Dict
+from typing import Any, Dict, Optional
 from .didcomm_service import DIDCommService
 from did_peer_2 import KeySpec, generate
 from didcomm_messaging.crypto.backend.askar import AskarCryptoService, AskarSecretKey
@@ -12,6 +12,7 @@ from .protocols.keygen.messages.opt_in import CohortOptInMessage
 from .protocols.keygen.models.cohort import Musig2Cohort
 from .protocols.keygen.message_types import SUBSCRIBE_ACCEPT, COHORT_ADVERT, COHORT_SET
 from .context import InMemoryContextStorage
+from .messaging import HEX_ENCODING, SUPPORTED_ENCODINGS, negotiate_encoding
 from buidl.hd import HDPrivateKey
 from .protocols.sign.message_types import AUTHORIZATION_REQUEST, AGGREGATED_NONCE
 from .protocols.keygen.models.cohort import COHORT_OPTED_IN, COHORT_SET_STATUS
@@ -24,6 +25,17 @@ from .protocols.sign.messages.signature_authorization import SignatureAuthorizat
 from .protocols.keygen.messages.cohort_set import CohortSetMessage
 from buidl.ecc import S256Point
 from buidl.tx import Tx
+from .registry import CohortRegistry, DIDRegistry
+from .smt import SMTProof, smt_key, smt_value
+from .metrics import REGISTRY, MetricsExporter
+from .state import StateStore
+from .tracing import TRACER, session_attributes
+from .log import get_logger
+
+
+log = get_logger(__name__)
+
+BEACON_SIGNAL_REJECTIONS = REGISTRY.counter("musig2_beacon_signal_rejections_total", "Authorization requests refused because the beacon signal failed validation.", ["agent"])
 
 # Future: Might have multiple keys per cohort
 class CohortKeyState:
@@ -38,16 +50,46 @@ class CohortKeyState:
 class BeaconParticipant:
     """Represents a participant in the MuSig2 protocol that can join cohorts."""
 
-    async def __init__(self, root_hdpriv: HDPrivateKey, name: str, host: str = "localhost", port: int = 8766):
-        """Initialize the participant with DIDComm messaging service."""
-        self.didcomm = DIDCommService(name, host, port)
+    async def __init__(self, root_hdpriv: HDPrivateKey, name: str, host: str = "localhost", port: int = 8766, didcomm: DIDCommService = None, secrets_path: str = None, secrets_passphrase: str = None, state_dir: str = None, did_pool: Dict[str, int] = None):
+        """Initialize the participant with DIDComm messaging service.
+
+        Args:
+            root_hdpriv: The root key the participant's cohort keys are derived from
+            name: The participant's name
+            host: The interface the participant's own listener binds to
+            port: The port of the participant's own listener
+            didcomm: A messaging service to use instead of its own, e.g. from an AgentHost (optional)
+            secrets_path: Keep keys in an encrypted store at this path, so the participant's DIDs survive restarts (optional)
+            secrets_passphrase: The passphrase of the secrets store
+            state_dir: Keep coordinators, cohorts, cohort keys and signing sessions in this directory
+                and restore them on restart. Nonce secrets are not kept (optional)
+            did_pool: Take the DIDs of new subscriptions from a pool of pre-generated DIDs,
+                with these `start_did_pool` watermarks (optional)
+        """
+        self.didcomm = didcomm or DIDCommService(name, host, port)
+        if secrets_path is not None:
+            await self.didcomm.open_secrets(secrets_path, secrets_passphrase)
+        if did_pool is not None:
+            self.didcomm.start_did_pool(**did_pool)
         self.root_hdpriv = root_hdpriv
         self.next_beacon_key_index = 0
-        self.coordinator_dids: List[str] = []
-        self.cohorts: List[Musig2Cohort] = []
+        self.coordinator_dids = DIDRegistry()
+        # Encoding profile negotiated with each coordinator, hex if not listed
+        self.coordinator_encodings: Dict[str, str] = {}
+        self.cohorts = CohortRegistry()
         self.cohort_key_state:  Dict[str, CohortKeyState] = {}
-        self.did = await self.didcomm.generate_did()
+        self.did = await self.didcomm.generate_did(label="participant")
         self.active_signing_sessions: Dict[str, SignatureAuthorizationSession] = {}
+        # Data of signature requests not yet included in a beacon signal, by cohort id
+        self.pending_requests: Dict[str, str] = {}
+        # Data of requests included in a beacon signal whose session may still fail or be
+        # restarted, by cohort id. Kept until a later signal no longer includes them.
+        self.committed_requests: Dict[str, str] = {}
+        self.metrics_exporter = None
+        self.state: Optional[StateStore] = None
+        if state_dir is not None:
+            self.state = StateStore(state_dir)
+            self._restore_state(self.state.load())
 
         # Register message handlers
         self.didcomm.register_message_handler(
@@ -79,10 +121,52 @@ class BeaconParticipant:
         if index is None:
             index = self.next_beacon_key_index
             self.next_beacon_key_index += 1
+            # A key index must never be handed out twice, also not after a restart
+            self._save("next_beacon_key_index", lambda: self.next_beacon_key_index)
         return self.root_hdpriv.get_private_key(index)
 
-    async def start(self):
-        """Start the participant's DIDComm messaging service."""
+    def _save(self, key: str, serialize):
+        if self.state is not None:
+            self.state.put(key, serialize)
+
+    def _restore_state(self, records: Dict[str, Any]):
+        """Restore coordinators, cohorts, cohort keys, pending requests and signing sessions from the state store."""
+        sessions = {}
+        for key, record in records.items():
+            kind, _, record_id = key.partition(":")
+            if kind == "next_beacon_key_index":
+                self.next_beacon_key_index = record
+            elif kind == "coordinator":
+                self.coordinator_dids.add(record_id)
+                # Records written before encoding negotiation hold True
+                if isinstance(record, str):
+                    self.coordinator_encodings[record_id] = record
+            elif kind == "cohort":
+                self.cohorts.add(Musig2Cohort.from_dict(record))
+            elif kind == "key_state":
+                self.cohort_key_state[record_id] = CohortKeyState(record_id, record["own_did"], record["key_index"])
+            elif kind == "pending_request":
+                self.pending_requests[record_id] = record
+            elif kind == "committed_request":
+                self.committed_requests[record_id] = record
+            elif kind == "session":
+                sessions[record_id] = record
+        for cohort_id, record in sessions.items():
+            cohort = self.cohorts.get(cohort_id)
+            if cohort is not None:
+                # Without nonce secrets, a restored session can only be answered with fresh nonces
+                self.active_signing_sessions[cohort_id] = SignatureAuthorizationSession.from_dict(record, cohort)
+        log.info("state_restored", agent=self.didcomm.name, cohorts=len(self.cohorts), sessions=len(self.active_signing_sessions))
+
+    async def start(self, metrics_port: int = None):
+        """Start the participant's DIDComm messaging service.
+
+        Args:
+            metrics_port: Serve Prometheus metrics on this local port (optional)
+        """
+        if metrics_port is not None:
+            self.metrics_exporter = MetricsExporter(port=metrics_port)
+            await self.metrics_exporter.start()
         await self.didcomm.start_websocket_connection()
 
     async def subscribe_to_coordinator(self, coordinator_did: str):
@@ -90,11 +174,13 @@ class BeaconParticipant:
         if coordinator_did not in self.coordinator_dids:
             # TODO: exploring the use of contact_context to store the DID for the coordinator
             contact_context = InMemoryContextStorage(("contact", coordinator_did))
-            new_did = await self.didcomm.generate_did()
+            # The same DID after a restart, so the coordinator still knows the subscription
+            new_did = await self.didcomm.generate_did(label=f"contact:{coordinator_did}")
             contact_context.set("did", new_did)
             msg = SubscribeMessage(
                 to=coordinator_did,
-                frm=self.did
+                frm=self.did,
+                encodings=list(SUPPORTED_ENCODINGS)
             )
             await self.didcomm.send_message(
                 msg.to_dict(),
@@ -102,96 +188,136 @@ class BeaconParticipant:
                 new_did
             )
 
-    async def _handle_subscribe_accept(self, message: Dict, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
+    async def _handle_subscribe_accept(self, message: SubscribeAcceptMessage, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
         """Handle subscription acceptance from a coordinator."""
-        coordinator_did = message["from"]   
-        if coordinator_did not in self.coordinator_dids:
-            self.coordinator_dids.append(coordinator_did)
+        coordinator_did = message.frm   
+        self.coordinator_dids.add(coordinator_did)
+        encoding = negotiate_encoding(message.encodings)
+        self.coordinator_encodings[coordinator_did] = encoding
+        self._save(f"coordinator:{coordinator_did}", lambda: encoding)
 
-    async def _handle_cohort_advert(self, message: Dict, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
-        print(f"BeaconParticipant {self.did} received new cohort announcement from {message['from']}")
+    def _encoding_for(self, coordinator_did: str) -> str:
+        """The encoding profile to send binary fields to a coordinator in."""
+        return self.coordinator_encodings.get(coordinator_did, HEX_ENCODING)
+
+    async def _handle_cohort_advert(self, cohort_advert: CohortAdvertMessage, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
         """Handle new cohort announcements from coordinators."""
-        cohort_advert = CohortAdvertMessage.from_dict(message)
         cohort_id = cohort_advert.cohort_id
         btc_network = cohort_advert.btc_network
         frm = cohort_advert.frm
         if frm not in self.coordinator_dids:
-            print(f"BeaconParticipant {self.did} received unsolicited new cohort announcement from {frm}")
+            log.warning("unsolicited_cohort_advert", agent=self.didcomm.name, cohort_id=cohort_id, frm=frm)
+            return
+        if cohort_id in self.cohorts:
+            log.debug("duplicate_cohort_advert", agent=self.didcomm.name, cohort_id=cohort_id)
             return
         
-        cohort = Musig2Cohort(id=cohort_id, btc_network=btc_network, coordinator_did=frm)
-        self.cohorts.append(cohort)
+        cohort = Musig2Cohort(id=cohort_id, btc_network=btc_network, coordinator_did=frm, beacon_type=cohort_advert.beacon_type, threshold=cohort_advert.threshold)
+        self.cohorts.add(cohort)
         # May configure additional rules or await user input to join the cohort
         # Automatically join the new cohort
-        await self.join_cohort(cohort.id, message["from"])
+        await self.join_cohort(cohort.id, frm)
 
-    async def _handle_cohort_set(self, message: Dict, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
+    async def _handle_cohort_set(self, cohort_set_msg: CohortSetMessage, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
         """Handle cohort set messages from coordinators."""
-        cohort_set_msg = CohortSetMessage.from_dict(message)
         cohort_id = cohort_set_msg.cohort_id
-        cohort = next((c for c in self.cohorts if c.id == cohort_id), None)
+        cohort = self.cohorts.get(cohort_id)
         cohort_key_state = self.cohort_key_state[cohort_id]
         participant_pk = self.get_cohort_key(cohort_key_state.key_index).point.sec().hex()
         beacon_address = cohort_set_msg.beacon_address
         cohort_keys = cohort_set_msg.cohort_keys
-        cohort.validate_cohort([participant_pk], cohort_keys, beacon_address)
-        print(f"BeaconParticipant {self.didcomm.name} validated cohort {cohort_id} with beacon address {beacon_address}. Cohort status: {cohort.status}")
+        try:
+            cohort.validate_cohort([participant_pk], cohort_keys, beacon_address)
+        finally:
+            self._save(f"cohort:{cohort_id}", cohort.to_dict)
+        log.info("cohort_validated", agent=self.didcomm.name, cohort_id=cohort_id, beacon_address=beacon_address, status=cohort.status)
 
-    async def _handle_authorization_request(self, message: Dict, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
+    async def _handle_authorization_request(self, authorization_request: AuthorizationRequestMessage, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
         """Handle authorization requests from coordinators."""
-        authorization_request = AuthorizationRequestMessage.from_dict(message)
-        cohort = next((c for c in self.cohorts if c.id == authorization_request.cohort_id), None)
-        if cohort:
+        cohort = self.cohorts.get(authorization_request.cohort_id)
+        existing_session = self.active_signing_sessions.get(authorization_request.cohort_id)
+        if cohort and existing_session is not None and existing_session.id == authorization_request.session_id:
+            # Sent again by a restarted coordinator. The beacon signal was validated the first time.
+            if existing_session.nonce_secrets is not None:
+                nonce_contribution = existing_session.nonce_contributions[self.did]
+            else:
+                # Used, or lost in a restart of this participant. Never sign with old nonces again.
+                nonce_contribution = self.generate_nonce_contribution(cohort, existing_session)
+                self._save(f"session:{cohort.id}", existing_session.to_dict)
+            await self.send_nonce_contribution(cohort, nonce_contribution, existing_session)
+        elif cohort:
             signing_session = SignatureAuthorizationSession(
                 cohort=cohort,
                 id=authorization_request.session_id,
                 pending_tx=Tx.parse_hex(authorization_request.pending_tx, network=cohort.btc_network)
             )   
-            # TODO: Validate the signing_session against a pending request
+            if cohort.beacon_type == "SMTAggregateBeacon":
+                if not await self.validate_beacon_signal(cohort, signing_session, authorization_request.smt_proof):
+                    log.warning("beacon_signal_rejected", agent=self.didcomm.name, session_id=signing_session.id)
+                    BEACON_SIGNAL_REJECTIONS.labels(self.didcomm.name).inc()
+                    return
             self.active_signing_sessions[cohort.id] = signing_session
 
             nonce_contribution = self.generate_nonce_contribution(cohort, signing_session)
-            print(nonce_contribution)
+            self._save(f"session:{cohort.id}", signing_session.to_dict)
             await self.send_nonce_contribution(cohort, nonce_contribution, signing_session)
 
         else:
-            print(f"Cohort {authorization_request.cohort_id} not found.")
+            log.warning("cohort_not_found", agent=self.didcomm.name, cohort_id=authorization_request.cohort_id)
 
-    async def _handle_aggregated_nonce(self, message: Dict, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
+    async def _handle_aggregated_nonce(self, aggregated_nonce_msg: AggregatedNonceMessage, contact_context: InMemoryContextStorage, thread_context: InMemoryContextStorage):
         """Handle aggregated nonce messages from coordinators."""
-        aggregated_nonce_msg = AggregatedNonceMessage.from_dict(message)
         signing_session = self.active_signing_sessions.get(aggregated_nonce_msg.cohort_id)
         
         if signing_session:
             if signing_session.id != aggregated_nonce_msg.session_id:
-                print(f"Aggregated nonce message for wrong session {aggregated_nonce_msg.session_id}.")
+                log.warning("aggregated_nonce_wrong_session", agent=self.didcomm.name, session_id=aggregated_nonce_msg.session_id, expected=signing_session.id)
                 return
             
+            if signing_session.nonce_secrets is None:
+                # Already signed, or the secrets were not kept over a restart. Never sign
+                # with old nonces again, fresh ones make the coordinator restart the round.
+                log.warning("nonce_secrets_unavailable", agent=self.didcomm.name, session_id=aggregated_nonce_msg.session_id)
+                nonce_contribution = self.generate_nonce_contribution(signing_session.cohort, signing_session)
+                if nonce_contribution is not None:
+                    self._save(f"session:{signing_session.cohort.id}", signing_session.to_dict)
+                    await self.send_nonce_contribution(signing_session.cohort, nonce_contribution, signing_session)
+                return
             aggregated_nonce = [S256Point.parse(bytes.fromhex(nonce)) for nonce in aggregated_nonce_msg.aggregated_nonce]
             signing_session.set_aggregated_nonce(aggregated_nonce)
 
             cohort_key_state = self.cohort_key_state.get(signing_session.cohort.id)
             if not cohort_key_state:
-                print(f"Cohort key state not found for cohort {signing_session.cohort.id}")
+                log.error("cohort_key_not_found", agent=self.didcomm.name, cohort_id=signing_session.cohort.id)
                 return
             
             participant_sk = self.get_cohort_key(cohort_key_state.key_index)
-            partial_sig = signing_session.generate_partial_signature(participant_sk)
+            if aggregated_nonce_msg.signer_keys is not None:
+                # Coordinator fell back to a k-of-n leaf after the nonce deadline
+                if participant_sk.point.sec().hex() not in aggregated_nonce_msg.signer_keys:
+                    log.info("not_selected_as_signer", agent=self.didcomm.name, session_id=aggregated_nonce_msg.session_id)
+                    return
+                signer_keys = [S256Point.parse(bytes.fromhex(key)) for key in aggregated_nonce_msg.signer_keys]
+                signing_session.use_script_path(signer_keys)
+            with TRACER.start_span("musig2.partial_signature", attributes=session_attributes(signing_session.cohort.id, signing_session.id)):
+                partial_sig = signing_session.generate_partial_signature(participant_sk)
+            self._save(f"session:{signing_session.cohort.id}", signing_session.to_dict)
             await self.send_partial_signature(signing_session, partial_sig)
 
-            print(f"Received aggregated nonce from {aggregated_nonce_msg.frm} for session {aggregated_nonce_msg.session_id}")
+            log.debug("partial_signature_sent", agent=self.didcomm.name, session_id=aggregated_nonce_msg.session_id)
 
 
     async def join_cohort(self, cohort_id: str, coordinator_did: str):
         """Join a specific cohort."""
-        print(f"BeaconParticipant {self.did} joining cohort {cohort_id} with coordinator {coordinator_did}")
-        cohort = next((c for c in self.cohorts if c.id == cohort_id), None)
+        log.info("joining_cohort", agent=self.didcomm.name, cohort_id=cohort_id, coordinator=coordinator_did)
+        cohort = self.cohorts.get(cohort_id)
 
         if cohort is not None:
             key_index = self.next_beacon_key_index
             participant_pk = self.get_cohort_key().point.sec().hex()
             cohort_key_state = CohortKeyState(cohort_id, self.did, key_index)
             self.cohort_key_state[cohort_id] = cohort_key_state
+            self._save(f"key_state:{cohort_id}", lambda: {"key_index": key_index, "own_did": cohort_key_state.own_did})
 
             msg = CohortOptInMessage(
                 to=coordinator_did,
@@ -202,22 +328,23 @@ class BeaconParticipant:
                 participant_pk=participant_pk
             )
             await self.didcomm.send_message(
-                msg.to_dict(),
+                msg.to_dict(self._encoding_for(coordinator_did)),
                 coordinator_did,
                 self.did
             )
             cohort.status = COHORT_OPTED_IN
+            self._save(f"cohort:{cohort_id}", cohort.to_dict)
 
     async def request_cohort_signature(self, cohort_id: str, data: str):
         """Request a signature for a cohort."""
-        cohort = next((c for c in self.cohorts if c.id == cohort_id), None)
+        cohort = self.cohorts.get(cohort_id)
         if cohort:
             if cohort.status != COHORT_SET_STATUS:
-                print(f"Cohort {cohort_id} not in set state.")
-                print(cohort.status == COHORT_SET_STATUS)
+                log.info("cohort_not_set", agent=self.didcomm.name, cohort_id=cohort_id, status=cohort.status)
                 return False
             
-            # TODO: Need to save the signing request somewhere
+            self.pending_requests[cohort_id] = data
+            self._save(f"pending_request:{cohort_id}", lambda: data)
             msg = RequestSignatureMessage(
                 to=cohort.coordinator_did,
                 frm=self.did,
@@ -232,21 +359,66 @@ class BeaconParticipant:
             )
             return True
         else:
-            print(f"Cohort {cohort_id} not found.")
+            log.warning("cohort_not_found", agent=self.didcomm.name, cohort_id=cohort_id)
+            return False
+
+    async def validate_beacon_signal(self, cohort: Musig2Cohort, signing_session: SignatureAuthorizationSession, smt_proof: Dict) -> bool:
+        """Check the beacon signal's SMT root against this participant's pending request.
+
+        The proof must either include exactly the data of the pending request or of
+        the last committed one, or show that nothing is committed for this
+        participant's DID. A committed request appears again in the signal of a
+        restarted round, or of the next session after a failed one. A pending
+        request left out of this signal stays pending for the next one, a
+        committed one left out was signed.
+        """
+        if smt_proof is None:
+            log.warning("smt_proof_missing", agent=self.didcomm.name, session_id=signing_session.id)
+            return False
+        proof = SMTProof.from_dict(smt_proof)
+        if proof.key != smt_key(self.did):
+            log.warning("smt_proof_wrong_key", agent=self.didcomm.name, session_id=signing_session.id)
+            return False
+        pending_data = self.pending_requests.get(cohort.id)
+        committed_data = self.committed_requests.get(cohort.id)
+        accepted_values = [smt_value(data) for data in (pending_data, committed_data) if data is not None]
+        if proof.value is not None and proof.value not in accepted_values:
+            log.warning("smt_proof_unrequested_update", agent=self.didcomm.name, session_id=signing_session.id)
+            return False
+        smt_root = signing_session.get_beacon_signal()
+        if smt_root is None:
+            log.warning("beacon_signal_missing", agent=self.didcomm.name, session_id=signing_session.id)
+            return False
+        with TRACER.start_span("smt.verify_proof", attributes=session_attributes(cohort.id, signing_session.id)):
+            verified = proof.compute_root() == smt_root
+        if not verified:
             return False
+        if proof.value is None:
+            if self.committed_requests.pop(cohort.id, None) is not None and self.state is not None:
+                self.state.delete(f"committed_request:{cohort.id}")
+        elif pending_data is not None and proof.value == smt_value(pending_data):
+            del self.pending_requests[cohort.id]
+            self.committed_requests[cohort.id] = pending_data
+            self._save(f"committed_request:{cohort.id}", lambda: pending_data)
+            if self.state is not None:
+                self.state.delete(f"pending_request:{cohort.id}")
+        return True
 
     def generate_nonce_contribution(self, cohort: Musig2Cohort, signing_session: SignatureAuthorizationSession):
         """Generate a nonce contribution for a signing session."""
 
         cohort_key_state = self.cohort_key_state.get(cohort.id)
         if cohort_key_state:
-            musig_script = cohort.get_cohort_musig2_script()
-            nonce_secrets, nonce_points = musig_script.generate_nonces();
+            with TRACER.start_span("musig2.generate_nonces", attributes=session_attributes(cohort.id, signing_session.id)):
+                musig_script = cohort.get_cohort_musig2_script()
+                nonce_secrets, nonce_points = musig_script.generate_nonces();
             signing_session.set_nonce_secrets(nonce_secrets)
             nonce_contribution = [point.sec().hex() for point in nonce_points]
+            # Public nonces only, to answer a repeated authorization request with the same nonces
+            signing_session.nonce_contributions[self.did] = nonce_contribution
             return nonce_contribution
         else:
-            print(f"Key for cohort {cohort.id} not found.")
+            log.error("cohort_key_not_found", agent=self.didcomm.name, cohort_id=cohort.id)
 
     async def send_nonce_contribution(self, cohort: Musig2Cohort, nonce_contribution: list[str], signing_session: SignatureAuthorizationSession):
         """Send a nonce contribution to the coordinator."""
@@ -258,7 +430,7 @@ class BeaconParticipant:
             nonce_contribution=nonce_contribution
         )
         await self.didcomm.send_message(
-            msg.to_dict(),
+            msg.to_dict(self._encoding_for(cohort.coordinator_did)),
             cohort.coordinator_did,
             self.did
         )
@@ -273,14 +445,14 @@ class BeaconParticipant:
             partial_signature=partial_signature
         )
         await self.didcomm.send_message(
-            msg.to_dict(),
+            msg.to_dict(self._encoding_for(signing_session.cohort.coordinator_did)),
             signing_session.cohort.coordinator_did,
             self.did
         )
 
     @classmethod
-    async def create(cls, root_hdpriv: HDPrivateKey, name: str, host: str = "localhost", port: int = 8766):
+    async def create(cls, root_hdpriv: HDPrivateKey, name: str, host: str = "localhost", port: int = 8766, didcomm: DIDCommService = None, secrets_path: str = None, secrets_passphrase: str = None, state_dir: str = None, did_pool: Dict[str, int] = None):
         """Create a new participant instance."""
         self = cls.__new__(cls)
-        await self.__init__(root_hdpriv, name, host, port)
+        await self.__init__(root_hdpriv, name, host, port, didcomm, secrets_path, secrets_passphrase, state_dir, did_pool)
         return self
\ No newline at end of file
@@ -0,0 +1,79 @@
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+STDLIB = "json"
+ORJSON = "orjson"
+
+# orjson reads integers beyond 64 bits as floats, e.g. partial signatures. Documents
+# with a run of 19 digits, possibly such an integer, are read with json instead.
+_DIGITS_TO_ZERO = bytes.maketrans(b"123456789", b"000000000")
+_LONG_NUMBER = b"0" * 19
+
+
+class JsonCodec:
+    """JSON encoding of messages and envelopes, with orjson when it is installed.
+
+    Both backends read str or bytes and write compact UTF-8 bytes. The
+    orjson backend falls back to json for documents it cannot keep exact,
+    i.e. integers beyond 64 bits, so the two backends give the same results.
+    """
+
+    def __init__(self, backend: str = None):
+        """Initialize the codec.
+
+        Args:
+            backend: ORJSON or STDLIB, orjson if it is installed by default
+        """
+        self.use(backend)
+
+    def use(self, backend: str = None):
+        """Switch the JSON backend.
+
+        Args:
+            backend: ORJSON or STDLIB, orjson if it is installed by default
+
+        Raises:
+            ValueError: If the backend is unknown or orjson is not installed
+        """
+        if backend is None:
+            backend = ORJSON if orjson is not None else STDLIB
+        if backend not in (ORJSON, STDLIB):
+            raise ValueError(f"Unknown JSON backend {backend}.")
+        if backend == ORJSON and orjson is None:
+            raise ValueError("orjson is not installed.")
+        self.backend = backend
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """Parse a JSON document.
+
+        Raises:
+            ValueError: If the data is not valid JSON
+        """
+        if self.backend == ORJSON:
+            raw = data.encode() if isinstance(data, str) else data
+            if raw.translate(_DIGITS_TO_ZERO).find(_LONG_NUMBER) < 0:
+                return orjson.loads(raw)
+        return json.loads(data)
+
+    def dumps(self, value: Any) -> bytes:
+        """Serialize a value to compact JSON.
+
+        Raises:
+            TypeError: If the value is not JSON serializable
+        """
+        if self.backend == ORJSON:
+            try:
+                return orjson.dumps(value)
+            except TypeError:
+                # Integers beyond 64 bits, or types only json handles
+                pass
+        return json.dumps(value, separators=(",", ":")).encode()
+
+
+JSON = JsonCodec()
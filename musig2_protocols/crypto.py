@@ -0,0 +1,189 @@
+import hashlib
+import struct
+from collections import OrderedDict
+from typing import Sequence, Tuple, Union
+from aries_askar import AskarError, Key, KeyAlg
+from didcomm_messaging.crypto.backend.askar import AskarCryptoService, AskarKey, AskarSecretKey
+from didcomm_messaging.crypto.base import CryptoServiceError
+from didcomm_messaging.crypto.jwe import JweBuilder, JweEnvelope, JweRecipient, b64url
+from .codec import JSON
+
+
+# Key wrapping algorithms of ECDH-1PU and their key lengths in bytes
+_WRAP_KEY_LENGTHS = {"A128KW": 16, "A256KW": 32}
+
+
+def _length_prefixed(value: bytes) -> bytes:
+    return struct.pack(">I", len(value)) + value
+
+
+def _zeroize(secret: bytearray):
+    secret[:] = bytes(len(secret))
+
+
+def _shared_secret(secret_key: Key, public_key: Key) -> bytes:
+    """The raw ECDH shared secret Z of two keys."""
+    return secret_key.key_exchange(KeyAlg.A256GCM, public_key).get_secret_bytes()
+
+
+def _derive_kek(ze: bytes, zs: bytearray, wrap_alg: str, alg_id: str, apu: bytes, apv: bytes, cc_tag: bytes) -> Key:
+    """Derive the ECDH-1PU key wrapping key from Ze || Zs with the Concat KDF (SHA-256), as Askar does."""
+    key_length = _WRAP_KEY_LENGTHS[wrap_alg]
+    digest = hashlib.sha256(b"\x00\x00\x00\x01")
+    digest.update(ze)
+    digest.update(zs)
+    digest.update(_length_prefixed(alg_id.encode()) + _length_prefixed(apu) + _length_prefixed(apv))
+    digest.update(struct.pack(">I", key_length * 8) + _length_prefixed(cc_tag))
+    return Key.from_secret_bytes(wrap_alg, digest.digest()[:key_length])
+
+
+class CachingAskarCryptoService(AskarCryptoService):
+    """Askar crypto that caches the static-static ECDH secret of each pair of keys.
+
+    ECDH-1PU derives the key wrapping key from an ephemeral-static secret Ze
+    and a static-static secret Zs. Zs only depends on the sender's and the
+    recipient's long-lived keys, so it is computed once per pair of local
+    and remote keys and kept in a bounded LRU cache. Ze is still computed
+    for every message. Cached secrets are held in bytearrays that are
+    overwritten with zeros when evicted or cleared.
+
+    Messages are compatible with AskarCryptoService in both directions.
+    Envelopes are written with the JSON codec, and decrypted from an
+    envelope already parsed by EnvelopePackagingService.
+    """
+
+    accepts_parsed_envelopes = True
+
+    def __init__(self, max_entries: int = 1024):
+        """Initialize the crypto service.
+
+        Args:
+            max_entries: The most key pairs to cache secrets for
+        """
+        super().__init__()
+        if max_entries < 1:
+            raise ValueError(f"Invalid max_entries {max_entries}.")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._secrets: "OrderedDict[Tuple[str, bytes, str, bytes], bytearray]" = OrderedDict()
+
+    def _static_secret(self, local_key: AskarSecretKey, remote_key: AskarKey) -> bytearray:
+        # Both public keys are part of the entry, a kid reused for another key gets its own secret
+        entry = (local_key.kid, local_key.key.get_public_bytes(), remote_key.kid, remote_key.key.get_public_bytes())
+        secret = self._secrets.get(entry)
+        if secret is not None:
+            self._secrets.move_to_end(entry)
+            self.hits += 1
+            return secret
+        self.misses += 1
+        secret = bytearray(_shared_secret(local_key.key, remote_key.key))
+        self._secrets[entry] = secret
+        if len(self._secrets) > self.max_entries:
+            _, evicted = self._secrets.popitem(last=False)
+            _zeroize(evicted)
+        return secret
+
+    def clear(self):
+        """Zeroize and drop every cached secret."""
+        for secret in self._secrets.values():
+            _zeroize(secret)
+        self._secrets.clear()
+
+    async def ecdh_1pu_encrypt(self, to_keys: Sequence[AskarKey], sender_key: AskarSecretKey, message: bytes) -> bytes:
+        """Encode a message into DIDComm v2 authenticated encryption."""
+        builder = JweBuilder(with_flatten_recipients=False)
+
+        alg_id = "ECDH-1PU+A256KW"
+        enc_id = "A256CBC-HS512"
+        wrap_alg = "A256KW"
+        agree_alg = sender_key.key.algorithm
+
+        if not to_keys:
+            raise CryptoServiceError("No message recipients")
+
+        try:
+            cek = Key.generate(KeyAlg.A256CBC_HS512)
+            epk = Key.generate(agree_alg, ephemeral=True)
+        except AskarError:
+            raise CryptoServiceError("Error creating content encryption or ephemeral key")
+
+        apu = sender_key.kid.encode()
+        apv = []
+        for recip_key in to_keys:
+            if agree_alg != recip_key.key.algorithm:
+                raise CryptoServiceError("Recipient key types must be consistent")
+            apv.append(recip_key.kid)
+        apv.sort()
+        apv = hashlib.sha256((".".join(apv)).encode()).digest()
+
+        builder.set_protected(
+            OrderedDict(
+                [
+                    ("typ", "application/didcomm+encrypted"),
+                    ("alg", alg_id),
+                    ("enc", enc_id),
+                    ("apu", b64url(apu)),
+                    ("apv", b64url(apv)),
+                    ("epk", JSON.loads(epk.get_jwk_public())),
+                    ("skid", sender_key.kid),
+                ]
+            )
+        )
+        try:
+            payload = cek.aead_encrypt(message, aad=builder.protected_bytes)
+        except AskarError:
+            raise CryptoServiceError("Error encrypting message payload")
+        builder.set_payload(payload.ciphertext, payload.nonce, payload.tag)
+
+        for recip_key in to_keys:
+            try:
+                kek = _derive_kek(
+                    _shared_secret(epk, recip_key.key),
+                    self._static_secret(sender_key, recip_key),
+                    wrap_alg, alg_id, apu, apv, payload.tag,
+                )
+                enc_key = kek.wrap_key(cek)
+            except AskarError as err:
+                raise CryptoServiceError("Error wrapping content encryption key") from err
+            builder.add_recipient(JweRecipient(encrypted_key=enc_key.ciphertext, header={"kid": recip_key.kid}))
+
+        return JSON.dumps(builder.build().serialize())
+
+    async def ecdh_1pu_decrypt(self, enc_message: Union[str, bytes, JweEnvelope], recip_key: AskarSecretKey, sender_key: AskarKey):
+        """Decode a message, or a parsed envelope, from DIDComm v2 authenticated encryption."""
+        wrapper = enc_message if isinstance(enc_message, JweEnvelope) else JweEnvelope.from_json(enc_message)
+
+        alg_id = wrapper.protected.get("alg")
+        if alg_id in ("ECDH-1PU+A128KW", "ECDH-1PU+A256KW"):
+            wrap_alg = alg_id[9:]
+        else:
+            raise CryptoServiceError(f"Unsupported ECDH-1PU algorithm: {alg_id}")
+
+        enc_alg = wrapper.protected.get("enc")
+        if enc_alg not in ("A128CBC-HS256", "A256CBC-HS512"):
+            raise CryptoServiceError(f"Unsupported ECDH-1PU content encryption: {enc_alg}")
+
+        recip = wrapper.get_recipient(recip_key.kid)
+        if not recip:
+            raise CryptoServiceError(f"Recipient header not found: {recip_key.kid}")
+
+        epk_header = recip.header.get("epk")
+        if not epk_header:
+            raise CryptoServiceError("Missing ephemeral key")
+
+        try:
+            epk = Key.from_jwk(epk_header)
+            kek = _derive_kek(
+                _shared_secret(recip_key.key, epk),
+                self._static_secret(recip_key, sender_key),
+                wrap_alg, alg_id, wrapper.apu_bytes, wrapper.apv_bytes, wrapper.tag,
+            )
+            cek = kek.unwrap_key(enc_alg, recip.encrypted_key)
+        except AskarError as err:
+            raise CryptoServiceError("Error decrypting content encryption key") from err
+
+        try:
+            return cek.aead_decrypt(wrapper.ciphertext, nonce=wrapper.iv, tag=wrapper.tag, aad=wrapper.combined_aad)
+        except AskarError:
+            raise CryptoServiceError("Error decrypting message payload")
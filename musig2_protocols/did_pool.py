@@ -0,0 +1,133 @@
+import asyncio
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+from aries_askar import Key, KeyAlg
+from did_peer_2 import KeySpec, generate
+from didcomm_messaging.multiformats import multibase
+from didcomm_messaging.multiformats import multicodec
+from .log import get_logger
+
+
+log = get_logger(__name__)
+
+# DIDs generated per executor call while filling the pool
+_BATCH_SIZE = 16
+
+
+def _multikey(key: Key) -> str:
+    return multibase.encode(multicodec.wrap("secp256k1-pub", key.get_public_bytes()), "base58btc")
+
+
+def create_peer_did(endpoint: str) -> Tuple[str, Key, Key]:
+    """Generate a did:peer:2 with new verification and key agreement keys.
+
+    Args:
+        endpoint: The DIDComm service endpoint of the DID
+
+    Returns:
+        The DID, its verification key and its key agreement key
+    """
+    verkey = Key.generate(KeyAlg.K256)
+    xkey = Key.generate(KeyAlg.K256)
+    did = generate(
+        [KeySpec.verification(_multikey(verkey)), KeySpec.key_agreement(_multikey(xkey))],
+        [
+            {
+                "type": "DIDCommMessaging",
+                "serviceEndpoint": {
+                    "uri": endpoint,
+                    "accept": ["didcomm/v2"],
+                    "routingKeys": [],
+                },
+            },
+        ],
+    )
+    return str(did), verkey, xkey
+
+
+class PooledDID:
+    """A generated DID and its keys, not yet used by an agent."""
+
+    __slots__ = ("did", "verkey", "xkey")
+
+    def __init__(self, did: str, verkey: Key, xkey: Key):
+        self.did = did
+        self.verkey = verkey
+        self.xkey = xkey
+
+
+def _create_batch(endpoint: str, count: int) -> List[PooledDID]:
+    batch = []
+    for _ in range(count):
+        did, verkey, xkey = create_peer_did(endpoint)
+        batch.append(PooledDID(did, verkey, xkey))
+    return batch
+
+
+class DIDPool:
+    """Pre-generated DIDs, topped up by a background task between two watermarks.
+
+    Taking a DID is a deque pop. When fewer than `low_watermark` DIDs are
+    left, the task generates more until there are `high_watermark`. Keys are
+    generated on the default executor, so the event loop keeps handling
+    messages while the pool fills.
+    """
+
+    def __init__(self, endpoint: str, low_watermark: int = 16, high_watermark: int = 64):
+        """Initialize the pool.
+
+        Args:
+            endpoint: The service endpoint of the pooled DIDs
+            low_watermark: Refill once fewer DIDs than this are pooled
+            high_watermark: The number of DIDs a refill stops at
+        """
+        if not 0 <= low_watermark < high_watermark:
+            raise ValueError(f"Invalid watermarks {low_watermark} and {high_watermark}.")
+        self.endpoint = endpoint
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self._dids: Deque[PooledDID] = deque()
+        self._refill = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._dids)
+
+    def start(self):
+        """Start the background task and fill the pool. Call from the event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        self._refill.set()
+
+    async def stop(self):
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def take(self) -> Optional[PooledDID]:
+        """Take a pooled DID, or None if the pool is empty."""
+        pooled = self._dids.popleft() if self._dids else None
+        if len(self._dids) < self.low_watermark:
+            self._refill.set()
+        return pooled
+
+    async def fill(self, count: int = None):
+        """Generate DIDs until `count` are pooled, up to the high watermark by default.
+
+        Can be awaited to pre-generate DIDs for bulk onboarding.
+        """
+        target = self.high_watermark if count is None else count
+        loop = asyncio.get_running_loop()
+        while len(self._dids) < target:
+            batch = await loop.run_in_executor(None, _create_batch, self.endpoint, min(_BATCH_SIZE, target - len(self._dids)))
+            self._dids.extend(batch)
+
+    async def _run(self):
+        while True:
+            await self._refill.wait()
+            self._refill.clear()
+            try:
+                await self.fill()
+            except Exception as e:
+                log.error("did_pool_fill_failed", error=str(e))
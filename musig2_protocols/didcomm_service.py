@@ -1,35 +1,78 @@
-import json
-from aries_askar import Key, KeyAlg
 from didcomm_messaging.crypto.backend.askar import AskarCryptoService, AskarSecretKey
 from didcomm_messaging.crypto.backend.basic import InMemorySecretsManager
-from didcomm_messaging.packaging import PackagingService
-from didcomm_messaging.multiformats import multibase
-from didcomm_messaging.multiformats import multicodec
 from didcomm_messaging.resolver.peer import Peer2, Peer4
 from didcomm_messaging.resolver import PrefixResolver
-from did_peer_2 import KeySpec, generate, json
-from didcomm_messaging import DIDCommMessaging
+from didcomm_messaging import DIDCommMessaging, PackResult
 from didcomm_messaging.routing import RoutingService
 from pydid.did import DID
 import websockets
 import asyncio
+import time
 from collections import defaultdict
+from typing import Dict, Optional, Set
+from .codec import JSON
+from .crypto import CachingAskarCryptoService
+from .did_pool import DIDPool, create_peer_did
+from .journal import INBOUND, OUTBOUND, MessageJournal
+from .packaging import EnvelopePackagingService
+from .resolver import CachingResolver
+from .secrets import AskarStoreSecretsManager
 from .router import MessageRouter
+from .metrics import REGISTRY
+from .profiling import PROFILER
+from .transport import WebsocketTransport
+from .tracing import TRACER, TRACEPARENT, SPAN_KIND_CONSUMER, SPAN_KIND_PRODUCER, parse_traceparent
+from .log import get_logger, lazy
 import aiojobs
 
 
+log = get_logger(__name__)
+
+
+MESSAGES_SENT = REGISTRY.counter("musig2_didcomm_messages_sent_total", "DIDComm messages sent, by message type.", ["agent", "type"])
+MESSAGES_RECEIVED = REGISTRY.counter("musig2_didcomm_messages_received_total", "DIDComm messages unpacked and routed, by message type.", ["agent", "type"])
+MESSAGE_FAILURES = REGISTRY.counter("musig2_didcomm_message_failures_total", "Messages that failed to send (out) or to unpack and route (in).", ["agent", "direction"])
+PACK_SECONDS = REGISTRY.histogram("musig2_didcomm_pack_seconds", "Time to pack an outgoing message, including DID resolution.", ["agent"])
+UNPACK_SECONDS = REGISTRY.histogram("musig2_didcomm_unpack_seconds", "Time to unpack an incoming message.", ["agent"])
+OUTBOUND_QUEUE_DEPTH = REGISTRY.gauge("musig2_didcomm_outbound_queue_depth", "Packed messages waiting to be sent, over all endpoints.", ["agent"])
+OUTBOUND_CONNECTIONS = REGISTRY.gauge("musig2_didcomm_outbound_connections", "Open websocket connections to other agents.", ["agent"])
+ENVELOPES_REJECTED = REGISTRY.counter("musig2_didcomm_envelopes_rejected_total", "Frames dropped before decryption, because they are not envelopes or have no local recipient.", ["agent", "reason"])
+INBOUND_CONNECTIONS = REGISTRY.gauge("musig2_didcomm_inbound_connections", "Websocket clients connected to this agent.", ["agent"])
+
+
 class DIDCommService:
 
-    def __init__(self, name: str, host: str, port: int, tls: bool = False):
+    def __init__(self, name: str, host: str, port: int, tls: bool = False, connect=None, ecdh_cache_size: int = 0, scheduler: aiojobs.Scheduler = None, transport: WebsocketTransport = None, reuse_port: bool = False):
+        """Initialize the service.
+
+        Args:
+            name: The agent's name, used in logs and metric labels
+            host: The interface to listen on, part of the DIDs' service endpoint
+            port: The port to listen on
+            tls: Whether the endpoint uses TLS, with the transport's certificate
+            connect: Opens a connection to an endpoint, websockets by default
+            ecdh_cache_size: Cache the static ECDH secrets of this many key pairs, 0 to disable
+            scheduler: Runs the message handlers, an aiojobs.Scheduler with its default limits by default
+            transport: Websocket settings of the listener and of connections to other agents, websockets' defaults by default
+            reuse_port: Listen with SO_REUSEPORT, so processes serving the same DID share the port
+
+        Raises:
+            ValueError: If tls is set but the transport has no certificate
+        """
+        self.transport = transport or WebsocketTransport()
+        if tls and self.transport.tls_certfile is None:
+            raise ValueError("A TLS endpoint needs the transport's tls_certfile.")
         self.name = name
         self.host = host
         self.port = port
-        self.didcomm_websocket_url = f"ws://{host}:{port}"
+        self.didcomm_websocket_url = f"{'wss' if tls else 'ws'}://{host}:{port}"
         self.tls = tls
-        self.crypto = AskarCryptoService()
+        # Senders and recipients keep their keys for the life of a cohort, so their static secret can be reused
+        self.crypto = CachingAskarCryptoService(ecdh_cache_size) if ecdh_cache_size else AskarCryptoService()
         self.secrets = InMemorySecretsManager()
-        self.resolver = PrefixResolver({"did:peer:2": Peer2(), "did:peer:4": Peer4()})
-        self.packaging = PackagingService()
+        self.resolver = CachingResolver(PrefixResolver({"did:peer:2": Peer2(), "did:peer:4": Peer4()}))
+        # Unpacks envelopes parsed once on arrival
+        self.packaging = EnvelopePackagingService()
         self.routing = RoutingService()
         self.didcomm_messaging = DIDCommMessaging(
             crypto=self.crypto,
@@ -39,9 +82,22 @@ class DIDCommService:
             routing=self.routing,
         )
         
-        # Initialize message router with a scheduler
-        self.scheduler = aiojobs.Scheduler()
-        self.message_router = MessageRouter(self.scheduler)
+        # Initialize message router with a scheduler, closed by cleanup unless it was passed in
+        self.scheduler = scheduler or aiojobs.Scheduler()
+        self._owns_scheduler = scheduler is None
+        self.message_router = MessageRouter(self.scheduler, agent=name)
+        # Routers of the agents hosted on this service, by recipient key id. Other messages go to message_router.
+        self.routers_by_kid: Dict[str, MessageRouter] = {}
+        # Key ids of the secrets held by this service, checked before an envelope is decrypted
+        self.local_kids: Set[str] = set()
+        # Pre-generated DIDs, see start_did_pool
+        self.did_pool: Optional[DIDPool] = None
+        # DIDs generated with a label, kept across restarts by open_secrets
+        self.dids_by_label: Dict[str, str] = {}
+        # Records sent and received envelopes, see enable_journal
+        self.journal: Optional[MessageJournal] = None
+        # Set once the websocket listener accepts connections
+        self.listening = asyncio.Event()
         
         # Store active websocket connections
         self.connections = {}
@@ -51,108 +107,211 @@ class DIDCommService:
         self.connection_locks = defaultdict(asyncio.Lock)
         # Track connection status
         self.connection_status = defaultdict(bool)
+        # Opens a connection to an endpoint. Replaceable with an in-process transport.
+        self.reuse_port = reuse_port
+        self.connect = connect or self.connect_websocket
 
-    async def generate_did(self):
-        """Generate a DID for the coordinator."""
-        verkey = Key.generate(KeyAlg.K256)
-        xkey = Key.generate(KeyAlg.K256)
-
-        did = generate(
-            [
-                KeySpec.verification(
-                    multibase.encode(
-                        multicodec.wrap(
-                            "secp256k1-pub",
-                            verkey.get_public_bytes()
-                        ),
-                        "base58btc",
-                    )
-                ),
-                KeySpec.key_agreement(
-                    multibase.encode(
-                        multicodec.wrap(
-                            "secp256k1-pub",
-                            xkey.get_public_bytes()
-                        ),
-                        "base58btc"
-                    )
-                ),
-            ],
-            [
-                {
-                    "type": "DIDCommMessaging",
-                    "serviceEndpoint": {
-                        "uri": self.didcomm_websocket_url,
-                        "accept": ["didcomm/v2"],
-                        "routingKeys": [],
-                    },
-                },
-            ],
-        )
-        await self.secrets.add_secret(AskarSecretKey(verkey, f"{did}#key-1"))
-        await self.secrets.add_secret(AskarSecretKey(xkey, f"{did}#key-2"))
+        # Metrics for this agent, children are kept to skip label lookups per message
+        self._pack_seconds = PACK_SECONDS.labels(name)
+        self._unpack_seconds = UNPACK_SECONDS.labels(name)
+        self._send_failures = MESSAGE_FAILURES.labels(name, "out")
+        self._receive_failures = MESSAGE_FAILURES.labels(name, "in")
+        self._rejected_malformed = ENVELOPES_REJECTED.labels(name, "malformed")
+        self._rejected_unknown_recipient = ENVELOPES_REJECTED.labels(name, "unknown_recipient")
+        self._inbound_connections = INBOUND_CONNECTIONS.labels(name)
+        OUTBOUND_QUEUE_DEPTH.labels(name).set_function(lambda: sum(queue.qsize() for queue in list(self.message_queues.values())))
+        OUTBOUND_CONNECTIONS.labels(name).set_function(lambda: len(self.connections))
+
+    async def generate_did(self, label: str = None):
+        """Generate a DID on this service's endpoint, taken from the DID pool when one is running.
+
+        Args:
+            label: Return the DID generated earlier with this label, from the
+                secrets store after a restart, instead of a new one (optional)
+        """
+        if label is not None and label in self.dids_by_label:
+            return self.dids_by_label[label]
+        pooled = self.did_pool.take() if self.did_pool is not None else None
+        if pooled is not None:
+            did, verkey, xkey = pooled.did, pooled.verkey, pooled.xkey
+        else:
+            did, verkey, xkey = create_peer_did(self.didcomm_websocket_url)
+        await self.add_secret(AskarSecretKey(verkey, f"{did}#key-1"), label)
+        await self.add_secret(AskarSecretKey(xkey, f"{did}#key-2"), label)
+        if label is not None:
+            self.dids_by_label[label] = did
         return did
 
+    def start_did_pool(self, low_watermark: int = 16, high_watermark: int = 64) -> DIDPool:
+        """Pre-generate DIDs in the background, for subscriptions and new contacts.
+
+        Call from the event loop. Await `did_pool.fill(count)` to pre-generate
+        DIDs for a bulk onboarding.
+
+        Args:
+            low_watermark: Refill once fewer DIDs than this are pooled
+            high_watermark: The number of DIDs a refill stops at
+        """
+        if self.did_pool is None:
+            self.did_pool = DIDPool(self.didcomm_websocket_url, low_watermark, high_watermark)
+        self.did_pool.start()
+        return self.did_pool
+
+    async def add_secret(self, secret: AskarSecretKey, label: str = None):
+        """Store a secret and accept envelopes encrypted to its key id."""
+        if isinstance(self.secrets, AskarStoreSecretsManager):
+            await self.secrets.add_secret(secret, label)
+        else:
+            await self.secrets.add_secret(secret)
+        self.local_kids.add(secret.kid)
+
+    async def open_secrets(self, path: str, passphrase: str, key_method: str = "kdf:argon2i:mod") -> AskarStoreSecretsManager:
+        """Keep secrets in an encrypted Askar store and load the DIDs of earlier runs.
+
+        Call before generating DIDs. Labelled DIDs, such as an agent's main DID,
+        are returned by `generate_did` again instead of new ones. The host and
+        port should not change between runs, they are part of every DID.
+
+        Args:
+            path: Path of the SQLite database file, created if it does not exist
+            passphrase: The store's passphrase, or a raw key with key_method "raw"
+            key_method: How the store key is derived from the passphrase
+        """
+        started = time.perf_counter()
+        secrets = await AskarStoreSecretsManager.open(path, passphrase, key_method)
+        self.local_kids.update(await secrets.load())
+        self.dids_by_label.update(secrets.labels)
+        self.secrets = secrets
+        self.didcomm_messaging.secrets = secrets
+        log.info("secrets_opened", agent=self.name, path=path, keys=len(secrets.secrets), seconds=round(time.perf_counter() - started, 4))
+        return secrets
+
+    def local_recipient(self, packed_message) -> Optional[str]:
+        """Get the first recipient key id of an envelope held by this service, without decrypting it.
+
+        Args:
+            packed_message: The received frame, or the envelope already parsed from it
+
+        Returns:
+            The key id, or None if the frame is not an encrypted envelope or has no local recipient
+        """
+        try:
+            envelope = JSON.loads(packed_message) if isinstance(packed_message, (str, bytes)) else packed_message
+            recipients = envelope["recipients"]
+            kids = [recipient["header"]["kid"] for recipient in recipients]
+            if not all(isinstance(kid, str) for kid in kids):
+                raise TypeError("Recipient key ids must be strings.")
+        except (ValueError, KeyError, TypeError):
+            self._rejected_malformed.inc()
+            log.debug("envelope_rejected", agent=self.name, reason="malformed")
+            return None
+        for kid in kids:
+            if kid in self.local_kids:
+                return kid
+        self._rejected_unknown_recipient.inc()
+        log.debug("envelope_rejected", agent=self.name, reason="unknown_recipient", kids=kids)
+        return None
+
+    def enable_journal(self, directory: str, capture_plaintext: bool = False, segment_size: int = 64 * 1024 * 1024) -> MessageJournal:
+        """Record every envelope sent and received, for replay with JournalReplay.
+
+        Args:
+            directory: Directory of the journal's segment files
+            capture_plaintext: Also record the decrypted messages
+            segment_size: Bytes after which a new segment file is started
+        """
+        self.journal = MessageJournal(directory, capture_plaintext, segment_size)
+        return self.journal
+
+    def set_did_router(self, did: str, router: MessageRouter):
+        """Route messages encrypted to a DID's keys to another router, e.g. a hosted agent's."""
+        for kid in (f"{did}#key-1", f"{did}#key-2"):
+            self.routers_by_kid[kid] = router
+
+    def remove_did_router(self, did: str):
+        for kid in (f"{did}#key-1", f"{did}#key-2"):
+            self.routers_by_kid.pop(kid, None)
+
+    async def connect_websocket(self, endpoint: str):
+        """Open a websocket connection to an endpoint with the transport's settings."""
+        return await websockets.connect(endpoint, **self.transport.connect_options(endpoint))
+
     async def get_connection(self, endpoint: str):
         """Get or create a websocket connection to an endpoint."""
         async with self.connection_locks[endpoint]:
             if endpoint not in self.connections:
                 try:
-                    print(f"{self.name}: Creating new connection to {endpoint}")
-                    self.connections[endpoint] = await websockets.connect(endpoint)
+                    log.debug("connecting", agent=self.name, endpoint=endpoint)
+                    self.connections[endpoint] = await self.connect(endpoint)
+                    self.transport.remember_session(self.connections[endpoint])
                     self.connection_status[endpoint] = True
-                    print(f"{self.name}: Successfully connected to {endpoint}")
+                    log.info("connected", agent=self.name, endpoint=endpoint)
                 except Exception as e:
-                    print(f"{self.name}: Error connecting to {endpoint}: {str(e)}")
+                    log.warning("connect_failed", agent=self.name, endpoint=endpoint, error=str(e))
                     self.connection_status[endpoint] = False
                     raise
             return self.connections[endpoint]
 
     async def send_message(self, message, to, frm):
-        print(f"{self.name}: Preparing to send message to {to}")
-        packy = await self.didcomm_messaging.pack(
-            message=message,
-            to=to,
-            frm=frm,
+        # Ended by the queue processor once the message is written
+        send_span = TRACER.start_span(
+            "didcomm.send",
+            agent=self.name,
+            attributes={"musig2.message_type": message.get("type"), "didcomm.to": to},
+            kind=SPAN_KIND_PRODUCER,
         )
+        if TRACER.enabled:
+            # Carry the span in a message header so the recipient's spans join the trace
+            message = {**message, TRACEPARENT: send_span.traceparent()}
+        pack_start = time.perf_counter()
+        with TRACER.start_span("didcomm.pack", parent=send_span):
+            # As DIDCommMessaging.pack, with the message serialized by the JSON codec
+            plaintext = JSON.dumps(message)
+            packed = await self.packaging.pack(self.crypto, self.resolver, self.secrets, plaintext, [to], frm)
+            packy = PackResult(*await self.routing.prepare_forward(self.crypto, self.packaging, self.resolver, self.secrets, to, packed))
+        self._pack_seconds.observe(time.perf_counter() - pack_start)
         packed = packy.message            
         endpoint = packy.get_endpoint("ws")
-        print(f"{self.name}: Got endpoint {endpoint} for message to {to}")
+        if self.journal is not None:
+            self.journal.record(OUTBOUND, to, message.get("type"), packed, plaintext)
         
         # Add message to queue
-        await self.message_queues[endpoint].put((packed, message))
-        print(f"{self.name}: Added message to queue for {endpoint}")
+        await self.message_queues[endpoint].put((packed, message, send_span, time.time_ns()))
+        log.debug("message_queued", agent=self.name, type=message.get("type"), to=to, endpoint=endpoint)
         
         # Process message queue if not already running
         if not hasattr(self, f"_queue_processor_{endpoint}"):
-            print(f"{self.name}: Starting queue processor for {endpoint}")
             setattr(self, f"_queue_processor_{endpoint}", asyncio.create_task(
                 self._process_message_queue(endpoint)
             ))
 
     async def _process_message_queue(self, endpoint):
         """Process messages in the queue for a specific endpoint."""
-        print(f"{self.name}: Starting message queue processor for {endpoint}")
+        log.debug("queue_processor_started", agent=self.name, endpoint=endpoint)
         while True:
+            send_span = None
             try:
-                packed, original_message = await self.message_queues[endpoint].get()
-                print(f"{self.name}: Processing message from queue for {endpoint}")
+                packed, original_message, send_span, queued_at = await self.message_queues[endpoint].get()
+                TRACER.start_span("didcomm.queue", parent=send_span, start_time=queued_at).end()
                 
                 websocket = await self.get_connection(endpoint)
                 if not self.connection_status[endpoint]:
-                    print(f"{self.name}: Connection to {endpoint} is not active, retrying...")
+                    log.warning("connection_inactive", agent=self.name, endpoint=endpoint)
                     await asyncio.sleep(1)
                     continue
                 
-                print(f"{self.name}: Sending message to {endpoint}")
-                await websocket.send(packed)
+                with TRACER.start_span("didcomm.write", parent=send_span):
+                    await websocket.send(packed)
+                send_span.end()
+                MESSAGES_SENT.labels(self.name, original_message["type"]).inc()
                 
-                # print(f"{self.name}: Waiting for response from {endpoint}")
-                # response = await websocket.recv()
-                # print(f"{self.name}: Received response from {endpoint}: {response}")
                 self.message_queues[endpoint].task_done()
             except Exception as e:
-                print(f"{self.name}: Error processing message queue for {endpoint}: {str(e)}")
+                log.warning("send_failed", agent=self.name, endpoint=endpoint, error=str(e))
+                self._send_failures.inc()
+                if send_span is not None:
+                    send_span.record_exception(e)
+                    send_span.end()
                 self.connection_status[endpoint] = False
                 # If connection is closed, remove it so it will be recreated
                 if endpoint in self.connections:
@@ -161,51 +320,124 @@ class DIDCommService:
 
     def register_message_handler(self, message_type: str, handler):
         """Register a handler function for a specific message type."""
-        print(f"{self.name}: Registering handler for message type {message_type}")
+        log.debug("handler_registered", agent=self.name, type=message_type)
         self.message_router.add_route(message_type, handler)
 
     def remove_message_handler(self, message_type: str):
         """Remove a handler for a specific message type."""
-        print(f"{self.name}: Removing handler for message type {message_type}")
+        log.debug("handler_removed", agent=self.name, type=message_type)
         if message_type in self.message_router.routes:
             del self.message_router.routes[message_type]
 
     async def handle_messages(self, websocket):
-        print(f"{self.name}: New client connected")
+        log.debug("client_connected", agent=self.name)
+        self._inbound_connections.inc()
         try:
             async for packed_message in websocket:
-                print(f"{self.name}: Received raw message")
-                print(f"\nMessage: {json.dumps(json.loads(packed_message.decode()), indent=2)}\n")
+                await self.receive_packed_message(packed_message)
+
+        except websockets.exceptions.ConnectionClosed as e:
+            log.debug("client_disconnected", agent=self.name, reason=str(e))
+        finally:
+            self._inbound_connections.dec()
+
+    async def receive_packed_message(self, packed_message):
+        """Unpack a received DIDComm message and route it to the registered handlers."""
+        log.debug("envelope_received", agent=self.name, size=len(packed_message))
+        received_at = time.time_ns()
+        # Parsed once here, for the recipient check and for unpacking
+        try:
+            envelope = JSON.loads(packed_message)
+        except ValueError:
+            envelope = None
+        # Drop junk and misdirected frames before any crypto runs
+        recipient_kid = self.local_recipient(packed_message if envelope is None else envelope)
+        if recipient_kid is None:
+            if self.journal is not None:
+                self.journal.record(INBOUND, None, None, packed_message, timestamp_ns=received_at)
+            return
+        msg = None
+        unpacked = None
+        try:
+            unpack_start = time.perf_counter()
+            unpacked, _ = await self.packaging.unpack(
+                self.crypto, self.resolver, self.secrets, packed_message, envelope
+            )
+            self._unpack_seconds.observe(time.perf_counter() - unpack_start)
+            unpacked_at = time.time_ns()
+            msg = JSON.loads(unpacked)
+            # Route the message to the agent owning the recipient key
+            router = self.routers_by_kid.get(recipient_kid, self.message_router)
+            MESSAGES_RECEIVED.labels(self.name, router.metric_type(msg.get("type"))).inc()
+            log.debug("message_received", agent=self.name, type=msg.get("type"), frm=msg.get("from"), message=lazy(lambda: JSON.dumps(msg).decode()))
+
+            # The sender's span is only known once the message is unpacked
+            receive_span = TRACER.start_span(
+                "didcomm.receive",
+                agent=self.name,
+                attributes={"musig2.message_type": msg.get("type"), "didcomm.from": msg.get("from")},
+                parent=parse_traceparent(msg.get(TRACEPARENT)),
+                kind=SPAN_KIND_CONSUMER,
+                start_time=received_at,
+            )
+            with receive_span:
+                TRACER.start_span("didcomm.unpack", start_time=received_at).end(unpacked_at)
+                await router.route_message(msg)
+        except Exception as e:
+            log.warning("receive_failed", agent=self.name, error=str(e))
+            self._receive_failures.inc()
+        finally:
+            if self.journal is not None:
+                # The plaintext is the sender's, it need not be an object
+                is_object = isinstance(msg, dict)
                 try:
-                    unpacked = await self.didcomm_messaging.packaging.unpack(
-                        self.crypto, self.resolver, self.secrets, packed_message
+                    self.journal.record(
+                        INBOUND,
+                        msg.get("from") if is_object else None,
+                        msg.get("type") if is_object else None,
+                        packed_message,
+                        unpacked,
+                        timestamp_ns=received_at,
                     )
-                    msg = json.loads(unpacked[0].decode())
-                    print(f"{self.name}: Successfully unpacked message: {json.dumps(msg, indent=2)}")
-
-                    # Route the message using MessageRouter
-                    await self.message_router.route_message(msg)
                 except Exception as e:
-                    print(f"{self.name}: Error processing message: {str(e)}")
-
-        except websockets.exceptions.ConnectionClosed as e:
-            print(f"{self.name}: Connection closed: {str(e)}")
+                    # Never let journaling drop the connection
+                    log.warning("journal_record_failed", agent=self.name, error=str(e))
 
     async def start_websocket_connection(self):
-        print(f"{self.name}: Starting websocket server on {self.didcomm_websocket_url}")
-        async with websockets.serve(self.handle_messages, self.host, self.port):
-            print(f"{self.name}: WebSocket server started successfully")
+        log.info("server_starting", agent=self.name, url=self.didcomm_websocket_url)
+        # Measures event loop lag while profiling is enabled, once per process
+        PROFILER.start_lag_monitor()
+        serve_options = self.transport.serve_options(self.tls)
+        if self.reuse_port:
+            serve_options["reuse_port"] = True
+        async with websockets.serve(self.handle_messages, self.host, self.port, **serve_options):
+            log.info("server_started", agent=self.name, url=self.didcomm_websocket_url)
+            self.listening.set()
             await asyncio.Future()  # Run forever
 
     async def cleanup(self):
-        """Clean up all connections and queues."""
-        print(f"{self.name}: Cleaning up connections and queues")
+        """Clean up all connections, queues and their processors, and the scheduler if this service created it."""
+        log.debug("cleanup", agent=self.name)
+        if self.did_pool is not None:
+            await self.did_pool.stop()
+        processors = [vars(self).pop(name) for name in list(vars(self)) if name.startswith("_queue_processor_")]
+        for processor in processors:
+            processor.cancel()
+        await asyncio.gather(*processors, return_exceptions=True)
         for endpoint, websocket in self.connections.items():
             try:
                 await websocket.close()
-                print(f"{self.name}: Closed connection to {endpoint}")
+                log.debug("connection_closed", agent=self.name, endpoint=endpoint)
             except Exception as e:
-                print(f"{self.name}: Error closing connection to {endpoint}: {str(e)}")
+                log.warning("connection_close_failed", agent=self.name, endpoint=endpoint, error=str(e))
         self.connections.clear()
         self.message_queues.clear()
-        self.connection_status.clear()
\ No newline at end of file
+        self.connection_status.clear()
+        if isinstance(self.secrets, AskarStoreSecretsManager):
+            await self.secrets.close()
+        if isinstance(self.crypto, CachingAskarCryptoService):
+            self.crypto.clear()
+        if self._owns_scheduler:
+            await self.scheduler.close()
+        if self.journal is not None:
+            self.journal.close()
\ No newline at end of file
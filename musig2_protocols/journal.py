@@ -0,0 +1,290 @@
+import asyncio
+import mmap
+import os
+import struct
+import time
+from typing import Iterator, Optional, Union
+from .codec import JSON
+from .log import get_logger
+
+
+log = get_logger(__name__)
+
+INBOUND = 0
+OUTBOUND = 1
+DIRECTIONS = {INBOUND: "in", OUTBOUND: "out"}
+
+SEGMENT_PREFIX = "journal-"
+SEGMENT_SUFFIX = ".seg"
+
+# Record header: length of the rest of the record, timestamp (ns), direction,
+# then the lengths of the peer, message type, envelope and plaintext fields
+_HEADER = struct.Struct("<IQBxHHII")
+# Longest peer or message type field, longer ones are truncated
+MAX_FIELD_LENGTH = 0xFFFF
+
+
+def _as_bytes(value: Union[str, bytes, None]) -> bytes:
+    if value is None:
+        return b""
+    if isinstance(value, str):
+        return value.encode()
+    return bytes(value)
+
+
+def _header_field(value) -> bytes:
+    """Encode a peer or message type field. Inbound ones come from the sender and may be anything."""
+    if not isinstance(value, str):
+        return b""
+    encoded = value.encode("utf-8", "replace")
+    if len(encoded) > MAX_FIELD_LENGTH:
+        # Cut at a character boundary, so the field still decodes
+        encoded = encoded[:MAX_FIELD_LENGTH].decode("utf-8", "ignore").encode()
+    return encoded
+
+
+class JournalRecord:
+    """One envelope sent or received, as read from a journal."""
+
+    __slots__ = ("timestamp_ns", "direction", "peer", "message_type", "envelope", "plaintext")
+
+    def __init__(self, timestamp_ns: int, direction: int, peer: str, message_type: str, envelope: bytes, plaintext: Optional[bytes]):
+        self.timestamp_ns = timestamp_ns
+        self.direction = direction
+        self.peer = peer
+        self.message_type = message_type
+        self.envelope = envelope
+        self.plaintext = plaintext
+
+    def message(self) -> Optional[dict]:
+        """Get the decrypted message, if plaintext was captured."""
+        return JSON.loads(self.plaintext) if self.plaintext else None
+
+    def __repr__(self) -> str:
+        return f"JournalRecord({self.timestamp_ns}, {DIRECTIONS[self.direction]}, {self.message_type!r}, {self.peer!r}, {len(self.envelope)} bytes)"
+
+
+class MessageJournal:
+    """Append-only journal of the envelopes a DIDCommService sends and receives.
+
+    Records are appended to numbered segment files in a directory, and a new
+    segment is started once the current one reaches `segment_size` bytes.
+    Each record holds a timestamp, the direction, the peer DID, the message
+    type and the packed envelope. Decrypted messages are only written with
+    `capture_plaintext`, since they hold the protocol data in the clear.
+    Writes are buffered and flushed once per event loop iteration.
+
+    Segments are read back with `read_journal`, which memory maps them.
+    """
+
+    def __init__(self, directory: str, capture_plaintext: bool = False, segment_size: int = 64 * 1024 * 1024):
+        """Initialize the journal.
+
+        Args:
+            directory: Directory of the segment files, created if it does not exist
+            capture_plaintext: Also record decrypted messages, needed to replay into a MessageRouter without keys
+            segment_size: Bytes after which a new segment file is started
+        """
+        if segment_size < _HEADER.size:
+            raise ValueError(f"Invalid segment_size {segment_size}.")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.capture_plaintext = capture_plaintext
+        self.segment_size = segment_size
+        self.records = 0
+        existing = _segment_paths(directory)
+        # Never append to a segment of an earlier run, it may end in a partial record
+        self._segment_index = _segment_number(existing[-1]) + 1 if existing else 0
+        self._segment = None
+        self._segment_bytes = 0
+        self._flush_handle: Optional[asyncio.Handle] = None
+
+    def record(self, direction: int, peer: Optional[str], message_type: Optional[str], envelope: Union[str, bytes], plaintext: Union[str, bytes, None] = None, timestamp_ns: int = None):
+        """Append a record.
+
+        Args:
+            direction: INBOUND or OUTBOUND
+            peer: The DID of the sender (inbound) or recipient (outbound), None if not known.
+                Values that are not strings are recorded as unknown, longer ones are truncated.
+            message_type: The message type, None if the envelope could not be decrypted, like peer
+            envelope: The packed envelope
+            plaintext: The decrypted message, only written with capture_plaintext
+            timestamp_ns: When the envelope was sent or received, now by default
+        """
+        peer_bytes = _header_field(peer)
+        type_bytes = _header_field(message_type)
+        envelope_bytes = _as_bytes(envelope)
+        plaintext_bytes = _as_bytes(plaintext) if self.capture_plaintext else b""
+        body_length = _HEADER.size - 4 + len(peer_bytes) + len(type_bytes) + len(envelope_bytes) + len(plaintext_bytes)
+        header = _HEADER.pack(
+            body_length,
+            timestamp_ns if timestamp_ns is not None else time.time_ns(),
+            direction,
+            len(peer_bytes),
+            len(type_bytes),
+            len(envelope_bytes),
+            len(plaintext_bytes),
+        )
+        segment = self._current_segment()
+        segment.write(header)
+        segment.write(peer_bytes)
+        segment.write(type_bytes)
+        segment.write(envelope_bytes)
+        segment.write(plaintext_bytes)
+        self._segment_bytes += 4 + body_length
+        self.records += 1
+        self._schedule_flush()
+
+    def flush(self):
+        """Write buffered records to the current segment."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._segment is not None:
+            self._segment.flush()
+
+    def close(self):
+        """Flush and close the current segment."""
+        self.flush()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        log.info("journal_closed", directory=self.directory, records=self.records)
+
+    def _current_segment(self):
+        if self._segment is not None and self._segment_bytes >= self.segment_size:
+            self._segment.close()
+            self._segment = None
+            self._segment_index += 1
+        if self._segment is None:
+            path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{self._segment_index:08d}{SEGMENT_SUFFIX}")
+            self._segment = open(path, "ab", buffering=1024 * 1024)
+            self._segment_bytes = self._segment.tell()
+            log.debug("journal_segment_opened", path=path)
+        return self._segment
+
+    def _schedule_flush(self):
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._flush_handle = loop.call_soon(self.flush)
+
+
+def _segment_number(path: str) -> int:
+    return int(os.path.basename(path)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+
+def _segment_paths(directory: str):
+    names = [name for name in os.listdir(directory) if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)]
+    return sorted(os.path.join(directory, name) for name in names)
+
+
+def read_journal(directory: str, direction: int = None) -> Iterator[JournalRecord]:
+    """Read the records of a journal in the order they were written.
+
+    A record cut short at the end of a segment, e.g. by a crash, is skipped.
+
+    Args:
+        directory: The journal's directory
+        direction: Only read INBOUND or OUTBOUND records (optional)
+    """
+    for path in _segment_paths(directory):
+        if os.path.getsize(path) == 0:
+            continue
+        with open(path, "rb") as segment, mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            size = len(data)
+            while offset + _HEADER.size <= size:
+                body_length, timestamp_ns, record_direction, peer_length, type_length, envelope_length, plaintext_length = _HEADER.unpack_from(data, offset)
+                end = offset + 4 + body_length
+                if end > size:
+                    log.warning("journal_truncated", path=path, offset=offset)
+                    break
+                if direction is None or record_direction == direction:
+                    position = offset + _HEADER.size
+                    peer = data[position:position + peer_length].decode()
+                    position += peer_length
+                    message_type = data[position:position + type_length].decode()
+                    position += type_length
+                    envelope = data[position:position + envelope_length]
+                    position += envelope_length
+                    plaintext = data[position:position + plaintext_length] if plaintext_length else None
+                    yield JournalRecord(timestamp_ns, record_direction, peer or None, message_type or None, envelope, plaintext)
+                offset = end
+
+
+class JournalReplay:
+    """Feeds the inbound records of a journal back into an agent, keeping their timing.
+
+    Records are replayed in order. With `speed` 1 they are spaced as they
+    were received, with `speed` 10 ten times faster, and with `speed` None
+    as fast as possible. Replay into a MessageRouter needs plaintext capture.
+    Replay into a DIDCommService decrypts the envelopes again, which needs
+    the service to hold the recorded agent's keys, e.g. from its secrets store.
+    """
+
+    def __init__(self, directory: str, speed: Optional[float] = 1.0):
+        """Initialize the replay.
+
+        Args:
+            directory: The journal's directory
+            speed: How many times faster than recorded to replay, None for no delays
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError(f"Invalid speed {speed}.")
+        self.directory = directory
+        self.speed = speed
+        self.replayed = 0
+        # Largest delay behind the scheduled replay time, in seconds
+        self.max_lag = 0.0
+
+    async def replay_to_router(self, router) -> int:
+        """Route the recorded decrypted messages with a MessageRouter.
+
+        Returns:
+            The number of messages replayed
+        """
+        async def deliver(record: JournalRecord):
+            message = record.message()
+            if message is None:
+                return False
+            await router.route_message(message)
+            return True
+        return await self._replay(deliver)
+
+    async def replay_to_service(self, service) -> int:
+        """Unpack and route the recorded envelopes with a DIDCommService.
+
+        Returns:
+            The number of envelopes replayed
+        """
+        async def deliver(record: JournalRecord):
+            await service.receive_packed_message(bytes(record.envelope))
+            return True
+        return await self._replay(deliver)
+
+    async def _replay(self, deliver) -> int:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first_timestamp = None
+        skipped = 0
+        for record in read_journal(self.directory, INBOUND):
+            if first_timestamp is None:
+                first_timestamp = record.timestamp_ns
+            if self.speed is not None:
+                due = started + (record.timestamp_ns - first_timestamp) / 1e9 / self.speed
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.max_lag = max(self.max_lag, -delay)
+            if await deliver(record):
+                self.replayed += 1
+            else:
+                skipped += 1
+        log.info("journal_replayed", directory=self.directory, replayed=self.replayed, skipped=skipped, max_lag=round(self.max_lag, 6))
+        return self.replayed
@@ -0,0 +1,474 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import sys
+import tempfile
+from typing import Any, Dict, List
+from buidl.hd import HDPrivateKey
+from .beacon_coordinator import BeaconCoordinator
+from .beacon_participant import BeaconParticipant
+from .did_pool import DIDPool
+from .didcomm_service import DIDCommService
+from .log import configure_logging, get_logger, shutdown_logging
+from .runtime import INTEGER, NUMBER, OPTIONAL_INTEGER, OPTIONAL_NUMBER, OPTIONAL_STRING, LoopConfig, SchedulerConfig, check_keys, run
+from .sharding import CoordinatorShard
+from .signing_scheduler import BatchWindow
+from .transport import WebsocketTransport
+
+
+log = get_logger(__name__)
+
+COORDINATOR = "coordinator"
+PARTICIPANT = "participant"
+ROLES = (COORDINATOR, PARTICIPANT)
+
+DEFAULT_PORTS = {COORDINATOR: 8767, PARTICIPANT: 8766}
+
+# Seconds between checks for enough subscribers to announce the next configured cohort
+SUBSCRIBER_POLL_INTERVAL = 1.0
+
+
+class TransportConfig:
+    """Settings of an agent's DIDComm service and websocket listener."""
+
+    KEYS = ("ecdh_cache_size", "tls", "websocket")
+    TYPES = {"ecdh_cache_size": INTEGER, "tls": (bool,), "websocket": (dict,)}
+
+    def __init__(self, ecdh_cache_size: int = 0, tls: bool = False, websocket: WebsocketTransport = None):
+        """Initialize the transport settings.
+
+        Args:
+            ecdh_cache_size: Cache the static ECDH secrets of this many key pairs, 0 to disable
+            tls: Listen with TLS and advertise a wss:// endpoint, with websocket's tls_certfile
+            websocket: Websocket settings of the listener and of connections to other agents, websockets' defaults by default
+
+        Raises:
+            ValueError: If a setting is invalid
+        """
+        if ecdh_cache_size < 0:
+            raise ValueError("ecdh_cache_size must not be negative.")
+        self.ecdh_cache_size = ecdh_cache_size
+        self.tls = tls
+        self.websocket = websocket or WebsocketTransport()
+        if tls and self.websocket.tls_certfile is None:
+            raise ValueError("tls needs websocket.tls_certfile.")
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TransportConfig":
+        check_keys("transport", data, cls.KEYS, cls.TYPES)
+        data = dict(data)
+        if "websocket" in data:
+            data["websocket"] = WebsocketTransport.from_dict(data["websocket"])
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"ecdh_cache_size": self.ecdh_cache_size, "tls": self.tls, "websocket": self.websocket.to_dict()}
+
+
+class CohortConfig:
+    """A cohort a launched coordinator announces once enough participants have subscribed."""
+
+    KEYS = ("min_participants", "btc_network", "beacon_type", "threshold", "batch_window", "min_subscribers")
+    BATCH_WINDOW_KEYS = ("max_delay", "max_requests", "block_interval", "max_batch_size", "nonce_deadline", "session_timeout")
+    TYPES = {
+        "min_participants": INTEGER, "btc_network": (str,), "beacon_type": (str,), "threshold": OPTIONAL_INTEGER,
+        "batch_window": (dict, type(None)), "min_subscribers": OPTIONAL_INTEGER,
+    }
+    BATCH_WINDOW_TYPES = {
+        "max_delay": OPTIONAL_NUMBER, "max_requests": OPTIONAL_INTEGER, "block_interval": OPTIONAL_INTEGER,
+        "max_batch_size": OPTIONAL_INTEGER, "nonce_deadline": OPTIONAL_NUMBER, "session_timeout": NUMBER,
+    }
+
+    def __init__(self, min_participants: int, btc_network: str = "signet", beacon_type: str = "SMTAggregateBeacon", threshold: int = None, batch_window: Dict[str, Any] = None, min_subscribers: int = None):
+        """Initialize a cohort announcement.
+
+        Args:
+            min_participants: The number of participants needed to form the cohort
+            btc_network: The Bitcoin network of the cohort
+            beacon_type: The beacon type advertised to subscribers
+            threshold: Commit to k-of-n MuSig2 fallback leaves with this k (optional)
+            batch_window: BatchWindow settings to start signing sessions automatically (optional)
+            min_subscribers: Subscribers to wait for before announcing, min_participants by default
+        """
+        if min_participants < 1:
+            raise ValueError("min_participants must be at least 1.")
+        self.min_participants = min_participants
+        self.btc_network = btc_network
+        self.beacon_type = beacon_type
+        self.threshold = threshold
+        self.batch_window = batch_window
+        if batch_window is not None:
+            check_keys("batch_window", batch_window, self.BATCH_WINDOW_KEYS, self.BATCH_WINDOW_TYPES)
+            # Checks the window now rather than when the cohort is announced
+            BatchWindow(**batch_window)
+        self.min_subscribers = min_subscribers if min_subscribers is not None else min_participants
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CohortConfig":
+        check_keys("cohort", data, cls.KEYS, cls.TYPES)
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.KEYS}
+
+
+class AgentConfig:
+    """Everything needed to run a coordinator or participant, as read from a config file.
+
+    Secrets are not part of the file. The secrets store passphrase and a
+    participant's mnemonic are read from the environment variables it names.
+    """
+
+    KEYS = (
+        "role", "name", "host", "port", "metrics_port", "did_file",
+        "secrets_path", "secrets_passphrase_env", "state_dir", "log_level", "log_json",
+        "loop", "scheduler", "transport",
+        "mnemonic_env", "coordinators", "did_pool", "cohorts", "workers", "ipc_dir",
+    )
+    TYPES = {
+        "role": (str,), "name": OPTIONAL_STRING, "host": (str,), "port": OPTIONAL_INTEGER, "metrics_port": OPTIONAL_INTEGER,
+        "did_file": OPTIONAL_STRING, "secrets_path": OPTIONAL_STRING, "secrets_passphrase_env": (str,), "state_dir": OPTIONAL_STRING,
+        "log_level": (str,), "log_json": (bool,), "loop": (dict,), "scheduler": (dict,), "transport": (dict,),
+        "mnemonic_env": (str,), "coordinators": (list, type(None)), "did_pool": (dict, type(None)), "cohorts": (list, type(None)),
+        "workers": INTEGER, "ipc_dir": OPTIONAL_STRING,
+    }
+    DID_POOL_KEYS = ("low_watermark", "high_watermark")
+    DID_POOL_TYPES = {"low_watermark": INTEGER, "high_watermark": INTEGER}
+
+    def __init__(
+        self,
+        role: str,
+        name: str = None,
+        host: str = "localhost",
+        port: int = None,
+        metrics_port: int = None,
+        did_file: str = None,
+        secrets_path: str = None,
+        secrets_passphrase_env: str = "MUSIG2_SECRETS_PASSPHRASE",
+        state_dir: str = None,
+        log_level: str = "INFO",
+        log_json: bool = False,
+        loop: LoopConfig = None,
+        scheduler: SchedulerConfig = None,
+        transport: TransportConfig = None,
+        mnemonic_env: str = "MUSIG2_MNEMONIC",
+        coordinators: List[str] = None,
+        did_pool: Dict[str, int] = None,
+        cohorts: List[CohortConfig] = None,
+        workers: int = 1,
+        ipc_dir: str = None,
+    ):
+        """Initialize an agent configuration.
+
+        Args:
+            role: COORDINATOR or PARTICIPANT
+            name: The agent's name in logs and metrics, the role by default
+            host: The interface to listen on, part of the agent's DIDs
+            port: The port to listen on, 8767 for coordinators and 8766 for participants by default
+            metrics_port: Serve Prometheus metrics on this local port (optional)
+            did_file: Write the agent's DID to this file once it is listening (optional)
+            secrets_path: Keep keys in an encrypted store at this path (optional)
+            secrets_passphrase_env: Environment variable holding the secrets store passphrase
+            state_dir: Keep protocol state in this directory and resume from it (optional)
+            log_level: Level of the package's logs
+            log_json: Write logs as JSON lines
+            loop: Event loop settings
+            scheduler: Handler scheduler settings
+            transport: DIDComm and websocket settings
+            mnemonic_env: Environment variable holding a participant's BIP39 mnemonic
+            coordinators: DIDs of coordinators a participant subscribes to
+            did_pool: DIDPool watermarks, to pre-generate a participant's subscription DIDs (optional)
+            cohorts: Cohorts a coordinator announces, skipped when cohorts are restored from state_dir
+            workers: Processes a coordinator runs in, sharing its port and DID and sharding its cohorts
+            ipc_dir: Directory of the workers' sockets, a new temporary directory by default
+        """
+        if role not in ROLES:
+            raise ValueError(f"Unknown role {role}.")
+        if role == COORDINATOR and coordinators:
+            raise ValueError("coordinators is a participant setting.")
+        if role == PARTICIPANT and cohorts:
+            raise ValueError("cohorts is a coordinator setting.")
+        if did_pool is not None:
+            if role != PARTICIPANT:
+                raise ValueError("did_pool is a participant setting.")
+            check_keys("did_pool", did_pool, self.DID_POOL_KEYS, self.DID_POOL_TYPES)
+            # Checks the watermarks now rather than when the participant starts
+            DIDPool("", **did_pool)
+        if state_dir is not None and secrets_path is None:
+            raise ValueError("state_dir needs secrets_path, otherwise the agent's DIDs change on restart.")
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+        if workers > 1:
+            if role != COORDINATOR:
+                raise ValueError("Only a coordinator runs in several workers.")
+            if secrets_path is None:
+                raise ValueError("Workers need secrets_path, to share the coordinator's DID.")
+            if not hasattr(socket, "SO_REUSEPORT") or not hasattr(socket, "AF_UNIX"):
+                raise ValueError("Workers need SO_REUSEPORT and Unix sockets, not available on this platform.")
+        self.role = role
+        self.name = name or role.capitalize()
+        self.host = host
+        self.port = port if port is not None else DEFAULT_PORTS[role]
+        self.metrics_port = metrics_port
+        self.did_file = did_file
+        self.secrets_path = secrets_path
+        self.secrets_passphrase_env = secrets_passphrase_env
+        self.state_dir = state_dir
+        self.log_level = log_level
+        self.log_json = log_json
+        self.loop = loop or LoopConfig()
+        self.scheduler = scheduler or SchedulerConfig()
+        self.transport = transport or TransportConfig()
+        self.mnemonic_env = mnemonic_env
+        self.coordinators = coordinators or []
+        self.did_pool = did_pool
+        self.cohorts = cohorts or []
+        self.workers = workers
+        self.ipc_dir = ipc_dir
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AgentConfig":
+        """Create a configuration from a parsed config file.
+
+        Raises:
+            ValueError: If a setting is unknown or invalid
+        """
+        check_keys("agent", data, cls.KEYS, cls.TYPES)
+        if not all(isinstance(did, str) for did in data.get("coordinators") or ()):
+            raise ValueError("agent.coordinators must be a list of DIDs.")
+        data = dict(data)
+        for key, section in (("loop", LoopConfig), ("scheduler", SchedulerConfig), ("transport", TransportConfig)):
+            if key in data:
+                data[key] = section.from_dict(data[key])
+        if "cohorts" in data:
+            data["cohorts"] = [CohortConfig.from_dict(cohort) for cohort in data["cohorts"]]
+        if "role" not in data:
+            raise ValueError("A config needs a role.")
+        return cls(**data)
+
+    @classmethod
+    def load(cls, path: str) -> "AgentConfig":
+        """Read a JSON config file.
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If it is not valid JSON or has an invalid setting
+        """
+        with open(path) as config_file:
+            return cls.from_dict(json.load(config_file))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The effective configuration, with defaults filled in."""
+        data = {key: getattr(self, key) for key in self.KEYS}
+        data["loop"] = self.loop.to_dict()
+        data["scheduler"] = self.scheduler.to_dict()
+        data["transport"] = self.transport.to_dict()
+        data["cohorts"] = [cohort.to_dict() for cohort in self.cohorts]
+        return data
+
+    def for_worker(self, index: int) -> "AgentConfig":
+        """The configuration of one worker of a coordinator.
+
+        Workers listen on the same port with SO_REUSEPORT. Each keeps its own
+        state in a subdirectory of state_dir, serves metrics on metrics_port
+        plus its index and announces every n-th configured cohort.
+        """
+        data = self.to_dict()
+        data["name"] = f"{self.name}/{index}"
+        if self.state_dir is not None:
+            data["state_dir"] = os.path.join(self.state_dir, f"worker-{index}")
+        if self.metrics_port is not None:
+            data["metrics_port"] = self.metrics_port + index
+        if index != 0:
+            data["did_file"] = None
+        data["cohorts"] = data["cohorts"][index::self.workers]
+        return AgentConfig.from_dict(data)
+
+
+def _environment(variable: str, purpose: str) -> str:
+    value = os.environ.get(variable)
+    if not value:
+        raise ValueError(f"Set {variable} to the {purpose}.")
+    return value
+
+
+async def create_agent(config: AgentConfig, shard: CoordinatorShard = None):
+    """Create the coordinator or participant described by a configuration.
+
+    Args:
+        config: The agent's configuration
+        shard: The worker a coordinator runs as, with several workers (optional)
+
+    Raises:
+        ValueError: If a secret the configuration needs is not set in the environment
+    """
+    passphrase = _environment(config.secrets_passphrase_env, "secrets store passphrase") if config.secrets_path else None
+    # Read before anything is created, so a missing mnemonic fails fast
+    mnemonic = _environment(config.mnemonic_env, "participant's mnemonic") if config.role == PARTICIPANT else None
+    didcomm = DIDCommService(
+        config.name,
+        config.host,
+        config.port,
+        tls=config.transport.tls,
+        ecdh_cache_size=config.transport.ecdh_cache_size,
+        scheduler=config.scheduler.create(),
+        transport=config.transport.websocket,
+        reuse_port=shard is not None,
+    )
+    if config.role == COORDINATOR:
+        if shard is not None:
+            # Before the coordinator registers its handlers on the router
+            didcomm.message_router = shard.create_router(didcomm.scheduler)
+        coordinator = await BeaconCoordinator.create(
+            config.name, config.host, config.port, config.secrets_path, passphrase, config.state_dir, didcomm=didcomm
+        )
+        if shard is not None:
+            shard.attach(coordinator)
+        return coordinator
+    return await BeaconParticipant.create(
+        HDPrivateKey.from_mnemonic(mnemonic), config.name, config.host, config.port, didcomm, config.secrets_path, passphrase, config.state_dir, config.did_pool
+    )
+
+
+async def _announce_cohorts(coordinator: BeaconCoordinator, cohorts: List[CohortConfig]):
+    if len(coordinator.cohorts):
+        log.info("cohorts_restored", cohorts=len(coordinator.cohorts), configured=len(cohorts))
+        return
+    for cohort in cohorts:
+        while len(coordinator.subscribers) < cohort.min_subscribers:
+            await asyncio.sleep(SUBSCRIBER_POLL_INTERVAL)
+        batch_window = BatchWindow(**cohort.batch_window) if cohort.batch_window is not None else None
+        await coordinator.announce_new_cohort(cohort.min_participants, cohort.btc_network, cohort.beacon_type, cohort.threshold, batch_window)
+
+
+async def _after_listening(agent, config: AgentConfig):
+    await agent.didcomm.listening.wait()
+    log.info("agent_started", role=config.role, name=config.name, did=agent.did, url=agent.didcomm.didcomm_websocket_url, loop=type(asyncio.get_running_loop()).__module__)
+    if config.did_file is not None:
+        with open(config.did_file, "w") as did_file:
+            did_file.write(agent.did + "\n")
+    if config.role == PARTICIPANT:
+        for coordinator_did in config.coordinators:
+            await agent.subscribe_to_coordinator(coordinator_did)
+    elif config.cohorts:
+        await _announce_cohorts(agent, config.cohorts)
+
+
+async def serve(config: AgentConfig, shard: CoordinatorShard = None):
+    """Run an agent until it is cancelled or the process gets SIGTERM or SIGINT.
+
+    Args:
+        config: The agent's configuration
+        shard: The worker a coordinator runs as, with several workers (optional)
+    """
+    agent = await create_agent(config, shard)
+    if shard is not None:
+        await shard.start()
+    serving = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, serving.cancel)
+        except NotImplementedError:
+            # Windows, where SIGINT still raises KeyboardInterrupt
+            pass
+    try:
+        await asyncio.gather(agent.start(metrics_port=config.metrics_port), _after_listening(agent, config))
+    except asyncio.CancelledError:
+        log.info("agent_stopping", name=config.name)
+    finally:
+        await agent.didcomm.cleanup()
+        await agent.didcomm.scheduler.close()
+        if agent.metrics_exporter is not None:
+            await agent.metrics_exporter.close()
+        if agent.state is not None:
+            agent.state.close()
+        if shard is not None:
+            await shard.close()
+
+
+async def _create_shared_did(config: AgentConfig):
+    """Create the coordinator's DID in its secrets store, for the workers to load."""
+    # With the workers' endpoint scheme, wss:// with TLS
+    didcomm = DIDCommService(config.name, config.host, config.port, tls=config.transport.tls, transport=config.transport.websocket)
+    secrets = await didcomm.open_secrets(config.secrets_path, _environment(config.secrets_passphrase_env, "secrets store passphrase"))
+    try:
+        await didcomm.generate_did(label=BeaconCoordinator.DID_LABEL)
+    finally:
+        await secrets.close()
+
+
+def _run_worker(config_data: Dict[str, Any], index: int, ipc_dir: str):
+    config = AgentConfig.from_dict(config_data)
+    worker_config = config.for_worker(index)
+    configure_logging(config.log_level, json_output=config.log_json)
+    shard = CoordinatorShard(index, config.workers, ipc_dir, agent=worker_config.name)
+    try:
+        run(serve(worker_config, shard), config.loop)
+    finally:
+        shutdown_logging()
+
+
+def run_workers(config: AgentConfig) -> int:
+    """Run a coordinator in `config.workers` processes until they exit or this process gets SIGTERM.
+
+    Returns:
+        The highest exit code of the workers, 128 + the signal number for a worker killed by a signal
+    """
+    run(_create_shared_did(config), config.loop)
+    ipc_dir = config.ipc_dir or tempfile.mkdtemp(prefix="musig2-workers-")
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_run_worker, args=(config.to_dict(), index, ipc_dir), name=f"{config.name}/{index}")
+        for index in range(config.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    log.info("workers_started", name=config.name, workers=len(workers), pids=[worker.pid for worker in workers], ipc_dir=ipc_dir)
+
+    def stop(signum, frame):
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    # Ctrl-C reaches the workers directly, from the terminal's process group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # One worker exiting stops the others, its cohorts would be unreachable
+    multiprocessing.connection.wait([worker.sentinel for worker in workers])
+    stop(None, None)
+    for worker in workers:
+        worker.join()
+    # multiprocessing reports a worker killed by a signal as minus the signal number
+    return max(128 - worker.exitcode if worker.exitcode < 0 else worker.exitcode for worker in workers)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Run a MuSig2 coordinator or participant from a JSON config file")
+    parser.add_argument("config", help="Path of the config file")
+    parser.add_argument("--check", action="store_true", help="Print the effective configuration and exit")
+    args = parser.parse_args(argv)
+
+    try:
+        config = AgentConfig.load(args.config)
+    except (OSError, ValueError, TypeError) as e:
+        parser.error(f"{args.config}: {e}")
+    if args.check:
+        json.dump(config.to_dict(), sys.stdout, indent=2)
+        print()
+        return
+
+    configure_logging(config.log_level, json_output=config.log_json)
+    try:
+        if config.workers > 1:
+            sys.exit(run_workers(config))
+        run(serve(config), config.loop)
+    except ValueError as e:
+        sys.exit(f"{config.name}: {e}")
+    finally:
+        shutdown_logging()
@@ -0,0 +1,178 @@
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Any, Callable, Dict, Optional, Union
+
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+ROOT_LOGGER = "musig2_protocols"
+
+# Library default: nothing is written until the application configures logging
+logging.getLogger(ROOT_LOGGER).addHandler(logging.NullHandler())
+
+
+class lazy:
+    """A log field computed only if the record is actually emitted."""
+
+    __slots__ = ("function",)
+
+    def __init__(self, function: Callable[[], Any]):
+        self.function = function
+
+    def __call__(self):
+        return self.function()
+
+
+def _resolve_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    fields = getattr(record, "fields", None)
+    if not fields:
+        return {}
+    resolved = {key: value() if isinstance(value, lazy) else value for key, value in fields.items()}
+    record.fields = resolved
+    return resolved
+
+
+class StructuredLogger:
+    """Logs an event name with keyword fields, e.g. `log.debug("message_received", type=msg_type)`.
+
+    The level check comes first, so a disabled call costs one cached
+    isEnabledFor lookup. Wrap expensive fields in `lazy` so they are only
+    computed for records that are emitted.
+    """
+
+    __slots__ = ("logger",)
+
+    def __init__(self, name: str):
+        self.logger = logging.getLogger(name)
+
+    def isEnabledFor(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def debug(self, event: str, **fields):
+        if self.logger.isEnabledFor(DEBUG):
+            self.logger._log(DEBUG, event, (), extra={"fields": fields})
+
+    def info(self, event: str, **fields):
+        if self.logger.isEnabledFor(INFO):
+            self.logger._log(INFO, event, (), extra={"fields": fields})
+
+    def warning(self, event: str, **fields):
+        if self.logger.isEnabledFor(WARNING):
+            self.logger._log(WARNING, event, (), extra={"fields": fields})
+
+    def error(self, event: str, **fields):
+        if self.logger.isEnabledFor(ERROR):
+            self.logger._log(ERROR, event, (), extra={"fields": fields})
+
+    def exception(self, event: str, **fields):
+        """Log at ERROR with the active exception's traceback."""
+        if self.logger.isEnabledFor(ERROR):
+            self.logger._log(ERROR, event, (), exc_info=True, extra={"fields": fields})
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Get a structured logger, usually `get_logger(__name__)`."""
+    return StructuredLogger(name)
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats an event and its fields as `key=value` text or as one JSON object per line."""
+
+    def __init__(self, json_output: bool = False):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = _resolve_fields(record)
+        # Queued records carry a pre-rendered traceback in exc_text
+        exception = self.formatException(record.exc_info) if record.exc_info else record.exc_text
+        if self.json_output:
+            entry = {
+                "ts": round(record.created, 6),
+                "level": record.levelname,
+                "logger": record.name,
+                "event": record.getMessage(),
+                **fields,
+            }
+            if exception:
+                entry["exception"] = exception
+            return json.dumps(entry, default=str)
+        line = f"{self.formatTime(record)} {record.levelname} {record.name} {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if exception:
+            line += "\n" + exception
+        return line
+
+
+class _StructuredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records for the listener thread without formatting them on the event loop.
+
+    Lazy fields are resolved here, on the calling thread, so they read the
+    state at the time of the call. Formatting and I/O happen on the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        _resolve_fields(record)
+        if record.exc_info:
+            # Tracebacks cannot be passed between threads safely, render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(
+    level: Union[int, str] = WARNING,
+    module_levels: Dict[str, Union[int, str]] = None,
+    json_output: bool = False,
+    handler: logging.Handler = None,
+) -> logging.handlers.QueueListener:
+    """Send the package's logs through a queue to a handler running on its own thread.
+
+    Args:
+        level: Level for all musig2_protocols loggers
+        module_levels: Levels for individual modules, e.g. {"musig2_protocols.router": "DEBUG"}
+        json_output: Write JSON lines instead of key=value text
+        handler: Where records are written, stderr by default
+
+    Returns:
+        The running queue listener
+    """
+    global _listener
+    shutdown_logging()
+
+    if handler is None:
+        handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(StructuredFormatter(json_output))
+
+    record_queue = queue.SimpleQueue()
+    root = logging.getLogger(ROOT_LOGGER)
+    for existing in list(root.handlers):
+        if isinstance(existing, _StructuredQueueHandler):
+            root.removeHandler(existing)
+    root.addHandler(_StructuredQueueHandler(record_queue))
+    root.setLevel(level)
+    root.propagate = False
+    for module, module_level in (module_levels or {}).items():
+        logging.getLogger(module).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(record_queue, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Stop the listener thread after writing the queued records."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,5 +1,15 @@
 from .base import BaseMessage
+from .encoding import BASE64URL_ENCODING, HEX_ENCODING, SUPPORTED_ENCODINGS, negotiate_encoding
+from .fields import Field
+from .registry import MESSAGE_TYPES, MessageRegistry
 
 __all__ = [
+    'BASE64URL_ENCODING',
     'BaseMessage',
-] 
\ No newline at end of file
+    'Field',
+    'HEX_ENCODING',
+    'MESSAGE_TYPES',
+    'MessageRegistry',
+    'SUPPORTED_ENCODINGS',
+    'negotiate_encoding',
+]
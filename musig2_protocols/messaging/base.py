@@ -1,9 +1,21 @@
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 import uuid
+from .encoding import BASE64URL_ENCODING, HEX_ENCODING, compact_body, expand_body
+from .fields import Field, check_fields, MAX_DID_LENGTH, MAX_ID_LENGTH
 
 
 class BaseMessage:
-    """Base class for all MuSig2 protocol messages."""
+    """Base class for all MuSig2 protocol messages.
+
+    Subclasses set TYPE to their message type and FIELDS to the schema of
+    their body, and keep each body field in a slot of the same name.
+    `from_dict` decodes and validates a message in one pass.
+    """
+
+    __slots__ = ("type", "id", "to", "frm", "thread_id")
+
+    TYPE: str = None
+    FIELDS: Tuple[Field, ...] = ()
 
     def __init__(
         self,
@@ -11,51 +23,105 @@ class BaseMessage:
         to: str,
         frm: str,
         thread_id: Optional[str] = None,
-        body: Optional[Dict] = None
     ):
         """Initialize a base message.
-        
+
         Args:
             msg_type: The type of message (e.g. "https://didcomm.org/musig2/subscribe")
             to: The recipient's DID
             frm: The sender's DID
             thread_id: Optional thread ID for message threading
-            body: Optional message body
         """
         self.type = msg_type
         self.id = str(uuid.uuid4())
         self.to = to
         self.frm = frm
         self.thread_id = thread_id
-        self.body = body or {}
 
-    def to_dict(self) -> Dict:
-        """Convert the message to a dictionary."""
+    @property
+    def body(self) -> Dict:
+        """The message body. Optional fields that are not set are left out."""
+        body = {}
+        for field in self.FIELDS:
+            value = getattr(self, field.name)
+            if value is not None or field.required:
+                body[field.name] = value
+        return body
+
+    def to_dict(self, encoding: str = HEX_ENCODING) -> Dict:
+        """Convert the message to a dictionary.
+
+        Args:
+            encoding: Encoding profile of the binary fields, only use one the recipient advertised
+        """
+        body = self.body
+        if encoding == BASE64URL_ENCODING:
+            body = compact_body(self.FIELDS, body)
+            body["encoding"] = encoding
+        elif encoding != HEX_ENCODING:
+            raise ValueError(f"Unsupported encoding {encoding}.")
         msg_dict = {
             "type": self.type,
             "id": self.id,
             "to": self.to,
             "from": self.frm,
-            "body": self.body
+            "body": body
         }
         if self.thread_id:
             msg_dict["thread_id"] = self.thread_id
-        return msg_dict 
-    
+        return msg_dict
+
     @classmethod
     def from_dict(cls, msg_dict: Dict):
-        """Create a message instance from a dictionary.
-        
+        """Create a message instance from a dictionary, validating it against the class's schema.
+
         Args:
             msg_dict: Dictionary containing the message data
-            
+
         Returns:
             BaseMessage: A new instance of the message class
+
+        Raises:
+            ValueError: If the message has another type or does not match the schema
         """
-        return cls(
-            msg_type=msg_dict["type"],
-            to=msg_dict["to"], 
-            frm=msg_dict["from"],
-            thread_id=msg_dict.get("thread_id"),
-            body=msg_dict.get("body", {})
-        )
\ No newline at end of file
+        if type(msg_dict) is not dict:
+            raise ValueError("A message must be an object.")
+        if msg_dict.get("type") != cls.TYPE:
+            raise ValueError(f"Invalid message type: {msg_dict.get('type')}")
+        to = msg_dict.get("to")
+        if type(to) is list and len(to) == 1:
+            # Plaintext DIDComm messages may address a list of recipients
+            to = to[0]
+        if type(to) is not str or len(to) > MAX_DID_LENGTH:
+            raise ValueError("to must be a DID.")
+        frm = msg_dict.get("from")
+        if type(frm) is not str or len(frm) > MAX_DID_LENGTH:
+            raise ValueError("from must be a DID.")
+        message_id = msg_dict.get("id")
+        thread_id = msg_dict.get("thread_id")
+        for name, value in (("id", message_id), ("thread_id", thread_id)):
+            if value is not None and (type(value) is not str or len(value) > MAX_ID_LENGTH):
+                raise ValueError(f"{name} must be a string of at most {MAX_ID_LENGTH} characters.")
+        body = msg_dict.get("body", {})
+        if type(body) is not dict:
+            raise ValueError("body must be an object.")
+        encoding = body.get("encoding")
+        if encoding == BASE64URL_ENCODING:
+            body = expand_body(cls.FIELDS, body)
+        elif encoding is not None and encoding != HEX_ENCODING:
+            raise ValueError("Unsupported encoding.")
+        values = check_fields(cls.FIELDS, body)
+
+        # Skips __init__, the values are already validated
+        message = cls.__new__(cls)
+        message.type = cls.TYPE
+        message.id = message_id if message_id is not None else str(uuid.uuid4())
+        message.to = to
+        message.frm = frm
+        message.thread_id = thread_id
+        for field, value in zip(cls.FIELDS, values):
+            setattr(message, field.name, value)
+        return message
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(id={self.id!r}, frm={self.frm!r}, body={self.body!r})"
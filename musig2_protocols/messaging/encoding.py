@@ -0,0 +1,136 @@
+import base64
+import binascii
+from typing import Dict, Iterable, Optional, Tuple
+from .fields import Field, HEX, INTEGER, LIST
+
+# Encoding profiles of the binary fields of a message body. Hex is what every
+# peer understands, base64url carries the same bytes in two thirds of the space.
+HEX_ENCODING = "hex"
+BASE64URL_ENCODING = "base64url"
+
+# Supported profiles, most preferred first
+SUPPORTED_ENCODINGS = (BASE64URL_ENCODING, HEX_ENCODING)
+
+# Most profiles a peer may advertise
+MAX_ADVERTISED_ENCODINGS = 8
+
+_BASE64URL_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+_TO_BASE64 = bytes.maketrans(b"-_", b"+/")
+
+
+def negotiate_encoding(offered: Optional[Iterable[str]]) -> str:
+    """Pick the most preferred profile a peer supports, hex if it advertised none of ours."""
+    if offered:
+        offered = set(offered)
+        for encoding in SUPPORTED_ENCODINGS:
+            if encoding in offered:
+                return encoding
+    return HEX_ENCODING
+
+
+def base64url_encode(data: bytes) -> str:
+    """Encode bytes as unpadded base64url."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def base64url_decode(value: str) -> bytes:
+    """Decode unpadded base64url.
+
+    Raises:
+        ValueError: If the value is not unpadded base64url
+    """
+    # Deleting the alphabet leaves nothing of a valid value
+    if len(value) % 4 == 1 or not value.isascii() or value.encode().translate(None, _BASE64URL_ALPHABET):
+        raise ValueError("Invalid base64url.")
+    try:
+        return binascii.a2b_base64((value + "=" * (-len(value) % 4)).encode().translate(_TO_BASE64))
+    except binascii.Error as e:
+        raise ValueError("Invalid base64url.") from e
+
+
+def _base64url_length(hex_length: int) -> int:
+    """The base64url length of the bytes of a hex string of `hex_length` characters."""
+    return -(-(hex_length // 2) * 4 // 3)
+
+
+def compact_body(fields: Tuple[Field, ...], body: Dict) -> Dict:
+    """Convert the hex and compactable integer fields of a body to base64url.
+
+    Hex strings, lists of hex strings and integers with a `compact_length`
+    are converted. Other fields, including nested objects, are kept as they are.
+    """
+    compact = dict(body)
+    for field in fields:
+        value = body.get(field.name)
+        if value is None:
+            continue
+        if field.kind == HEX:
+            compact[field.name] = base64url_encode(bytes.fromhex(value))
+        elif field.kind == LIST and field.item is not None and field.item.kind == HEX:
+            compact[field.name] = [base64url_encode(bytes.fromhex(item)) for item in value]
+        elif field.kind == INTEGER and field.compact_length is not None:
+            compact[field.name] = base64url_encode(value.to_bytes(field.compact_length, "big"))
+    return compact
+
+
+def expand_body(fields: Tuple[Field, ...], body: Dict) -> Dict:
+    """Convert the base64url fields of a compact body back to their hex and integer form.
+
+    Only the encoding is checked here. Values of the wrong type are left for
+    `check_fields` to reject, and lengths are bounded before anything is decoded.
+
+    Raises:
+        ValueError: If a field is not valid base64url or is too long
+    """
+    expanded = dict(body)
+    for field in fields:
+        value = body.get(field.name)
+        if value is None:
+            continue
+        if field.kind == HEX:
+            if type(value) is str:
+                expanded[field.name] = _expand_hex(field, value)
+        elif field.kind == LIST and field.item is not None and field.item.kind == HEX:
+            if type(value) is list:
+                if field.max_length is not None and len(value) > field.max_length:
+                    raise ValueError(f"{field.name} has more than {field.max_length} items.")
+                expanded[field.name] = _expand_hex_list(field.item, value)
+        elif field.kind == INTEGER and field.compact_length is not None:
+            if type(value) is str:
+                if len(value) > _base64url_length(field.compact_length * 2):
+                    raise ValueError(f"{field.name} is longer than {field.compact_length} bytes.")
+                expanded[field.name] = int.from_bytes(_decode_field(field, value), "big")
+    return expanded
+
+
+def _expand_hex(field: Field, value: str) -> str:
+    if field.max_length is not None and len(value) > _base64url_length(field.max_length):
+        raise ValueError(f"{field.name} is longer than {field.max_length // 2} bytes.")
+    return _decode_field(field, value).hex()
+
+
+def _expand_hex_list(item: Field, values: list) -> list:
+    try:
+        joined = "".join(values)
+    except TypeError:
+        # Items that are not strings are rejected by check_fields
+        joined = None
+    if values and joined is not None:
+        lengths = set(map(len, values))
+        length = lengths.pop()
+        if not lengths and length % 4 == 0:
+            # Items of the same whole number of 3 byte groups, like 33 byte points,
+            # have no padding, so their concatenation decodes in one pass
+            if item.max_length is not None and length > _base64url_length(item.max_length):
+                raise ValueError(f"{item.name} is longer than {item.max_length // 2} bytes.")
+            decoded = _decode_field(item, joined).hex()
+            step = length * 3 // 2
+            return [decoded[start:start + step] for start in range(0, len(decoded), step)]
+    return [_expand_hex(item, value) if type(value) is str else value for value in values]
+
+
+def _decode_field(field: Field, value: str) -> bytes:
+    try:
+        return base64url_decode(value)
+    except ValueError:
+        raise ValueError(f"{field.name} must be base64url encoded.") from None
@@ -0,0 +1,164 @@
+from typing import Any, Tuple
+
+# Size limits of decoded message fields. Larger values are rejected before they reach a handler.
+MAX_DID_LENGTH = 4096
+MAX_ID_LENGTH = 128
+MAX_TX_HEX_LENGTH = 200_000
+MAX_DATA_LENGTH = 4096
+MAX_COHORT_SIZE = 10_000
+POINT_HEX_LENGTH = 66
+# First byte of a compressed secp256k1 point, by the parity of its y coordinate
+POINT_PREFIXES = ("02", "03")
+
+STRING = "string"
+HEX = "hex"
+INTEGER = "integer"
+LIST = "list"
+OBJECT = "object"
+
+
+class Field:
+    """Schema of one field of a message body."""
+
+    __slots__ = ("name", "kind", "required", "nullable", "max_length", "exact_length", "prefixes", "minimum", "maximum", "item", "fields", "compact_length")
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        required: bool = True,
+        nullable: bool = False,
+        max_length: int = None,
+        exact_length: bool = False,
+        prefixes: Tuple[str, ...] = (),
+        minimum: int = None,
+        maximum: int = None,
+        item: "Field" = None,
+        fields: Tuple["Field", ...] = (),
+        compact_length: int = None,
+    ):
+        """Initialize a field.
+
+        Args:
+            name: The key of the field in the message body
+            kind: STRING, HEX, INTEGER, LIST or OBJECT
+            required: Whether the field must be present. Missing optional fields decode to None.
+            nullable: Whether the field may be null
+            max_length: The most characters of a string or hex field, or items of a list
+            exact_length: Whether a string or hex field must have exactly max_length characters
+            prefixes: Accepted beginnings of a string or hex field, any by default
+            minimum: The smallest value of an integer field
+            maximum: The largest value of an integer field
+            item: The schema of each item of a list field
+            fields: The schema of an object field
+            compact_length: Bytes of an integer field in compact encodings, which send it as big-endian bytes
+        """
+        self.name = name
+        self.kind = kind
+        self.required = required
+        self.nullable = nullable
+        self.max_length = max_length
+        self.exact_length = exact_length
+        self.prefixes = prefixes
+        self.minimum = minimum
+        self.maximum = maximum
+        self.item = item
+        self.fields = fields
+        self.compact_length = compact_length
+
+    def check(self, value: Any) -> Any:
+        """Validate a decoded value and return it.
+
+        Raises:
+            ValueError: If the value does not match the schema
+        """
+        if value is None:
+            if self.nullable:
+                return None
+            raise ValueError(f"{self.name} must not be null.")
+        kind = self.kind
+        if kind == STRING or kind == HEX:
+            if type(value) is not str:
+                raise ValueError(f"{self.name} must be a string.")
+            if self.max_length is not None and len(value) > self.max_length:
+                raise ValueError(f"{self.name} is longer than {self.max_length} characters.")
+            if self.exact_length and len(value) != self.max_length:
+                raise ValueError(f"{self.name} must be {self.max_length} characters long.")
+            if self.prefixes and not value.startswith(self.prefixes):
+                raise ValueError(f"{self.name} must start with one of {', '.join(self.prefixes)}.")
+            if kind == HEX and not _is_hex(value):
+                raise ValueError(f"{self.name} must be hex encoded.")
+        elif kind == INTEGER:
+            if type(value) is not int:
+                raise ValueError(f"{self.name} must be an integer.")
+            if (self.minimum is not None and value < self.minimum) or (self.maximum is not None and value > self.maximum):
+                raise ValueError(f"{self.name} is out of range.")
+        elif kind == LIST:
+            if type(value) is not list:
+                raise ValueError(f"{self.name} must be a list.")
+            if self.max_length is not None and len(value) > self.max_length:
+                raise ValueError(f"{self.name} has more than {self.max_length} items.")
+            item = self.item
+            if item is not None and item.kind == HEX and not item.nullable:
+                # Lists of keys and nonces are checked in one pass over the joined items
+                limit = item.max_length if item.max_length is not None else float("inf")
+                exact = item.exact_length
+                prefixes = item.prefixes
+                for element in value:
+                    if (
+                        type(element) is not str or len(element) % 2 or len(element) > limit
+                        or (exact and len(element) != limit) or (prefixes and not element.startswith(prefixes))
+                    ):
+                        item.check(element)
+                if not _is_hex("".join(value)):
+                    raise ValueError(f"{item.name} must be hex encoded.")
+            elif item is not None:
+                for element in value:
+                    item.check(element)
+        elif kind == OBJECT:
+            if type(value) is not dict:
+                raise ValueError(f"{self.name} must be an object.")
+            check_fields(self.fields, value)
+        return value
+
+
+def _is_hex(value: str) -> bool:
+    try:
+        decoded = bytes.fromhex(value)
+    except ValueError:
+        return False
+    # bytes.fromhex skips whitespace between bytes, which shortens the result
+    return len(decoded) * 2 == len(value)
+
+
+def check_fields(fields: Tuple[Field, ...], values: dict) -> list:
+    """Validate the fields of an object, in schema order. Unknown keys are ignored.
+
+    Returns:
+        The values of the fields, None for missing optional fields
+    """
+    checked = []
+    for field in fields:
+        value = values.get(field.name)
+        if value is None and field.name not in values:
+            if field.required:
+                raise ValueError(f"{field.name} is missing.")
+            checked.append(None)
+        else:
+            checked.append(field.check(value))
+    return checked
+
+
+def did_field(name: str) -> Field:
+    return Field(name, STRING, max_length=MAX_DID_LENGTH)
+
+
+def id_field(name: str, required: bool = True) -> Field:
+    return Field(name, STRING, required=required, max_length=MAX_ID_LENGTH)
+
+
+def point_list_field(name: str, max_items: int, required: bool = True) -> Field:
+    """A list of hex encoded compressed secp256k1 points."""
+    point = Field(name, HEX, max_length=POINT_HEX_LENGTH, exact_length=True, prefixes=POINT_PREFIXES)
+    return Field(name, LIST, required=required, max_length=max_items, item=point)
+
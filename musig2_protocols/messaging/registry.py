@@ -0,0 +1,42 @@
+from typing import Dict, Optional, Type, Union
+from .base import BaseMessage
+
+
+class MessageRegistry:
+    """Message classes by message type, to decode received messages into typed objects."""
+
+    def __init__(self):
+        self._classes: Dict[str, Type[BaseMessage]] = {}
+
+    def register(self, cls: Type[BaseMessage]) -> Type[BaseMessage]:
+        """Register a message class under its TYPE. Usable as a class decorator."""
+        if not cls.TYPE:
+            raise ValueError(f"Message class {cls.__name__} has no TYPE.")
+        registered = self._classes.get(cls.TYPE)
+        if registered is not None and registered is not cls:
+            raise ValueError(f"Message type {cls.TYPE} is already registered to {registered.__name__}.")
+        self._classes[cls.TYPE] = cls
+        return cls
+
+    def get(self, msg_type: str) -> Optional[Type[BaseMessage]]:
+        """Get the class registered for a message type."""
+        return self._classes.get(msg_type)
+
+    def decode(self, msg_dict: Dict) -> Union[BaseMessage, Dict]:
+        """Decode a message into an instance of its registered class.
+
+        Messages of types without a class are returned unchanged.
+
+        Raises:
+            ValueError: If the message does not match its class's schema
+        """
+        cls = self._classes.get(msg_dict.get("type"))
+        if cls is None:
+            return msg_dict
+        return cls.from_dict(msg_dict)
+
+    def __contains__(self, msg_type: str) -> bool:
+        return msg_type in self._classes
+
+
+MESSAGE_TYPES = MessageRegistry()
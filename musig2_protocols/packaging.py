@@ -0,0 +1,112 @@
+import hashlib
+from typing import Any, Dict, Tuple, Union
+from didcomm_messaging.crypto import CryptoService, SecretsManager
+from didcomm_messaging.crypto.jwe import JweEnvelope, b64url, from_b64url
+from didcomm_messaging.packaging import PackedMessageMetadata, PackagingService, PackagingServiceError
+from didcomm_messaging.resolver import DIDResolver
+from .codec import JSON
+
+
+def parse_envelope(envelope: Union[str, bytes, Dict[str, Any]]) -> JweEnvelope:
+    """Parse a packed message, or a mapping already parsed from one, into a JWE envelope.
+
+    Raises:
+        PackagingServiceError: If it is not a JWE envelope
+    """
+    try:
+        if not isinstance(envelope, dict):
+            envelope = JSON.loads(envelope)
+        return JweEnvelope.deserialize(envelope)
+    except ValueError:
+        raise PackagingServiceError("Invalid packed message")
+
+
+class EnvelopePackagingService(PackagingService):
+    """PackagingService that takes envelopes already parsed from JSON.
+
+    The library parses a packed message once to read its headers and again
+    to decrypt it. Here the envelope is parsed once, with the JSON codec,
+    and the parsed envelope is passed on to crypto services that accept it,
+    i.e. those with `accepts_parsed_envelopes`. Others get the packed
+    message, as with PackagingService.
+    """
+
+    async def extract_packed_message_metadata(self, enc_message: Union[str, bytes, JweEnvelope], secrets: SecretsManager) -> PackedMessageMetadata:
+        """Extract metadata from a packed DIDComm message or a parsed envelope."""
+        wrapper = enc_message if isinstance(enc_message, JweEnvelope) else parse_envelope(enc_message)
+
+        # The checks of PackagingService.extract_packed_message_metadata
+        alg = wrapper.protected.get("alg")
+        if not alg:
+            raise PackagingServiceError("Missing alg header")
+
+        method = next((m for m in ("ECDH-1PU", "ECDH-ES") if m in alg), None)
+        if not method:
+            raise PackagingServiceError(f"Unsupported DIDComm encryption algorithm: {alg}")
+
+        sender_kid = None
+        recip_key = None
+        for kid in wrapper.recipient_key_ids:
+            recip_key = await secrets.get_secret_by_kid(kid)
+            if recip_key:
+                break
+
+        if not recip_key:
+            raise PackagingServiceError("No recognized recipient key")
+
+        expected_apv = b64url(hashlib.sha256((".".join(wrapper.recipient_key_ids)).encode()).digest())
+        apv = wrapper.protected.get("apv")
+        if not apv:
+            raise PackagingServiceError("Missing apv header")
+        if apv != expected_apv:
+            raise PackagingServiceError("Invalid apv value")
+
+        if method == "ECDH-1PU":
+            apu = wrapper.protected.get("apu")
+            if not apu:
+                raise PackagingServiceError("Missing apu header")
+            try:
+                sender_kid_apu = from_b64url(apu).decode("utf-8")
+            except (UnicodeDecodeError, ValueError):
+                raise PackagingServiceError("Invalid apu value")
+
+            sender_kid = wrapper.protected.get("skid") or sender_kid_apu
+            if sender_kid != sender_kid_apu:
+                raise PackagingServiceError("Mismatch between skid and apu")
+            if not sender_kid:
+                raise PackagingServiceError("Sender key ID not provided")
+
+        return PackedMessageMetadata(wrapper, method, recip_key, sender_kid)
+
+    async def unpack(
+        self,
+        crypto: CryptoService,
+        resolver: DIDResolver,
+        secrets: SecretsManager,
+        enc_message: Union[str, bytes],
+        envelope: Dict[str, Any] = None,
+    ) -> Tuple[bytes, PackedMessageMetadata]:
+        """Unpack a DIDComm message.
+
+        Args:
+            crypto: The crypto service to decrypt with
+            resolver: Resolves the sender's key
+            secrets: Holds the recipient's key
+            enc_message: The packed message
+            envelope: The packed message parsed from JSON, to not parse it again (optional)
+        """
+        metadata = await self.extract_packed_message_metadata(
+            parse_envelope(envelope if envelope is not None else enc_message), secrets
+        )
+
+        if metadata.method == "ECDH-ES":
+            return await crypto.ecdh_es_decrypt(enc_message, metadata.recip_key), metadata
+
+        if not metadata.sender_kid:
+            raise PackagingServiceError("Missing sender key ID")
+
+        sender_vm = await resolver.resolve_and_dereference_verification_method(metadata.sender_kid)
+        sender_key = crypto.verification_method_to_public_key(sender_vm)
+
+        message = metadata.wrapper if getattr(crypto, "accepts_parsed_envelopes", False) else enc_message
+        return await crypto.ecdh_1pu_decrypt(message, metadata.recip_key, sender_key), metadata
@@ -0,0 +1,233 @@
+import asyncio
+import cProfile
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Coroutine, Dict, Optional, Tuple
+from .log import get_logger
+from .metrics import REGISTRY
+
+
+log = get_logger(__name__)
+
+# Handler steps and loop delays are expected well under a millisecond, blocking ones in the 10ms to seconds range
+BLOCKING_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HANDLER_SECONDS = REGISTRY.histogram("musig2_handler_seconds", "Wall time from a handler's start to its return, including time spent awaiting.", ["agent", "handler", "type"])
+HANDLER_CPU_SECONDS = REGISTRY.histogram("musig2_handler_cpu_seconds", "CPU time spent running a handler.", ["agent", "handler", "type"], buckets=BLOCKING_BUCKETS)
+HANDLER_BLOCKING_SECONDS = REGISTRY.histogram("musig2_handler_blocking_seconds", "Longest time a handler ran without yielding to the event loop.", ["agent", "handler", "type"], buckets=BLOCKING_BUCKETS)
+HANDLERS_BLOCKED = REGISTRY.counter("musig2_handlers_blocked_total", "Handler runs that held the event loop longer than the blocking threshold.", ["agent", "handler", "type"])
+EVENT_LOOP_LAG = REGISTRY.histogram("musig2_event_loop_lag_seconds", "How late the event loop ran a timer callback.", buckets=BLOCKING_BUCKETS)
+
+
+class _HandlerRun:
+    """Timing of one handler run, accumulated one coroutine step at a time."""
+
+    __slots__ = ("steps", "cpu", "longest_step")
+
+    def __init__(self):
+        self.steps = 0
+        self.cpu = 0.0
+        self.longest_step = 0.0
+
+
+class _SteppedCoroutine:
+    """Drives a coroutine one step at a time, timing each step.
+
+    A step is the code a coroutine runs between two awaits that suspend it,
+    during which nothing else on the event loop can run. The longest step is
+    how long the handler blocked message intake. The profile, if given, is only
+    enabled during the handler's own steps, so other tasks are not included.
+    """
+
+    __slots__ = ("coroutine", "run", "profile")
+
+    def __init__(self, coroutine: Coroutine, run: _HandlerRun, profile: Optional[cProfile.Profile]):
+        self.coroutine = coroutine
+        self.run = run
+        self.profile = profile
+
+    def __await__(self):
+        coroutine, run, profile = self.coroutine, self.run, self.profile
+        send_value, exception = None, None
+        while True:
+            wall_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            if profile is not None:
+                profile.enable()
+            try:
+                if exception is None:
+                    yielded = coroutine.send(send_value)
+                else:
+                    yielded = coroutine.throw(exception)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                if profile is not None:
+                    profile.disable()
+                step = time.perf_counter() - wall_start
+                run.cpu += time.thread_time() - cpu_start
+                run.steps += 1
+                if step > run.longest_step:
+                    run.longest_step = step
+            try:
+                send_value, exception = (yield yielded), None
+            except BaseException as e:  # Cancellation and close are passed on to the handler
+                send_value, exception = None, e
+
+
+def _file_name(message_type: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", message_type).strip("_") or "message"
+
+
+class Profiler:
+    """Opt-in profiling of the event loop and of the handlers spawned by MessageRouter.
+
+    While enabled, every handler is timed per coroutine step. Wall time, CPU
+    time and the longest step are recorded in the metrics registry, and runs
+    whose longest step exceeds the blocking threshold are logged, counted and
+    written to the event file. A sample of handler runs can be profiled with
+    cProfile, accumulating one profile per message type.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.block_threshold = 0.05
+        self.profile_sample_rate = 0.0
+        self.profiles: Dict[str, cProfile.Profile] = {}
+        self._events_file = None
+        self._lag_task: Optional[asyncio.Task] = None
+        self._children: Dict[Tuple[str, str, str], Tuple[Any, Any, Any]] = {}
+
+    def enable(self, block_threshold: float = 0.05, profile_sample_rate: float = 0.0, events_path: str = None):
+        """Start profiling handlers.
+
+        Args:
+            block_threshold: Seconds a handler may run without yielding before it is reported as blocking
+            profile_sample_rate: Fraction of handler runs profiled with cProfile, 0 to disable.
+                cProfile adds overhead to the sampled runs and replaces any other active profiler.
+            events_path: Append blocking handlers and event loop lag to this file as JSON lines (optional)
+        """
+        if not 0 <= profile_sample_rate <= 1:
+            raise ValueError("profile_sample_rate must be between 0 and 1.")
+        self.block_threshold = block_threshold
+        self.profile_sample_rate = profile_sample_rate
+        if self._events_file is not None:
+            self._events_file.close()
+        self._events_file = open(events_path, "a") if events_path else None
+        self.enabled = True
+
+    def disable(self):
+        """Stop profiling handlers and the event loop. Collected profiles are kept until dumped."""
+        self.enabled = False
+        self.stop_lag_monitor()
+        if self._events_file is not None:
+            self._events_file.close()
+            self._events_file = None
+
+    def start_lag_monitor(self, interval: float = 0.1) -> Optional[asyncio.Task]:
+        """Measure event loop lag in the running loop until disabled. Started once per process.
+
+        Args:
+            interval: Seconds between measurements
+        """
+        if not self.enabled:
+            return None
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.get_running_loop().create_task(self._monitor_lag(interval))
+        return self._lag_task
+
+    def stop_lag_monitor(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+
+    async def _monitor_lag(self, interval: float):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - scheduled)
+            EVENT_LOOP_LAG.labels().observe(lag)
+            if lag > self.block_threshold:
+                log.warning("event_loop_lag", lag_ms=round(lag * 1000, 3))
+                self._write_event({"event": "event_loop_lag", "lag_seconds": lag})
+
+    def profile_handler(self, coroutine: Coroutine, handler_name: str, message_type: str, agent: str = None) -> Coroutine:
+        """Wrap a handler coroutine to record its timings."""
+        return self._profiled(coroutine, handler_name, message_type, agent or "")
+
+    async def _profiled(self, coroutine: Coroutine, handler_name: str, message_type: str, agent: str):
+        profile = None
+        if self.profile_sample_rate and random.random() < self.profile_sample_rate:
+            profile = self.profiles.get(message_type)
+            if profile is None:
+                profile = self.profiles[message_type] = cProfile.Profile()
+        run = _HandlerRun()
+        start = time.perf_counter()
+        try:
+            return await _SteppedCoroutine(coroutine, run, profile)
+        finally:
+            self._record(agent, handler_name, message_type, run, time.perf_counter() - start)
+
+    def _record(self, agent: str, handler_name: str, message_type: str, run: _HandlerRun, wall: float):
+        key = (agent, handler_name, message_type)
+        children = self._children.get(key)
+        if children is None:
+            children = self._children[key] = (
+                HANDLER_SECONDS.labels(*key),
+                HANDLER_CPU_SECONDS.labels(*key),
+                HANDLER_BLOCKING_SECONDS.labels(*key),
+            )
+        wall_child, cpu_child, blocking_child = children
+        wall_child.observe(wall)
+        cpu_child.observe(run.cpu)
+        blocking_child.observe(run.longest_step)
+        if run.longest_step > self.block_threshold:
+            HANDLERS_BLOCKED.labels(*key).inc()
+            log.warning(
+                "handler_blocked",
+                agent=agent,
+                handler=handler_name,
+                type=message_type,
+                blocked_ms=round(run.longest_step * 1000, 3),
+                cpu_ms=round(run.cpu * 1000, 3),
+            )
+            self._write_event({
+                "event": "handler_blocked",
+                "agent": agent,
+                "handler": handler_name,
+                "type": message_type,
+                "longest_step_seconds": run.longest_step,
+                "wall_seconds": wall,
+                "cpu_seconds": run.cpu,
+                "steps": run.steps,
+            })
+
+    def _write_event(self, event: Dict):
+        if self._events_file is not None:
+            event["ts"] = round(time.time(), 6)
+            self._events_file.write(json.dumps(event) + "\n")
+            self._events_file.flush()
+
+    def dump_profiles(self, directory: str) -> Dict[str, str]:
+        """Write the sampled profile of each message type as a pstats file.
+
+        The files can be read with `python -m pstats` or snakeviz.
+
+        Returns:
+            The file written for each message type
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = {}
+        for message_type, profile in list(self.profiles.items()):
+            path = os.path.join(directory, f"{_file_name(message_type)}.pstats")
+            profile.dump_stats(path)
+            paths[message_type] = path
+        return paths
+
+
+# Profiler shared by the routers in a process
+PROFILER = Profiler()
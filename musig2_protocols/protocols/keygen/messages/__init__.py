@@ -0,0 +1,13 @@
+from .cohort_advert import CohortAdvertMessage
+from .cohort_set import CohortSetMessage
+from .opt_in import CohortOptInMessage
+from .subscribe import SubscribeMessage
+from .subscribe_accept import SubscribeAcceptMessage
+
+__all__ = [
+    'CohortAdvertMessage',
+    'CohortSetMessage',
+    'CohortOptInMessage',
+    'SubscribeMessage',
+    'SubscribeAcceptMessage',
+]
@@ -1,15 +1,28 @@
 from ....messaging.base import BaseMessage
+from ....messaging.encoding import MAX_ADVERTISED_ENCODINGS
+from ....messaging.fields import Field, LIST, STRING
+from ....messaging.registry import MESSAGE_TYPES
 from ..message_types import SUBSCRIBE
 
+
+@MESSAGE_TYPES.register
 class SubscribeMessage(BaseMessage):
     """Message for subscribing to the MuSig2 coordinator."""
 
+    __slots__ = ("encodings",)
+
+    TYPE = SUBSCRIBE
+    FIELDS = (
+        Field("encodings", LIST, required=False, max_length=MAX_ADVERTISED_ENCODINGS, item=Field("encodings", STRING, max_length=32)),
+    )
 
-    def __init__(self, to: str, frm: str):
+    def __init__(self, to: str, frm: str, encodings: list[str] = None):
         """Initialize a subscribe message.
         
         Args:
             to: The coordinator's DID
             frm: The subscriber's DID
+            encodings: The encoding profiles the sender can decode, most preferred first (optional)
         """
-        super().__init__(SUBSCRIBE, to, frm) 
\ No newline at end of file
+        super().__init__(SUBSCRIBE, to, frm)
+        self.encodings = encodings
@@ -1,16 +1,28 @@
 from ....messaging.base import BaseMessage
+from ....messaging.encoding import MAX_ADVERTISED_ENCODINGS
+from ....messaging.fields import Field, LIST, STRING
+from ....messaging.registry import MESSAGE_TYPES
 from ..message_types import SUBSCRIBE_ACCEPT
 
+
+@MESSAGE_TYPES.register
 class SubscribeAcceptMessage(BaseMessage):
     """Message for accepting a subscription request."""
 
+    __slots__ = ("encodings",)
 
+    TYPE = SUBSCRIBE_ACCEPT
+    FIELDS = (
+        Field("encodings", LIST, required=False, max_length=MAX_ADVERTISED_ENCODINGS, item=Field("encodings", STRING, max_length=32)),
+    )
 
-    def __init__(self, to: str, frm: str):
+    def __init__(self, to: str, frm: str, encodings: list[str] = None):
         """Initialize a subscribe accept message.
         
         Args:
             to: The subscriber's DID
             frm: The coordinator's DID
+            encodings: The encoding profiles the sender can decode, most preferred first (optional)
         """
-        super().__init__(SUBSCRIBE_ACCEPT, to, frm) 
\ No newline at end of file
+        super().__init__(SUBSCRIBE_ACCEPT, to, frm)
+        self.encodings = encodings
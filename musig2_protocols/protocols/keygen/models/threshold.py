@@ -0,0 +1,88 @@
+from functools import lru_cache
+from itertools import combinations
+from math import comb
+from typing import Dict, FrozenSet, List, Sequence, Tuple
+from buidl.ecc import S256Point
+from buidl.taproot import MuSigTapScript, TapBranch, TapRoot
+
+
+# Upper bound on the number of k-of-n leaves a cohort may commit to.
+# C(n, k) grows quickly, e.g. C(20, 15) = 15504, so larger trees are rejected
+# up front rather than stalling the event loop while the leaves are built.
+MAX_THRESHOLD_LEAVES = 1024
+
+
+def threshold_leaf_count(n: int, threshold: int) -> int:
+    """Return the number of k-of-n leaves, raising if the threshold is not usable."""
+    if threshold < 1 or threshold > n:
+        raise ValueError(f"Threshold {threshold} is invalid for a cohort of {n} participants.")
+    leaf_count = comb(n, threshold)
+    if leaf_count > MAX_THRESHOLD_LEAVES:
+        raise ValueError(f"{threshold}-of-{n} requires {leaf_count} leaves, the limit is {MAX_THRESHOLD_LEAVES}.")
+    return leaf_count
+
+
+class ThresholdLeafSet:
+    """Precomputed k-of-n MuSig2 tapscript leaves for a cohort.
+
+    The internal key stays the n-of-n MuSig2 aggregate, so the key path is
+    unchanged. Each leaf is a MuSig2 key over one k-sized subset of the cohort
+    keys and can be used as a script path fallback when participants are offline.
+    """
+
+    def __init__(self, cohort_keys: Sequence[S256Point], threshold: int):
+        threshold_leaf_count(len(cohort_keys), threshold)
+        self.cohort_keys = list(cohort_keys)
+        self.threshold = threshold
+        self.internal_pubkey = MuSigTapScript(self.cohort_keys).point
+
+        # Leaves are ordered the same way as TapRootMultiSig.musig_tree
+        self._scripts: Dict[FrozenSet[bytes], MuSigTapScript] = {}
+        self._leaves = {}
+        leaves = []
+        for subset in combinations(self.cohort_keys, threshold):
+            script = MuSigTapScript(list(subset))
+            leaf = script.tap_leaf()
+            subset_id = frozenset(point.sec() for point in subset)
+            self._scripts[subset_id] = script
+            self._leaves[subset_id] = leaf
+            leaves.append(leaf)
+        self.tap_node = TapBranch.combine(leaves)
+        self.merkle_root = self.tap_node.hash()
+        self.tap_root = TapRoot(self.internal_pubkey, self.tap_node)
+        self._control_blocks = {}
+
+    def p2tr_address(self, network: str) -> str:
+        """Get the P2TR address committing to the n-of-n key path and the k-of-n leaves."""
+        return self.internal_pubkey.p2tr_address(self.merkle_root, network=network)
+
+    def spend_info(self, signer_keys: Sequence[S256Point]) -> Tuple[MuSigTapScript, object]:
+        """Get the leaf script and control block for a k-sized subset of signers.
+
+        Args:
+            signer_keys: The public keys of the signers, exactly `threshold` of them
+
+        Returns:
+            The MuSig2 tapscript for the subset and its control block
+        """
+        subset_id = frozenset(point.sec() for point in signer_keys)
+        if len(subset_id) != self.threshold:
+            raise ValueError(f"Expected {self.threshold} distinct signer keys, got {len(subset_id)}.")
+        script = self._scripts.get(subset_id)
+        if script is None:
+            raise ValueError("Signer keys are not a subset of the cohort keys.")
+        control_block = self._control_blocks.get(subset_id)
+        if control_block is None:
+            control_block = self.tap_root.control_block(self._leaves[subset_id])
+            self._control_blocks[subset_id] = control_block
+        return script, control_block
+
+
+@lru_cache(maxsize=128)
+def _cached_leaf_set(key_secs: Tuple[bytes, ...], threshold: int) -> ThresholdLeafSet:
+    return ThresholdLeafSet([S256Point.parse(sec) for sec in key_secs], threshold)
+
+
+def get_threshold_leaf_set(cohort_keys: List[S256Point], threshold: int) -> ThresholdLeafSet:
+    """Get the cached leaf set for a list of cohort keys and a threshold."""
+    return _cached_leaf_set(tuple(point.sec() for point in cohort_keys), threshold)
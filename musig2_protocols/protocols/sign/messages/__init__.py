@@ -0,0 +1,13 @@
+from .aggregated_nonce import AggregatedNonceMessage
+from .authorization_request import AuthorizationRequestMessage
+from .nonce_contribution import NonceContributionMessage
+from .request_signature import RequestSignatureMessage
+from .signature_authorization import SignatureAuthorizationMessage
+
+__all__ = [
+    'AggregatedNonceMessage',
+    'AuthorizationRequestMessage',
+    'NonceContributionMessage',
+    'RequestSignatureMessage',
+    'SignatureAuthorizationMessage',
+]
@@ -1,11 +1,24 @@
 from ....messaging.base import BaseMessage
+from ....messaging.fields import MAX_COHORT_SIZE, id_field, point_list_field
+from ....messaging.registry import MESSAGE_TYPES
 from ..message_types import AGGREGATED_NONCE
 
 
+@MESSAGE_TYPES.register
 class AggregatedNonceMessage(BaseMessage):
     """Message containing the aggregated nonce for all participants."""
 
-    def __init__(self, to: str, frm: str, cohort_id: str, session_id: str, aggregated_nonce: list[str]):
+    __slots__ = ("session_id", "cohort_id", "aggregated_nonce", "signer_keys")
+
+    TYPE = AGGREGATED_NONCE
+    FIELDS = (
+        id_field("session_id"),
+        id_field("cohort_id"),
+        point_list_field("aggregated_nonce", 2),
+        point_list_field("signer_keys", MAX_COHORT_SIZE, required=False),
+    )
+
+    def __init__(self, to: str, frm: str, cohort_id: str, session_id: str, aggregated_nonce: list[str], signer_keys: list[str] = None):
         """Initialize a new aggregated nonce message.
         
         Args:
@@ -14,37 +27,10 @@ class AggregatedNonceMessage(BaseMessage):
             cohort_id: The cohort ID for this musig2 signing session
             session_id: The session ID for this musig2 signing session
             aggregated_nonce: The combined musig2 nonce values from all participants in the signing session.
+            signer_keys: Hex encoded keys of the k-of-n signers when signing a fallback leaf (optional)
         """
-        body = {
-            "session_id": session_id,
-            "cohort_id": cohort_id,
-            "session_id": session_id,
-            "aggregated_nonce": aggregated_nonce
-        }
-        thread_id = None
-        super().__init__(AGGREGATED_NONCE, to, frm, thread_id, body)
-
-    @property
-    def cohort_id(self) -> str:
-        return self.body["cohort_id"]
-    
-    @property
-    def session_id(self) -> str:
-        return self.body["session_id"]
-    
-    @property
-    def aggregated_nonce(self) -> list[str]:
-        return self.body["aggregated_nonce"]
-    
-    @classmethod
-    def from_dict(cls, msg_dict: dict):
-        """Create a message instance from a dictionary."""
-        if msg_dict["type"] != AGGREGATED_NONCE:
-            raise ValueError(f"Invalid message type: {msg_dict['type']}")
-        return cls(
-            to=msg_dict["to"],
-            frm=msg_dict["from"],
-            cohort_id=msg_dict["body"]["cohort_id"],
-            session_id=msg_dict["body"]["session_id"],
-            aggregated_nonce=msg_dict["body"]["aggregated_nonce"]
-        )
\ No newline at end of file
+        super().__init__(AGGREGATED_NONCE, to, frm, None)
+        self.session_id = session_id
+        self.cohort_id = cohort_id
+        self.aggregated_nonce = aggregated_nonce
+        self.signer_keys = signer_keys
@@ -1,11 +1,33 @@
 from ....messaging.base import BaseMessage
+from ....messaging.fields import Field, HEX, LIST, OBJECT, MAX_TX_HEX_LENGTH, id_field
+from ....messaging.registry import MESSAGE_TYPES
 from ..message_types import AUTHORIZATION_REQUEST
 from typing import Dict
 
+# An SMTProof as sent by SMTProof.to_dict, with at most one sibling per level of the 256 level tree
+SMT_PROOF_FIELDS = (
+    Field("key", HEX, max_length=64),
+    Field("value", HEX, nullable=True, max_length=64),
+    Field("bitmap", HEX, max_length=64),
+    Field("siblings", LIST, max_length=256, item=Field("siblings", HEX, max_length=64)),
+)
+
+
+@MESSAGE_TYPES.register
 class AuthorizationRequestMessage(BaseMessage):
     """Message for requesting authorization from cohort participants to sign a bitcoin transaction."""
 
-    def __init__(self, to: str, frm: str, session_id: str, cohort_id: str, pending_tx: str):
+    __slots__ = ("session_id", "cohort_id", "pending_tx", "smt_proof")
+
+    TYPE = AUTHORIZATION_REQUEST
+    FIELDS = (
+        id_field("session_id"),
+        id_field("cohort_id"),
+        Field("pending_tx", HEX, max_length=MAX_TX_HEX_LENGTH),
+        Field("smt_proof", OBJECT, required=False, fields=SMT_PROOF_FIELDS),
+    )
+
+    def __init__(self, to: str, frm: str, session_id: str, cohort_id: str, pending_tx: str, smt_proof: Dict = None):
         """Initialize a new authorization request message.
         
         Args:
@@ -14,36 +36,10 @@ class AuthorizationRequestMessage(BaseMessage):
             session_id: The session ID for this musig2 signing session
             cohort_id: The ID of the cohort participating in the signing session
             pending_tx: The pending bitcoin transaction (hex encoded) to be signed
+            smt_proof: The recipient's SMT inclusion or non-inclusion proof (SMTAggregateBeacon only)
         """
-        body = {
-            "session_id": session_id,
-            "cohort_id": cohort_id,
-            "pending_tx": pending_tx
-        }
-        thread_id = None
-        super().__init__(AUTHORIZATION_REQUEST, to, frm, thread_id, body)
-
-    @property
-    def cohort_id(self) -> str:
-        return self.body["cohort_id"]
-    
-    @property
-    def pending_tx(self) -> str:
-        return self.body["pending_tx"]
-    
-    @property
-    def session_id(self) -> str:
-        return self.body["session_id"]
-    
-    @classmethod
-    def from_dict(cls, msg_dict: Dict):
-        """Create a message instance from a dictionary."""
-        if msg_dict["type"] != AUTHORIZATION_REQUEST:
-            raise ValueError(f"Invalid message type: {msg_dict['type']}")
-        return cls(
-            to=msg_dict["to"],
-            frm=msg_dict["from"],
-            cohort_id=msg_dict["body"]["cohort_id"],
-            session_id=msg_dict["body"]["session_id"],
-            pending_tx=msg_dict["body"]["pending_tx"]
-        )
\ No newline at end of file
+        super().__init__(AUTHORIZATION_REQUEST, to, frm, None)
+        self.session_id = session_id
+        self.cohort_id = cohort_id
+        self.pending_tx = pending_tx
+        self.smt_proof = smt_proof
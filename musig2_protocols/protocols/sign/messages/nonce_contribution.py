@@ -1,10 +1,22 @@
 from ....messaging.base import BaseMessage
+from ....messaging.fields import id_field, point_list_field
+from ....messaging.registry import MESSAGE_TYPES
 from ..message_types import NONCE_CONTRIBUTION
 
 
+@MESSAGE_TYPES.register
 class NonceContributionMessage(BaseMessage):
     """Message for contributing a nonce to the signature process."""
 
+    __slots__ = ("session_id", "cohort_id", "nonce_contribution")
+
+    TYPE = NONCE_CONTRIBUTION
+    FIELDS = (
+        id_field("session_id"),
+        id_field("cohort_id"),
+        point_list_field("nonce_contribution", 2),
+    )
+
     def __init__(self, to: str, frm: str, session_id: str, cohort_id: str, nonce_contribution: list[str]):
         """Initialize a new nonce contribution message.
         
@@ -16,35 +28,7 @@ class NonceContributionMessage(BaseMessage):
             nonce_contribution: An array of hex encoded S256k1 points that a participant is 
                                 required to contribute as part of the nonce to the signature process.
         """
-        body = {
-            "session_id": session_id,
-            "cohort_id": cohort_id,
-            "nonce_contribution": nonce_contribution
-        }
-        thread_id = None
-        super().__init__(NONCE_CONTRIBUTION, to, frm, thread_id, body)
-
-    @property
-    def session_id(self) -> str:
-        return self.body["session_id"]
-    
-    @property
-    def cohort_id(self) -> str:
-        return self.body["cohort_id"]
-    
-    @property
-    def nonce_contribution(self) -> list[str]:
-        return self.body["nonce_contribution"]
-    
-    @classmethod
-    def from_dict(cls, msg_dict: dict):
-        """Create a message instance from a dictionary."""
-        if msg_dict["type"] != NONCE_CONTRIBUTION:
-            raise ValueError(f"Invalid message type: {msg_dict['type']}")
-        return cls(
-            to=msg_dict["to"],
-            frm=msg_dict["from"],
-            cohort_id=msg_dict["body"]["cohort_id"],
-            session_id=msg_dict["body"]["session_id"],
-            nonce_contribution=msg_dict["body"]["nonce_contribution"]
-        )
\ No newline at end of file
+        super().__init__(NONCE_CONTRIBUTION, to, frm, None)
+        self.session_id = session_id
+        self.cohort_id = cohort_id
+        self.nonce_contribution = nonce_contribution
@@ -1,3 +1,4 @@
+import time
 import uuid
 from typing import List, Dict
 
@@ -5,8 +6,13 @@ from ..messages.authorization_request import AuthorizationRequestMessage
 from buidl.ecc import S256Point
 from ...keygen.models.cohort import Musig2Cohort
 from buidl.tx import Tx, SIGHASH_DEFAULT
+from buidl.witness import Witness
+from ....smt import SMTProof, SparseMerkleTree, smt_key, smt_value
+from ....log import DEBUG, get_logger, lazy
 
 
+log = get_logger(__name__)
+
 AWAITING_NONCE_CONTRIBUTIONS = "AWAITING_NONCE_CONTRIBUTIONS"
 NONCE_CONTRIBUTION_SENT = "NONCE_CONTRIBUTION_SENT"
 NONCE_CONTRIBUTIONS_RECEIVED = "NONCE_CONTRIBUTIONS_RECEIVED"
@@ -18,7 +24,7 @@ FAILED = "FAILED"
 class SignatureAuthorizationSession:   
     """Represents a MuSig2 signature authorization session"""
 
-    def __init__(self, id: str = None, cohort: Musig2Cohort = None, pending_tx: Tx = None, processed_requests: Dict[str, str] = None, status: str = AWAITING_NONCE_CONTRIBUTIONS):
+    def __init__(self, id: str = None, cohort: Musig2Cohort = None, pending_tx: Tx = None, processed_requests: Dict[str, str] = None, status: str = AWAITING_NONCE_CONTRIBUTIONS, smt: SparseMerkleTree = None):
         self.id = id if id else str(uuid.uuid4())
         self.cohort = cohort
         self.pending_tx = pending_tx
@@ -29,18 +35,106 @@ class SignatureAuthorizationSession:
         self.status = status
         self.processed_requests: Dict[str, str] = processed_requests        
         self.nonce_secrets = None
+        # Participants expected to sign. Narrowed to a k-of-n subset for script path spends.
+        self.signers: List[str] = list(cohort.participants) if cohort else []
+        self.signer_keys: List[S256Point] = None
+        self.spend_script = None
+        self.control_block = None
+        # Sparse Merkle tree committed to by the beacon signal, coordinator side only
+        self.smt = smt
+        self.smt_proofs: Dict[str, SMTProof] = {}
+        self.created_at = time.monotonic()
+
+    def to_dict(self) -> Dict:
+        """Convert the session to a dictionary for the state store.
+
+        Secret nonces are never included. A restored participant session
+        cannot sign, so a nonce can not be used for two signatures.
+        """
+        return {
+            "id": self.id,
+            "cohort_id": self.cohort.id,
+            "status": self.status,
+            "pending_tx": self.pending_tx.serialize().hex(),
+            "processed_requests": self.processed_requests,
+            "nonce_contributions": self.nonce_contributions,
+            "aggregated_nonce": [point.sec(compressed=False).hex() for point in self.aggregated_nonce] if self.aggregated_nonce is not None else None,
+            "partial_signatures": self.partial_signatures,
+            "signers": self.signers,
+            "signer_keys": [point.sec(compressed=False).hex() for point in self.signer_keys] if self.signer_keys is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, session_dict: Dict, cohort: Musig2Cohort):
+        """Restore a session of a cohort from the state store."""
+        processed_requests = session_dict["processed_requests"]
+        smt = None
+        if processed_requests is not None and cohort.beacon_type == "SMTAggregateBeacon":
+            # The tree is derived from the requests, rebuilding it is cheaper than storing it
+            smt = SparseMerkleTree()
+            smt.update_batch((smt_key(did), smt_value(data)) for did, data in processed_requests.items())
+        session = cls(
+            id=session_dict["id"],
+            cohort=cohort,
+            pending_tx=Tx.parse_hex(session_dict["pending_tx"], network=cohort.btc_network),
+            processed_requests=processed_requests,
+            status=session_dict["status"],
+            smt=smt,
+        )
+        session.nonce_contributions = session_dict["nonce_contributions"]
+        if session_dict["aggregated_nonce"] is not None:
+            session.aggregated_nonce = [S256Point.parse(bytes.fromhex(point)) for point in session_dict["aggregated_nonce"]]
+        session.partial_signatures = session_dict["partial_signatures"]
+        session.signers = session_dict["signers"]
+        if session_dict["signer_keys"] is not None:
+            session.use_script_path([S256Point.parse(bytes.fromhex(point)) for point in session_dict["signer_keys"]])
+        if smt is not None:
+            session.generate_smt_proofs()
+        return session
+
+    def restart(self) -> "SignatureAuthorizationSession":
+        """Get a new session for the same transaction and requests, to collect fresh nonces from every participant.
+
+        Used when participants may no longer hold the nonce secrets of this
+        session. The new session has its own id, so nonces and partial
+        signatures of this one are never mixed into it.
+        """
+        session = SignatureAuthorizationSession(cohort=self.cohort, pending_tx=self.pending_tx, processed_requests=self.processed_requests, smt=self.smt)
+        session.smt_proofs = self.smt_proofs
+        return session
 
     def get_authorization_request(self, frm: str, to: str):
         """Get the authorization request message for a participant."""
         tx_hex = self.pending_tx.serialize().hex()
+        smt_proof = self.smt_proofs.get(to)
         return AuthorizationRequestMessage(
             to=to,
             frm=frm,
             session_id=self.id,
             cohort_id=self.cohort.id,
-            pending_tx=tx_hex
+            pending_tx=tx_hex,
+            smt_proof=smt_proof.to_dict() if smt_proof else None
         )
+
+    def get_beacon_signal(self):
+        """Get the data committed to by the OP_RETURN output of the pending transaction."""
+        for tx_out in self.pending_tx.tx_outs:
+            commands = tx_out.script_pubkey.commands
+            if len(commands) == 2 and commands[0] == 0x6a:
+                return commands[1]
+        return None
     
+    def generate_smt_proofs(self):
+        """Generate an SMT proof for each cohort participant.
+
+        Participants with a request in this session get an inclusion proof,
+        the others a non-inclusion proof.
+        """
+        if self.smt is None:
+            raise ValueError(f"Session {self.id} does not commit to a sparse Merkle tree.")
+        self.smt_proofs = {participant: self.smt.prove(smt_key(participant)) for participant in self.cohort.participants}
+        return self.smt_proofs
+
     def set_nonce_secrets(self, nonce_secrets: list[S256Point]):
         """Set the participants nonce secrets for the session."""
         self.nonce_secrets = nonce_secrets
@@ -51,26 +145,81 @@ class SignatureAuthorizationSession:
             raise ValueError(f"Nonce contributions already received. Current status: {self.status}")
         if len(nonce_contribution) != 2:
             raise ValueError(f"Invalid nonce contribution. Expected 2 points, got {len(nonce_contribution)}.")
+        if frm not in self.signers:
+            raise ValueError(f"Nonce contribution from {frm} who is not a signer in session {self.id}.")
         if self.nonce_contributions.get(frm):
-            print(f"WARNING:Nonce contribution already received from {frm}.")
+            log.warning("duplicate_nonce_contribution", session_id=self.id, frm=frm)
 
         self.nonce_contributions[frm] = nonce_contribution
 
-        if len(self.nonce_contributions.items()) == len(self.cohort.participants):
+        if len(self.nonce_contributions.items()) == len(self.signers):
             self.status = NONCE_CONTRIBUTIONS_RECEIVED
 
+    def select_responsive_signers(self):
+        """Fall back to a k-of-n leaf signed by the participants that contributed nonces.
+
+        Used by the coordinator once the nonce deadline has passed. The first
+        `threshold` responsive participants, in cohort order, become the signers.
+
+        Returns:
+            The DIDs of the selected signers
+        """
+        if self.status != AWAITING_NONCE_CONTRIBUTIONS:
+            raise ValueError(f"Signers can only be selected while awaiting nonce contributions. Current status: {self.status}")
+        if not self.cohort.has_threshold_leaves():
+            raise ValueError(f"Cohort {self.cohort.id} does not have threshold leaves.")
+        threshold = self.cohort.get_signing_threshold()
+        if len(self.nonce_contributions) < threshold:
+            raise ValueError(f"Not enough nonce contributions. Received {len(self.nonce_contributions)} of {threshold}.")
+
+        signers = []
+        signer_keys = []
+        for participant, participant_key in zip(self.cohort.participants, self.cohort.cohort_keys):
+            if participant in self.nonce_contributions:
+                signers.append(participant)
+                signer_keys.append(participant_key)
+            if len(signers) == threshold:
+                break
+
+        self.nonce_contributions = {signer: self.nonce_contributions[signer] for signer in signers}
+        self.signers = signers
+        self.use_script_path(signer_keys)
+        self.status = NONCE_CONTRIBUTIONS_RECEIVED
+        return signers
+
+    def use_script_path(self, signer_keys: list[S256Point]):
+        """Sign with the k-of-n leaf for the given signer keys instead of the key path."""
+        leaf_set = self.cohort.get_threshold_leaf_set()
+        self.spend_script, self.control_block = leaf_set.spend_info(signer_keys)
+        self.signer_keys = list(signer_keys)
+        # The witness must hold the leaf script and control block for the BIP342 sig hash
+        tx_in = self.pending_tx.tx_ins[0]
+        tx_in.witness = Witness([self.spend_script.raw_serialize(), self.control_block.serialize()])
+
+    def get_musig_script(self):
+        """Get the MuSig2 script for the spend path being signed."""
+        if self.spend_script is not None:
+            return self.spend_script
+        return self.cohort.get_cohort_musig2_script()
+
+    def get_merkle_root(self):
+        """Get the taproot merkle root to tweak with. Script path signatures are untweaked."""
+        if self.spend_script is not None:
+            return None
+        return self.cohort.tr_merkle_root
+
     def generate_aggregated_nonce(self):
         """Get the aggregated nonce for the session."""
         
         if self.status != NONCE_CONTRIBUTIONS_RECEIVED:
-            raise ValueError(f"Nonce contributions not received yet. Received {len(self.nonce_contributions)} of {len(self.cohort.participants)}.")
+            raise ValueError(f"Nonce contributions not received yet. Received {len(self.nonce_contributions)} of {len(self.signers)}.")
         
         pub_nonces = []
         for frm, nonce_contribution in self.nonce_contributions.items():
             nonce_points = [S256Point.parse(bytes.fromhex(nonce)) for nonce in nonce_contribution]
             pub_nonces.append(nonce_points)
 
-        musig = self.cohort.get_cohort_musig2_script()
+        musig = self.get_musig_script()
         aggregated_nonce = musig.nonce_sums(pub_nonces)
         self.aggregated_nonce = aggregated_nonce
         
@@ -81,27 +230,36 @@ class SignatureAuthorizationSession:
         self.aggregated_nonce = aggregated_nonce
 
     def generate_partial_signature(self, participant_sk):
-        """Generate a partial signature for the session."""
+        """Generate a partial signature for the session.
+
+        The nonce secrets are discarded once used, a second aggregated nonce
+        for the session can not make them sign again.
+        """
         if self.aggregated_nonce is None:
             raise ValueError("Aggregated nonce not received yet.")
+        if self.nonce_secrets is None:
+            raise ValueError(f"No nonce secrets for session {self.id}, they were used or not kept over a restart.")
         
         input_index = 0
         
         sig_hash = self.pending_tx.sig_hash(0, SIGHASH_DEFAULT)
-        musig = self.cohort.get_cohort_musig2_script()
+        musig = self.get_musig_script()
         r = musig.compute_r(self.aggregated_nonce, sig_hash)
-        k = musig.compute_k(self.nonce_secrets, self.aggregated_nonce, sig_hash)
-        partial_sig = musig.sign(participant_sk, k, r, sig_hash, self.cohort.tr_merkle_root)
+        nonce_secrets, self.nonce_secrets = self.nonce_secrets, None
+        k = musig.compute_k(nonce_secrets, self.aggregated_nonce, sig_hash)
+        partial_sig = musig.sign(participant_sk, k, r, sig_hash, self.get_merkle_root())
         return partial_sig
     
     def add_partial_signature(self, frm: str, partial_signature: int):
         """Add a partial signature to the session."""
         if self.status != AWAITING_PARTIAL_SIGNATURES:
             raise ValueError(f"Partial signatures not expected. Current status: {self.status}")
+        if frm not in self.signers:
+            raise ValueError(f"Partial signature from {frm} who is not a signer in session {self.id}.")
         if self.partial_signatures.get(frm):
-            print(f"WARNING: Partial signature already received from {frm}.")
+            log.warning("duplicate_partial_signature", session_id=self.id, frm=frm)
         self.partial_signatures[frm] = partial_signature
-        if len(self.partial_signatures.items()) == len(self.cohort.participants):
+        if len(self.partial_signatures.items()) == len(self.signers):
             self.status = PARTIAL_SIGNATURES_RECEIVED
 
     def generate_final_signature(self):
@@ -109,35 +267,35 @@ class SignatureAuthorizationSession:
         if self.status != PARTIAL_SIGNATURES_RECEIVED:
             raise ValueError(f"Partial signatures not received yet. Current status: {self.status}")
         
-        musig = self.cohort.get_cohort_musig2_script()
+        musig = self.get_musig_script()
         input_index = len(self.pending_tx.tx_ins) - 1
         sig_hash = self.pending_tx.sig_hash(input_index, SIGHASH_DEFAULT)
         r = musig.compute_r(self.aggregated_nonce, sig_hash)
         sig_sum = 0
         for partial_sig in self.partial_signatures.values():
-            print(f"Partial signature: {partial_sig}")
-            print(f"Partial signature type: {type(partial_sig)}")
             sig_sum += partial_sig
 
-        self.signature = musig.get_signature(sig_sum, r, sig_hash, self.cohort.tr_merkle_root)
-        print(f"Signature: {self.signature.serialize().hex()}")
+        self.signature = musig.get_signature(sig_sum, r, sig_hash, self.get_merkle_root())
         
         tx_in_to_finalize = self.pending_tx.tx_ins[input_index]
-        tx_in_to_finalize.finalize_p2tr_keypath(self.signature.serialize())
+        if self.spend_script is not None:
+            tx_in_to_finalize.witness = Witness([
+                self.signature.serialize(),
+                self.spend_script.raw_serialize(),
+                self.control_block.serialize()
+            ])
+        else:
+            tx_in_to_finalize.finalize_p2tr_keypath(self.signature.serialize())
         tx_in_to_finalize._value = 1000
         tx_in_to_finalize._script_pubkey = self.pending_tx.tx_outs[0].script_pubkey
-        print(f"Witness items: {len(tx_in_to_finalize.witness)}")
-        for item in tx_in_to_finalize.witness:
-            print(f"Witness item: {item.hex()} (length: {len(item)})")
-    
+        if log.isEnabledFor(DEBUG):
+            log.debug("witness", session_id=self.id, items=[item.hex() for item in tx_in_to_finalize.witness])
+
         verified = self.pending_tx.verify()
-        print(f"Verified: {verified}")
-        print(f"btc network: {self.cohort.btc_network}")
         if not verified:
             raise ValueError("Signature verification failed.")
         self.status = SIGNATURE_COMPLETE
-        print(f"Signature complete for session {self.id}")
-        print(f"Signature: {self.signature.serialize().hex()}")
+        log.info("signature_complete", session_id=self.id, cohort_id=self.cohort.id, signature=lazy(lambda: self.signature.serialize().hex()))
         self.signature = self.signature
         return self.signature
 
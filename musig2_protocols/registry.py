@@ -0,0 +1,130 @@
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from buidl.ecc import S256Point
+from .protocols.keygen.models.cohort import Musig2Cohort
+
+
+class DIDRegistry:
+    """Insertion ordered set of DIDs, e.g. a coordinator's subscribers.
+
+    Membership checks, adds and removes are O(1). Iteration walks the live
+    registry, take a snapshot() to remove DIDs while broadcasting to it.
+    """
+
+    def __init__(self):
+        self._dids: Dict[str, None] = {}
+
+    def add(self, did: str) -> bool:
+        """Add a DID. Returns False if it was already registered."""
+        if did in self._dids:
+            return False
+        self._dids[did] = None
+        return True
+
+    def discard(self, did: str) -> None:
+        """Remove a DID if it is registered."""
+        self._dids.pop(did, None)
+
+    def snapshot(self) -> Tuple[str, ...]:
+        """Get the registered DIDs as they are right now."""
+        return tuple(self._dids)
+
+    def __contains__(self, did: str) -> bool:
+        return did in self._dids
+
+    def __len__(self) -> int:
+        return len(self._dids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._dids)
+
+    def __repr__(self) -> str:
+        return f"DIDRegistry({list(self._dids)})"
+
+
+class CohortRegistry:
+    """Cohorts indexed by id, status and participant DID.
+
+    Iteration walks the live registry, take a snapshot() to add or remove
+    cohorts while iterating.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[str, Musig2Cohort] = {}
+        # Registration order for positional access
+        self._ordered: List[Musig2Cohort] = []
+        self._by_status: Dict[str, Set[str]] = defaultdict(set)
+        self._by_participant: Dict[str, Set[str]] = defaultdict(set)
+
+    def add(self, cohort: Musig2Cohort) -> Musig2Cohort:
+        """Register a cohort and index its current participants and status."""
+        if cohort.id in self._by_id:
+            raise ValueError(f"Cohort {cohort.id} is already registered.")
+        self._by_id[cohort.id] = cohort
+        self._ordered.append(cohort)
+        self._by_status[cohort.status].add(cohort.id)
+        for participant in cohort.participants:
+            self._by_participant[participant].add(cohort.id)
+        cohort.add_status_listener(self._on_status_change)
+        return cohort
+
+    def remove(self, cohort_id: str) -> Optional[Musig2Cohort]:
+        """Remove a cohort and drop it from every index."""
+        cohort = self._by_id.pop(cohort_id, None)
+        if cohort is None:
+            return None
+        self._ordered.remove(cohort)
+        self._discard_index(self._by_status, cohort.status, cohort_id)
+        for participant in cohort.participants:
+            self._discard_index(self._by_participant, participant, cohort_id)
+        cohort.remove_status_listener(self._on_status_change)
+        return cohort
+
+    def get(self, cohort_id: str) -> Optional[Musig2Cohort]:
+        """Get a cohort by id."""
+        return self._by_id.get(cohort_id)
+
+    def add_participant(self, cohort: Musig2Cohort, participant_did: str, participant_pk: S256Point) -> bool:
+        """Add a participant to a registered cohort. Returns False if already a member."""
+        if cohort.has_participant(participant_did):
+            return False
+        cohort.add_participant(participant_did, participant_pk)
+        self._by_participant[participant_did].add(cohort.id)
+        return True
+
+    def with_status(self, status: str) -> List[Musig2Cohort]:
+        """Get the cohorts currently in a status."""
+        return [self._by_id[cohort_id] for cohort_id in tuple(self._by_status.get(status, ()))]
+
+    def for_participant(self, participant_did: str) -> List[Musig2Cohort]:
+        """Get the cohorts a participant is a member of."""
+        return [self._by_id[cohort_id] for cohort_id in tuple(self._by_participant.get(participant_did, ()))]
+
+    def snapshot(self) -> Tuple[Musig2Cohort, ...]:
+        """Get the registered cohorts as they are right now."""
+        return tuple(self._by_id.values())
+
+    def _on_status_change(self, cohort: Musig2Cohort, previous: str, status: str):
+        self._discard_index(self._by_status, previous, cohort.id)
+        self._by_status[status].add(cohort.id)
+
+    @staticmethod
+    def _discard_index(index: Dict[str, Set[str]], key: str, cohort_id: str):
+        cohort_ids = index.get(key)
+        if cohort_ids is not None:
+            cohort_ids.discard(cohort_id)
+            if not cohort_ids:
+                del index[key]
+
+    def __contains__(self, cohort_id: str) -> bool:
+        return cohort_id in self._by_id
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[Musig2Cohort]:
+        return iter(self._by_id.values())
+
+    def __getitem__(self, index: int) -> Musig2Cohort:
+        # Positional access in registration order, used from the notebooks
+        return self._ordered[index]
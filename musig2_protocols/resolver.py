@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from didcomm_messaging.resolver import DIDResolver
+from pydid import DIDDocument
+
+
+class CachingResolver(DIDResolver):
+    """Caches resolved and parsed DID documents in front of another resolver.
+
+    did:peer documents are derived from the DID itself and never change, so
+    entries are only evicted by size, least recently used first.
+    """
+
+    def __init__(self, resolver: DIDResolver, max_size: int = 4096):
+        """Initialize the cache.
+
+        Args:
+            resolver: The resolver to cache
+            max_size: The most documents kept
+        """
+        self.resolver = resolver
+        self.max_size = max_size
+        self._documents: "OrderedDict[str, dict]" = OrderedDict()
+        self._parsed: "OrderedDict[str, DIDDocument]" = OrderedDict()
+
+    async def is_resolvable(self, did: str) -> bool:
+        return did in self._documents or await self.resolver.is_resolvable(did)
+
+    async def resolve(self, did: str) -> dict:
+        document = self._documents.get(did)
+        if document is None:
+            document = await self.resolver.resolve(did)
+            self._put(self._documents, did, document)
+        else:
+            self._documents.move_to_end(did)
+        return document
+
+    async def resolve_and_parse(self, did: str) -> DIDDocument:
+        # Parsing costs more than resolving a did:peer, so parsed documents are cached too
+        document = self._parsed.get(did)
+        if document is None:
+            document = DIDDocument.deserialize(await self.resolve(did))
+            self._put(self._parsed, did, document)
+        else:
+            self._parsed.move_to_end(did)
+        return document
+
+    def _put(self, cache: OrderedDict, did: str, value):
+        cache[did] = value
+        if len(cache) > self.max_size:
+            cache.popitem(last=False)
@@ -1,8 +1,24 @@
 import asyncio
 from .context import InMemoryContextStorage
+from .messaging import MESSAGE_TYPES, BaseMessage
+# Importing the protocol messages registers their classes with MESSAGE_TYPES
+from .protocols.keygen import messages as _keygen_messages  # noqa: F401
+from .protocols.sign import messages as _sign_messages  # noqa: F401
+from .metrics import REGISTRY
+from .profiling import PROFILER
+from .tracing import TRACER, current_span, session_attributes
+from .log import get_logger
+
+
+log = get_logger(__name__)
+
+# Label for message types that are neither registered nor routed, peers choose the type string
+OTHER_MESSAGE_TYPE = "other"
+MESSAGES_INVALID = REGISTRY.counter("musig2_messages_invalid_total", "Received messages dropped because they do not match their type's schema.", ["agent", "type"])
 
 class MessageRouter:
-    def __init__(self, _scheduler):
+    def __init__(self, _scheduler, agent: str = None):
+        self.agent = agent  # name of the agent, used to label handler profiles
         self.routes = {} # routes are for persistant routing of messages by type
         self.await_routes = {}  # used for one time routing, not horizontally scalable.
 
@@ -41,12 +57,34 @@ class MessageRouter:
 
         return message_future  # this can be awaited.
     
+    def metric_type(self, msg_type) -> str:
+        """The type label to count a received message under, bounded to the known message types."""
+        if isinstance(msg_type, str) and (msg_type in MESSAGE_TYPES or msg_type in self.routes):
+            return msg_type
+        return OTHER_MESSAGE_TYPE
+
     async def route_message(self, msg):
-        msg_type = msg["type"]
-        from_did = msg["from"]
+        """Route a received message to its handlers.
+
+        Messages of registered types are decoded into their message class and
+        validated first, and dropped if they do not match its schema. Handlers
+        get the typed message, or the dict for types without a message class.
+        """
         thid = msg.get("thid", None)
+        try:
+            msg = MESSAGE_TYPES.decode(msg)
+        except ValueError as e:
+            log.warning("invalid_message", agent=self.agent, type=msg.get("type"), frm=msg.get("from"), error=str(e))
+            MESSAGES_INVALID.labels(self.agent, self.metric_type(msg.get("type"))).inc()
+            return
+        if isinstance(msg, BaseMessage):
+            msg_type = msg.type
+            from_did = msg.frm
+        else:
+            msg_type = msg["type"]
+            from_did = msg["from"]
 
-        print(f"Routing - {msg_type}")
+        log.debug("routing", type=msg_type, frm=from_did)
 
         # Get appropriate contexts
         contact_context = InMemoryContextStorage(("contact", from_did))
@@ -65,14 +103,14 @@ class MessageRouter:
             handler = self.named_handlers.get(handler_name, None)
             if handler:
                 await self.scheduler.spawn(
-                    handler(msg, contact_context, thread_context) 
+                    self._handle(handler, msg, contact_context, thread_context)
                 )
             return
 
         # check await based routing
         fingerprint = f"{from_did}|{msg_type}"
         if fingerprint in self.await_routes:
-            print("Routing ONCE message")
+            log.debug("routing_once", type=msg_type, frm=from_did)
             msg_future = self.await_routes[fingerprint]
             msg_future.set_result((msg, contact_context, thread_context))
             del self.await_routes[fingerprint]  # remove the registered handler
@@ -82,11 +120,40 @@ class MessageRouter:
             for handler in self.routes[msg_type]:
                 if handler:
                     await self.scheduler.spawn(
-                        handler(msg, contact_context, thread_context)
+                        self._handle(handler, msg, contact_context, thread_context)
                     )
         else:
             await self.unknown_handler(msg, contact_context, thread_context)
 
+    def _handle(self, handler, msg, contact_context, thread_context):
+        """Get the handler coroutine to spawn, wrapped in a span while tracing is enabled and timed while profiling is."""
+        if not TRACER.enabled:
+            coroutine = handler(msg, contact_context, thread_context)
+        else:
+            # Capture the parent now, the scheduler may start the job later from another context
+            coroutine = self._traced_handler(handler, msg, contact_context, thread_context, current_span())
+        if PROFILER.enabled:
+            handler_name = getattr(handler, "__qualname__", None) or getattr(handler, "__name__", "handler")
+            coroutine = PROFILER.profile_handler(coroutine, handler_name, _message_type(msg), self.agent)
+        return coroutine
+
+    async def _traced_handler(self, handler, msg, contact_context, thread_context, parent):
+        if isinstance(msg, BaseMessage):
+            cohort_id, session_id = getattr(msg, "cohort_id", None), getattr(msg, "session_id", None)
+        else:
+            body = msg.get("body") or {}
+            cohort_id, session_id = body.get("cohort_id"), body.get("session_id")
+        attributes = {"musig2.message_type": _message_type(msg), **session_attributes(cohort_id, session_id)}
+        with TRACER.start_span(f"handle {getattr(handler, '__name__', 'handler')}", attributes=attributes, parent=parent):
+            await handler(msg, contact_context, thread_context)
+
     async def unknown_handler(self, msg, contact_context, thread_context):
-        print("Unknown Message: ", msg)
-        print("Contact Context: ", contact_context)
\ No newline at end of file
+        if isinstance(msg, BaseMessage):
+            msg_type, from_did = msg.type, msg.frm
+        else:
+            msg_type, from_did = msg.get("type"), msg.get("from")
+        log.warning("unknown_message", type=msg_type, frm=from_did, context=contact_context.namespace)
+
+
+def _message_type(msg) -> str:
+    return msg.type if isinstance(msg, BaseMessage) else msg["type"]
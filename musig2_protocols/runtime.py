@@ -0,0 +1,161 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Dict, Tuple
+import aiojobs
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+AUTO = "auto"
+UVLOOP = "uvloop"
+ASYNCIO = "asyncio"
+LOOP_IMPLEMENTATIONS = (AUTO, UVLOOP, ASYNCIO)
+
+# JSON types accepted for a setting, used in the types of check_keys
+INTEGER = (int,)
+NUMBER = (int, float)
+OPTIONAL_INTEGER = (int, type(None))
+OPTIONAL_NUMBER = (int, float, type(None))
+OPTIONAL_STRING = (str, type(None))
+
+_TYPE_NAMES = {str: "a string", int: "an integer", float: "a number", bool: "a boolean", list: "a list", dict: "an object", type(None): "null"}
+
+
+def check_keys(section: str, data: Dict[str, Any], allowed, types: Dict[str, Tuple[type, ...]] = None) -> None:
+    """Reject unknown keys in a configuration section, so a misspelled setting is not silently ignored.
+
+    Args:
+        section: The name of the section in error messages
+        data: The section as read from the config file
+        allowed: The keys of the section
+        types: The types accepted for each key, so `"port": "abc"` fails here rather than
+            once the agent runs. A boolean is only an integer if bool is listed (optional)
+
+    Raises:
+        ValueError: If the section is not an object, has a key not in allowed or a value of the wrong type
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"{section} must be an object.")
+    unknown = sorted(set(data) - set(allowed))
+    if unknown:
+        raise ValueError(f"Unknown {section} settings: {', '.join(unknown)}.")
+    for key, value in data.items():
+        expected = types.get(key) if types is not None else None
+        if expected is None:
+            continue
+        if not isinstance(value, expected) or (isinstance(value, bool) and bool not in expected):
+            names = " or ".join(_TYPE_NAMES.get(t, t.__name__) for t in expected if t is not int or float not in expected)
+            raise ValueError(f"{section}.{key} must be {names}.")
+
+
+class LoopConfig:
+    """Event loop implementation and tuning."""
+
+    KEYS = ("implementation", "debug", "slow_callback_duration", "executor_workers")
+    TYPES = {"implementation": (str,), "debug": (bool,), "slow_callback_duration": NUMBER, "executor_workers": OPTIONAL_INTEGER}
+
+    def __init__(self, implementation: str = AUTO, debug: bool = False, slow_callback_duration: float = 0.1, executor_workers: int = None):
+        """Initialize the event loop settings.
+
+        Args:
+            implementation: UVLOOP, ASYNCIO, or AUTO for uvloop when it is installed
+            debug: Run the loop in debug mode, which logs callbacks slower than slow_callback_duration
+            slow_callback_duration: Seconds a callback may block the loop before debug mode logs it
+            executor_workers: Threads of the default executor, Python's default by default (optional)
+
+        Raises:
+            ValueError: If a setting is invalid or uvloop is requested but not installed
+        """
+        if implementation not in LOOP_IMPLEMENTATIONS:
+            raise ValueError(f"Unknown event loop implementation {implementation}.")
+        if implementation == UVLOOP and uvloop is None:
+            raise ValueError("uvloop is not installed.")
+        if slow_callback_duration <= 0:
+            raise ValueError("slow_callback_duration must be positive.")
+        if executor_workers is not None and executor_workers < 1:
+            raise ValueError("executor_workers must be at least 1.")
+        self.implementation = implementation
+        self.debug = debug
+        self.slow_callback_duration = slow_callback_duration
+        self.executor_workers = executor_workers
+
+    @property
+    def uses_uvloop(self) -> bool:
+        return self.implementation == UVLOOP or (self.implementation == AUTO and uvloop is not None)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LoopConfig":
+        check_keys("loop", data, cls.KEYS, cls.TYPES)
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.KEYS}
+
+
+class SchedulerConfig:
+    """Limits of the aiojobs scheduler that runs message handlers."""
+
+    KEYS = ("limit", "pending_limit", "close_timeout")
+    TYPES = {"limit": OPTIONAL_INTEGER, "pending_limit": INTEGER, "close_timeout": NUMBER}
+
+    def __init__(self, limit: int = 100, pending_limit: int = 10000, close_timeout: float = 0.1):
+        """Initialize the scheduler settings. The defaults are aiojobs' own.
+
+        Args:
+            limit: Handlers running at once, None for no limit. Messages beyond it wait in the pending queue.
+            pending_limit: Messages waiting for a handler slot before routing blocks the connection, 0 for no limit
+            close_timeout: Seconds running handlers get to finish when the scheduler is closed
+
+        Raises:
+            ValueError: If a limit is invalid
+        """
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be at least 1.")
+        if pending_limit < 0:
+            raise ValueError("pending_limit must not be negative.")
+        self.limit = limit
+        self.pending_limit = pending_limit
+        self.close_timeout = close_timeout
+
+    def create(self) -> aiojobs.Scheduler:
+        """Create a scheduler with these limits. Call from the event loop it runs on."""
+        return aiojobs.Scheduler(limit=self.limit, pending_limit=self.pending_limit, close_timeout=self.close_timeout)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SchedulerConfig":
+        check_keys("scheduler", data, cls.KEYS, cls.TYPES)
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.KEYS}
+
+
+def install_event_loop_policy(config: LoopConfig) -> None:
+    """Make new event loops use the configured implementation."""
+    if config.uses_uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    else:
+        asyncio.set_event_loop_policy(None)
+
+
+async def _configure_loop(main: Awaitable, config: LoopConfig):
+    loop = asyncio.get_running_loop()
+    loop.slow_callback_duration = config.slow_callback_duration
+    if config.executor_workers is not None:
+        loop.set_default_executor(ThreadPoolExecutor(config.executor_workers))
+    return await main
+
+
+def run(main: Awaitable, config: LoopConfig = None):
+    """Run a coroutine on a new event loop of the configured implementation, like asyncio.run.
+
+    Args:
+        main: The coroutine to run
+        config: Event loop settings, uvloop when it is installed by default
+    """
+    config = config or LoopConfig()
+    install_event_loop_policy(config)
+    return asyncio.run(_configure_loop(main, config), debug=config.debug)
@@ -0,0 +1,111 @@
+import os
+from typing import Dict, List, Optional
+from aries_askar import Store
+from aries_askar.store import KeyEntryList
+from didcomm_messaging.crypto.backend.askar import AskarSecretKey
+from didcomm_messaging.crypto.base import SecretsManager
+from .log import get_logger
+
+
+log = get_logger(__name__)
+
+
+class AskarStoreSecretsManager(SecretsManager[AskarSecretKey]):
+    """Keeps DID secrets in an encrypted Askar store, so agents keep their DIDs across restarts.
+
+    `load` reads every entry of the store in one query. Opening a key costs
+    more than reading it, so each key is only opened on first use and then
+    kept in memory. New secrets are written through to the store. Each key
+    is tagged with its DID and, for DIDs that should be found again after a
+    restart, a label such as "coordinator".
+    """
+
+    def __init__(self, store: Store):
+        """Initialize the secrets manager.
+
+        Args:
+            store: An open Askar store
+        """
+        self.store = store
+        # Opened keys
+        self.secrets: Dict[str, AskarSecretKey] = {}
+        # Entries read by load and not opened yet, by kid
+        self._entries: Optional[KeyEntryList] = None
+        self._unopened: Dict[str, int] = {}
+        # DIDs by label, restored by load
+        self.labels: Dict[str, str] = {}
+
+    @classmethod
+    async def open(cls, path: str, passphrase: str, key_method: str = "kdf:argon2i:mod") -> "AskarStoreSecretsManager":
+        """Open the SQLite store at a path, creating it if it does not exist.
+
+        Args:
+            path: Path of the SQLite database file
+            passphrase: The store's passphrase, or a key from `Store.generate_raw_key()` with key_method "raw"
+            key_method: How the store key is derived from the passphrase. "raw" skips the
+                Argon2 derivation, which takes most of the time to open a store.
+        """
+        uri = f"sqlite://{path}"
+        if os.path.exists(path):
+            store = await Store.open(uri, key_method, passphrase)
+        else:
+            store = await Store.provision(uri, key_method, passphrase)
+        return cls(store)
+
+    async def load(self) -> List[str]:
+        """Read every key of the store, in one query.
+
+        Returns:
+            The key ids of the stored secrets
+        """
+        async with self.store.session() as session:
+            entries = await session.fetch_all_keys()
+        kids = []
+        for position, entry in enumerate(entries):
+            kid = entry.name
+            if kid not in self.secrets:
+                self._unopened[kid] = position
+            tags = entry.tags
+            if "label" in tags:
+                self.labels[tags["label"]] = tags["did"]
+            kids.append(kid)
+        # The entries are read from this list when their keys are first used
+        self._entries = entries
+        log.info("secrets_loaded", keys=len(kids), labels=len(self.labels))
+        return kids
+
+    async def get_secret_by_kid(self, kid: str) -> Optional[AskarSecretKey]:
+        """Get a secret by its kid."""
+        secret = self.secrets.get(kid)
+        if secret is None and kid in self._unopened:
+            secret = AskarSecretKey(self._entries[self._unopened.pop(kid)].key, kid)
+            self.secrets[kid] = secret
+            if not self._unopened:
+                self._entries = None
+        elif secret is None:
+            # Written by another process since load
+            async with self.store.session() as session:
+                entry = await session.fetch_key(kid)
+            if entry is not None:
+                secret = AskarSecretKey(entry.key, kid)
+                self.secrets[kid] = secret
+        return secret
+
+    async def add_secret(self, secret: AskarSecretKey, label: str = None):
+        """Store a secret.
+
+        Args:
+            secret: The secret, its kid starts with its DID
+            label: Name to find the secret's DID by after a restart (optional)
+        """
+        did = secret.kid.split("#", 1)[0]
+        tags = {"did": did}
+        if label:
+            tags["label"] = label
+            self.labels[label] = did
+        async with self.store.session() as session:
+            await session.insert_key(secret.kid, secret.key, tags=tags)
+        self.secrets[secret.kid] = secret
+
+    async def close(self):
+        await self.store.close()
@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import os
+import struct
+import uuid
+from bisect import bisect
+from typing import Any, Awaitable, Callable, Dict, Optional
+from .codec import JSON
+from .messaging import MESSAGE_TYPES, negotiate_encoding
+from .metrics import REGISTRY
+from .protocols.keygen.message_types import SUBSCRIBE
+from .router import MessageRouter
+from .log import get_logger
+
+
+log = get_logger(__name__)
+
+SHARD_FRAMES_SENT = REGISTRY.counter("musig2_shard_frames_sent_total", "Frames sent to other coordinator workers, by kind.", ["agent", "kind"])
+SHARD_FRAMES_RECEIVED = REGISTRY.counter("musig2_shard_frames_received_total", "Frames received from other coordinator workers, by kind.", ["agent", "kind"])
+SHARD_SEND_FAILURES = REGISTRY.counter("musig2_shard_send_failures_total", "Frames that could not be sent to another coordinator worker.", ["agent"])
+
+# Frame kinds. A message is routed by the worker owning its cohort, a subscriber is added by every worker.
+MESSAGE_FRAME = "message"
+SUBSCRIBER_FRAME = "subscriber"
+
+# Frame header: length of the JSON frame that follows
+_FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+class HashRing:
+    """Consistent hashing of keys, such as cohort ids, onto workers.
+
+    Each worker has `replicas` points on a ring of 64 bit hashes, and a key
+    belongs to the worker of the first point after its hash. Adding a worker
+    moves only about 1/n of the keys.
+    """
+
+    def __init__(self, workers: int, replicas: int = 256):
+        """Initialize the ring.
+
+        Args:
+            workers: Number of workers, numbered from 0
+            replicas: Points per worker, more spread keys more evenly
+        """
+        if workers < 1 or replicas < 1:
+            raise ValueError("A hash ring needs at least one worker and one replica.")
+        self.workers = workers
+        points = sorted((_hash(f"worker-{worker}-{replica}"), worker) for worker in range(workers) for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._owners = [worker for _, worker in points]
+
+    def owner(self, key: str) -> int:
+        """Get the worker a key belongs to."""
+        if self.workers == 1:
+            return 0
+        position = bisect(self._hashes, _hash(key))
+        return self._owners[position % len(self._owners)]
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class WorkerLinks:
+    """Length-prefixed JSON frames between the workers of one coordinator, over Unix sockets.
+
+    Each worker listens on `worker-<index>.sock` in a directory only the
+    coordinator's user can access, since forwarded messages are decrypted.
+    Connections to other workers are opened on first use.
+    """
+
+    def __init__(self, index: int, workers: int, directory: str, on_frame: Callable[[Dict[str, Any]], Awaitable[None]], agent: str = None):
+        """Initialize the links of one worker.
+
+        Args:
+            index: This worker's number
+            workers: Number of workers
+            directory: Directory of the workers' sockets
+            on_frame: Called with each frame received from another worker
+            agent: Name of the agent, used in metric labels
+        """
+        self.index = index
+        self.workers = workers
+        self.directory = directory
+        self.on_frame = on_frame
+        self.agent = agent
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Dict[int, asyncio.StreamWriter] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._send_failures = SHARD_SEND_FAILURES.labels(agent)
+
+    def socket_path(self, worker: int) -> str:
+        return os.path.join(self.directory, f"worker-{worker}.sock")
+
+    async def start(self):
+        """Listen for frames from the other workers."""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        path = self.socket_path(self.index)
+        if os.path.exists(path):
+            # Left by an earlier run of this worker
+            os.unlink(path)
+        self._server = await asyncio.start_unix_server(self._read_frames, path=path)
+        log.info("worker_link_listening", agent=self.agent, worker=self.index, path=path)
+
+    async def _read_frames(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                (length,) = _FRAME_HEADER.unpack(await reader.readexactly(_FRAME_HEADER.size))
+                if length > MAX_FRAME_SIZE:
+                    raise ValueError(f"Frame of {length} bytes is too large.")
+                frame = JSON.loads(await reader.readexactly(length))
+                SHARD_FRAMES_RECEIVED.labels(self.agent, str(frame.get("kind"))).inc()
+                await self.on_frame(frame)
+        except (asyncio.IncompleteReadError, asyncio.CancelledError):
+            # The other worker closed the link, or this one is shutting down
+            pass
+        except Exception as e:
+            log.warning("worker_link_failed", agent=self.agent, worker=self.index, error=str(e))
+        finally:
+            writer.close()
+
+    async def send(self, worker: int, frame: Dict[str, Any]):
+        """Send a frame to another worker. Failures are logged and counted, the frame is dropped."""
+        data = JSON.dumps(frame)
+        lock = self._locks.setdefault(worker, asyncio.Lock())
+        try:
+            async with lock:
+                writer = self._writers.get(worker)
+                if writer is None or writer.is_closing():
+                    _, writer = await asyncio.open_unix_connection(self.socket_path(worker))
+                    self._writers[worker] = writer
+                writer.write(_FRAME_HEADER.pack(len(data)) + data)
+                await writer.drain()
+            SHARD_FRAMES_SENT.labels(self.agent, frame["kind"]).inc()
+        except (OSError, ConnectionError) as e:
+            self._send_failures.inc()
+            self._writers.pop(worker, None)
+            log.warning("worker_send_failed", agent=self.agent, worker=worker, kind=frame["kind"], error=str(e))
+
+    async def broadcast(self, frame: Dict[str, Any]):
+        """Send a frame to every other worker."""
+        await asyncio.gather(*(self.send(worker, frame) for worker in range(self.workers) if worker != self.index))
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+class ShardedMessageRouter(MessageRouter):
+    """MessageRouter of one coordinator worker, routing cohort messages to the worker owning the cohort.
+
+    Messages about a cohort owned by another worker are forwarded to it
+    decrypted, so the envelope is only decrypted once. Subscriptions are
+    handled where they arrive and replicated to every worker, since any
+    worker may announce a cohort.
+    """
+
+    def __init__(self, _scheduler, shard: "CoordinatorShard", agent: str = None):
+        super().__init__(_scheduler, agent=agent)
+        self.shard = shard
+
+    async def route_message(self, msg):
+        owner = self.shard.owner_of(msg)
+        if owner != self.shard.index:
+            await self.shard.links.send(owner, {"kind": MESSAGE_FRAME, "message": msg})
+            return
+        await self.route_local(msg)
+        if msg.get("type") == SUBSCRIBE:
+            await self.shard.links.broadcast({"kind": SUBSCRIBER_FRAME, "message": msg})
+
+    async def route_local(self, msg):
+        """Route a message to this worker's handlers."""
+        await super().route_message(msg)
+
+
+class CoordinatorShard:
+    """One worker of a coordinator running in several processes.
+
+    The workers share the coordinator's DID and listening port. Each cohort
+    is owned by one worker, chosen by consistent hashing of its id, which
+    keeps the cohort's state and does its MuSig2 work. Cohorts announced by
+    a worker get ids it owns.
+
+    Create the shard, make `create_router` the DIDCommService's message
+    router before the coordinator registers its handlers, then `attach`
+    the coordinator and `start` the shard.
+    """
+
+    def __init__(self, index: int, workers: int, directory: str, agent: str = None, replicas: int = 256):
+        """Initialize a worker.
+
+        Args:
+            index: This worker's number, from 0
+            workers: Number of workers
+            directory: Directory of the workers' IPC sockets
+            agent: Name of the agent, used in logs and metric labels
+            replicas: Points per worker on the hash ring
+        """
+        if not 0 <= index < workers:
+            raise ValueError(f"Invalid worker {index} of {workers}.")
+        self.index = index
+        self.workers = workers
+        self.agent = agent
+        self.ring = HashRing(workers, replicas)
+        self.links = WorkerLinks(index, workers, directory, self._handle_frame, agent=agent)
+        self.coordinator = None
+        self.router: Optional[ShardedMessageRouter] = None
+
+    def create_router(self, scheduler) -> ShardedMessageRouter:
+        """Create the message router of this worker's DIDCommService."""
+        self.router = ShardedMessageRouter(scheduler, self, agent=self.agent)
+        return self.router
+
+    def attach(self, coordinator):
+        """Use this worker's coordinator, making the cohorts it announces its own."""
+        self.coordinator = coordinator
+        coordinator.cohort_id_factory = self.new_cohort_id
+
+    async def start(self):
+        await self.links.start()
+
+    async def close(self):
+        await self.links.close()
+
+    def owns(self, cohort_id: str) -> bool:
+        return self.ring.owner(cohort_id) == self.index
+
+    def owner_of(self, msg: Dict[str, Any]) -> int:
+        """Get the worker that routes a message: the cohort's owner, or this worker for messages without a cohort."""
+        body = msg.get("body")
+        cohort_id = body.get("cohort_id") if type(body) is dict else None
+        if type(cohort_id) is not str:
+            return self.index
+        return self.ring.owner(cohort_id)
+
+    def new_cohort_id(self) -> str:
+        """Generate a cohort id owned by this worker, in `workers` tries on average."""
+        while True:
+            cohort_id = str(uuid.uuid4())
+            if self.owns(cohort_id):
+                return cohort_id
+
+    async def _handle_frame(self, frame: Dict[str, Any]):
+        kind = frame.get("kind")
+        msg = frame.get("message")
+        if type(msg) is not dict:
+            log.warning("invalid_shard_frame", agent=self.agent, kind=kind)
+            return
+        if kind == MESSAGE_FRAME:
+            # Not checked against the ring again, so a frame is never forwarded twice
+            await self.router.route_local(msg)
+        elif kind == SUBSCRIBER_FRAME:
+            try:
+                message = MESSAGE_TYPES.decode(msg)
+            except ValueError as e:
+                log.warning("invalid_shard_frame", agent=self.agent, kind=kind, error=str(e))
+                return
+            self.coordinator.add_subscriber(message.frm, negotiate_encoding(message.encodings))
+        else:
+            log.warning("invalid_shard_frame", agent=self.agent, kind=kind)
@@ -0,0 +1,184 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Set
+from .protocols.keygen.models.cohort import Musig2Cohort
+from .log import get_logger
+
+
+log = get_logger(__name__)
+
+
+class BatchWindow:
+    """Batching policy deciding when a cohort's pending signature requests become a signing session."""
+
+    def __init__(self, max_delay: float = None, max_requests: int = None, block_interval: int = None, max_batch_size: int = None, nonce_deadline: float = None, session_timeout: float = 300):
+        """Initialize a batching window.
+
+        At least one trigger must be set. Whichever trigger fires first starts the session.
+
+        Args:
+            max_delay: Seconds after the first pending request before a session is started
+            max_requests: Start a session as soon as this many requests are pending
+            block_interval: Start a session on every block height divisible by this interval
+            max_batch_size: Admission limit, the most requests committed to one session.
+                Requests over the limit stay pending for the next window.
+            nonce_deadline: Deadline passed to BeaconCoordinator.start_signing_session (optional)
+            session_timeout: Seconds a session may stay in flight before it is expired and the
+                next window can open, None to wait for it forever
+        """
+        if max_delay is None and max_requests is None and block_interval is None:
+            raise ValueError("A batch window needs a max_delay, max_requests or block_interval trigger.")
+        if max_batch_size is not None and max_batch_size < 1:
+            raise ValueError(f"Invalid max_batch_size {max_batch_size}.")
+        if session_timeout is not None and session_timeout <= 0:
+            raise ValueError(f"Invalid session_timeout {session_timeout}.")
+        self.max_delay = max_delay
+        self.max_requests = max_requests
+        self.block_interval = block_interval
+        self.max_batch_size = max_batch_size
+        self.nonce_deadline = nonce_deadline
+        self.session_timeout = session_timeout
+
+
+class SigningScheduler:
+    """Starts signing sessions automatically from per-cohort batching windows.
+
+    A cohort has at most one session in flight. Requests that arrive while a
+    session is running stay pending and are coalesced into the next window,
+    which opens when the coordinator reports the session as finished, or
+    once the window's session_timeout has passed.
+    """
+
+    def __init__(self, start_session: Callable[[str, BatchWindow], Awaitable[object]], default_window: BatchWindow = None, expire_session: Callable[[str], None] = None):
+        """Initialize the scheduler.
+
+        Args:
+            start_session: Coroutine function called with (cohort_id, window) to start a session.
+                It returns the started session, or None if no session was started.
+            default_window: Window used for cohorts without their own window (optional)
+            expire_session: Called with the cohort id of a session in flight for longer than
+                the window's session_timeout, to fail it (optional)
+        """
+        self.start_session = start_session
+        self.expire_session = expire_session
+        self.default_window = default_window
+        self.windows: Dict[str, BatchWindow] = {}
+        self.block_height: Optional[int] = None
+        self._cohorts: Dict[str, Musig2Cohort] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._in_flight: Set[str] = set()
+        self._session_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def set_window(self, cohort_id: str, window: BatchWindow):
+        """Set the batching window for a cohort."""
+        self.windows[cohort_id] = window
+
+    def get_window(self, cohort_id: str) -> Optional[BatchWindow]:
+        """Get the batching window for a cohort, falling back to the default window."""
+        return self.windows.get(cohort_id, self.default_window)
+
+    def request_added(self, cohort: Musig2Cohort):
+        """Called after a signature request has been added to a cohort."""
+        self._cohorts[cohort.id] = cohort
+        self._evaluate(cohort)
+
+    def session_finished(self, cohort: Musig2Cohort):
+        """Called once a cohort's signing session has completed or failed."""
+        self._release(cohort.id)
+        self._evaluate(cohort)
+
+    def session_started(self, cohort: Musig2Cohort):
+        """Called once a session has started for a cohort, also one not started by this scheduler."""
+        self._cohorts[cohort.id] = cohort
+        self._hold(cohort)
+
+    def session_resumed(self, cohort: Musig2Cohort):
+        """Called for a session restored in flight, so no other session is started for the cohort."""
+        self.session_started(cohort)
+
+    def notify_block(self, height: int):
+        """Called by a block source for each new block. Triggers block-aligned windows."""
+        self.block_height = height
+        for cohort_id, cohort in list(self._cohorts.items()):
+            window = self.get_window(cohort_id)
+            if window is None or not window.block_interval:
+                continue
+            if height % window.block_interval == 0 and cohort.pending_signature_requests:
+                self._trigger(cohort)
+
+    def cancel(self, cohort_id: str):
+        """Stop scheduling sessions for a cohort."""
+        timer = self._timers.pop(cohort_id, None)
+        if timer:
+            timer.cancel()
+        self._cohorts.pop(cohort_id, None)
+        self.windows.pop(cohort_id, None)
+
+    def close(self):
+        """Cancel all timers and pending session starts."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for timer in self._session_timers.values():
+            timer.cancel()
+        self._session_timers.clear()
+        for task in self._tasks:
+            task.cancel()
+
+    def _evaluate(self, cohort: Musig2Cohort):
+        window = self.get_window(cohort.id)
+        if window is None or cohort.id in self._in_flight:
+            return
+        pending = len(cohort.pending_signature_requests)
+        if pending == 0:
+            return
+        if window.max_requests and pending >= window.max_requests:
+            self._trigger(cohort)
+        elif window.max_delay is not None and cohort.id not in self._timers:
+            # The window opens with the first pending request
+            loop = asyncio.get_running_loop()
+            self._timers[cohort.id] = loop.call_later(window.max_delay, self._trigger, cohort)
+
+    def _trigger(self, cohort: Musig2Cohort):
+        timer = self._timers.pop(cohort.id, None)
+        if timer:
+            timer.cancel()
+        if cohort.id in self._in_flight or not cohort.pending_signature_requests:
+            return
+        self._hold(cohort)
+        task = asyncio.get_running_loop().create_task(self._start(cohort))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _start(self, cohort: Musig2Cohort):
+        try:
+            signing_session = await self.start_session(cohort.id, self.get_window(cohort.id))
+        except Exception as e:
+            log.error("scheduled_session_failed", cohort_id=cohort.id, error=str(e))
+            signing_session = None
+        if signing_session is None:
+            self._release(cohort.id)
+
+    def _hold(self, cohort: Musig2Cohort):
+        """Mark a cohort's session as in flight, until it finishes or its window's session_timeout passes."""
+        self._in_flight.add(cohort.id)
+        window = self.get_window(cohort.id)
+        if window is not None and window.session_timeout is not None and cohort.id not in self._session_timers:
+            self._session_timers[cohort.id] = asyncio.get_running_loop().call_later(window.session_timeout, self._expire, cohort)
+
+    def _release(self, cohort_id: str):
+        self._in_flight.discard(cohort_id)
+        timer = self._session_timers.pop(cohort_id, None)
+        if timer:
+            timer.cancel()
+
+    def _expire(self, cohort: Musig2Cohort):
+        self._session_timers.pop(cohort.id, None)
+        if cohort.id not in self._in_flight:
+            return
+        log.warning("signing_session_expired", cohort_id=cohort.id)
+        self._release(cohort.id)
+        if self.expire_session is not None:
+            # Fails the session, putting its requests back before the next window opens
+            self.expire_session(cohort.id)
+        self._evaluate(cohort)
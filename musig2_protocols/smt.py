@@ -0,0 +1,297 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+TREE_DEPTH = 256
+EMPTY_LEAF = bytes(32)
+
+
+def _hash_node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(left + right).digest()
+
+
+def _empty_hashes(depth: int) -> List[bytes]:
+    hashes = [EMPTY_LEAF]
+    for _ in range(depth):
+        hashes.append(_hash_node(hashes[-1], hashes[-1]))
+    return hashes
+
+
+# EMPTY_HASHES[h] is the root of an empty subtree of height h
+EMPTY_HASHES = _empty_hashes(TREE_DEPTH)
+
+
+def smt_key(did: str) -> bytes:
+    """Get the SMT leaf index for a DID."""
+    return hashlib.sha256(did.encode()).digest()
+
+
+def smt_value(data: str) -> bytes:
+    """Get the SMT leaf value committing to a signature request's data."""
+    return hashlib.sha256(data.encode()).digest()
+
+
+def extend_hash(node_hash: bytes, key: int, from_height: int, to_height: int) -> bytes:
+    """Hash a subtree with no other leaves up from `from_height` to `to_height`.
+
+    Every sibling on the way up is an empty subtree, so only the path bits
+    of `key` (any key inside the subtree) are needed.
+    """
+    sha256 = hashlib.sha256
+    empty = EMPTY_HASHES
+    for height in range(from_height, to_height):
+        if (key >> height) & 1:
+            node_hash = sha256(empty[height] + node_hash).digest()
+        else:
+            node_hash = sha256(node_hash + empty[height]).digest()
+    return node_hash
+
+
+class _Leaf:
+    __slots__ = ("key", "hash")
+    height = 0
+
+    def __init__(self, key: int, value: bytes):
+        self.key = key
+        self.hash = value
+
+
+class _Branch:
+    """A node where both subtrees hold leaves. Single-child chains between branches are not stored."""
+
+    __slots__ = ("height", "key", "left", "right", "left_hash", "right_hash", "hash")
+
+    def __init__(self, height: int, key: int, left, right):
+        self.height = height
+        # Any key below this node, used for the path bits above it
+        self.key = key
+        self.left = left
+        self.right = right
+        # Child subtree roots at height - 1, kept for proofs
+        self.left_hash: bytes = None
+        self.right_hash: bytes = None
+        self.hash: bytes = None
+
+    def rehash(self):
+        child_height = self.height - 1
+        self.left_hash = extend_hash(self.left.hash, self.left.key, self.left.height, child_height)
+        self.right_hash = extend_hash(self.right.hash, self.right.key, self.right.height, child_height)
+        self.hash = _hash_node(self.left_hash, self.right_hash)
+
+
+class SMTProof:
+    """Compact SMT inclusion or non-inclusion proof.
+
+    Only non-empty siblings are carried. Bit i of `bitmap` is set when the
+    sibling at height i is non-empty, and `siblings` lists those hashes from
+    the leaf upwards.
+    """
+
+    __slots__ = ("key", "value", "bitmap", "siblings")
+
+    def __init__(self, key: bytes, value: Optional[bytes], bitmap: int, siblings: List[bytes]):
+        self.key = key
+        self.value = value
+        self.bitmap = bitmap
+        self.siblings = siblings
+
+    def compute_root(self) -> bytes:
+        """Compute the root committed to by the proof."""
+        key = int.from_bytes(self.key, "big")
+        node_hash = self.value if self.value is not None else EMPTY_LEAF
+        siblings = iter(self.siblings)
+        bitmap = self.bitmap
+        sha256 = hashlib.sha256
+        empty = EMPTY_HASHES
+        for height in range(TREE_DEPTH):
+            sibling = next(siblings) if (bitmap >> height) & 1 else empty[height]
+            if (key >> height) & 1:
+                node_hash = sha256(sibling + node_hash).digest()
+            else:
+                node_hash = sha256(node_hash + sibling).digest()
+        return node_hash
+
+    def to_dict(self) -> Dict:
+        """Convert the proof to a dictionary for messages."""
+        return {
+            "key": self.key.hex(),
+            "value": self.value.hex() if self.value is not None else None,
+            "bitmap": self.bitmap.to_bytes(TREE_DEPTH // 8, "big").hex(),
+            "siblings": [sibling.hex() for sibling in self.siblings]
+        }
+
+    @classmethod
+    def from_dict(cls, proof_dict: Dict):
+        """Create a proof from a dictionary."""
+        bitmap = int.from_bytes(bytes.fromhex(proof_dict["bitmap"]), "big")
+        siblings = [bytes.fromhex(sibling) for sibling in proof_dict["siblings"]]
+        if bin(bitmap).count("1") != len(siblings):
+            raise ValueError("SMT proof bitmap does not match the number of siblings.")
+        value = proof_dict.get("value")
+        return cls(
+            key=bytes.fromhex(proof_dict["key"]),
+            value=bytes.fromhex(value) if value is not None else None,
+            bitmap=bitmap,
+            siblings=siblings
+        )
+
+
+class SparseMerkleTree:
+    """256-level sparse Merkle tree with incremental, batched rehashing.
+
+    The root matches a full tree of height 256 whose empty subtrees hash to
+    EMPTY_HASHES, but only leaves and branch points are stored, so memory is
+    O(leaves). Inserts only mark the branches on their path as dirty. The
+    dirty branches are rehashed bottom up, once per batch, when the root or
+    a proof is requested.
+    """
+
+    def __init__(self):
+        self._top = None
+        self._dirty: Dict[int, _Branch] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def update(self, key: bytes, value: bytes):
+        """Insert or update a leaf."""
+        if len(key) != TREE_DEPTH // 8 or len(value) != 32:
+            raise ValueError("SMT keys and values must be 32 bytes.")
+        if value == EMPTY_LEAF:
+            raise ValueError("SMT leaf values must not be the empty leaf.")
+        self._insert(int.from_bytes(key, "big"), value)
+
+    def update_batch(self, items: Iterable[Tuple[bytes, bytes]]):
+        """Insert or update many leaves, rehashing shared paths once."""
+        for key, value in items:
+            self.update(key, value)
+        self._rehash()
+
+    def delete(self, key: bytes):
+        """Remove a leaf, if the key is in the tree."""
+        if len(key) != TREE_DEPTH // 8:
+            raise ValueError("SMT keys must be 32 bytes.")
+        self._delete(int.from_bytes(key, "big"))
+
+    def delete_batch(self, keys: Iterable[bytes]):
+        """Remove many leaves, rehashing shared paths once."""
+        for key in keys:
+            self.delete(key)
+        self._rehash()
+
+    def root(self) -> bytes:
+        """Get the root hash of the tree."""
+        self._rehash()
+        if self._top is None:
+            return EMPTY_HASHES[TREE_DEPTH]
+        return extend_hash(self._top.hash, self._top.key, self._top.height, TREE_DEPTH)
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        """Get the value of a leaf, or None if the key is not in the tree."""
+        key_int = int.from_bytes(key, "big")
+        node = self._top
+        while isinstance(node, _Branch):
+            node = node.right if (key_int >> (node.height - 1)) & 1 else node.left
+        if node is not None and node.key == key_int:
+            return node.hash
+        return None
+
+    def prove(self, key: bytes) -> SMTProof:
+        """Generate an inclusion proof, or a non-inclusion proof if the key is absent."""
+        self._rehash()
+        key_int = int.from_bytes(key, "big")
+        siblings: Dict[int, bytes] = {}
+        value = None
+        node = self._top
+        while node is not None:
+            diverge_height = (node.key ^ key_int).bit_length()
+            if diverge_height > node.height:
+                # The key leaves this subtree above it, which becomes the only non-empty sibling
+                siblings[diverge_height - 1] = extend_hash(node.hash, node.key, node.height, diverge_height - 1)
+                break
+            if isinstance(node, _Leaf):
+                value = node.hash
+                break
+            if (key_int >> (node.height - 1)) & 1:
+                siblings[node.height - 1] = node.left_hash
+                node = node.right
+            else:
+                siblings[node.height - 1] = node.right_hash
+                node = node.left
+
+        bitmap = 0
+        for height in siblings:
+            bitmap |= 1 << height
+        return SMTProof(key, value, bitmap, [siblings[height] for height in sorted(siblings)])
+
+    def _insert(self, key: int, value: bytes):
+        path: List[_Branch] = []
+        parent = None
+        node = self._top
+        while True:
+            if node is None:
+                self._top = _Leaf(key, value)
+                self._size += 1
+                return
+            diverge_height = (node.key ^ key).bit_length()
+            if diverge_height > node.height:
+                # Split above node with a new branch at the height where the paths meet
+                leaf = _Leaf(key, value)
+                if (key >> (diverge_height - 1)) & 1:
+                    branch = _Branch(diverge_height, key, node, leaf)
+                else:
+                    branch = _Branch(diverge_height, key, leaf, node)
+                self._replace_child(parent, node, branch)
+                path.append(branch)
+                self._size += 1
+                break
+            if isinstance(node, _Leaf):
+                # Same key, update the value in place
+                node.hash = value
+                break
+            path.append(node)
+            parent = node
+            node = node.right if (key >> (node.height - 1)) & 1 else node.left
+
+        for branch in path:
+            self._dirty[id(branch)] = branch
+
+    def _delete(self, key: int):
+        path: List[_Branch] = []
+        node = self._top
+        while isinstance(node, _Branch):
+            if (node.key ^ key).bit_length() > node.height:
+                return
+            path.append(node)
+            node = node.right if (key >> (node.height - 1)) & 1 else node.left
+        if node is None or node.key != key:
+            return
+        self._size -= 1
+        if not path:
+            self._top = None
+            return
+        # The leaf's branch is replaced by the leaf's sibling. Keys of the
+        # branches above stay valid, they only serve for the path bits above.
+        branch = path.pop()
+        sibling = branch.right if branch.left is node else branch.left
+        self._replace_child(path[-1] if path else None, branch, sibling)
+        self._dirty.pop(id(branch), None)
+        for branch in path:
+            self._dirty[id(branch)] = branch
+
+    def _replace_child(self, parent: Optional[_Branch], old, new):
+        if parent is None:
+            self._top = new
+        elif parent.left is old:
+            parent.left = new
+        else:
+            parent.right = new
+
+    def _rehash(self):
+        if not self._dirty:
+            return
+        # Children always sit lower than their parents, so rehash by ascending height
+        for branch in sorted(self._dirty.values(), key=lambda b: b.height):
+            branch.rehash()
+        self._dirty.clear()
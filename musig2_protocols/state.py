@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+from typing import Any, Callable, Dict, Optional
+from .log import get_logger
+
+
+log = get_logger(__name__)
+
+SNAPSHOT_FILE = "snapshot.json"
+DELTA_LOG_FILE = "deltas.log"
+
+
+class StateStore:
+    """Crash-safe key-value state of an agent: a snapshot plus an append-only delta log.
+
+    Each record, such as one cohort or one signing session, is written as a
+    line `[key, record]` to the delta log when it changes, or `[key, null]`
+    when it is deleted. Changes made in the same event loop iteration are
+    coalesced, so a record touched by many messages in a burst is written
+    once. Once the log holds `compact_after` lines, the current state is
+    written to a new snapshot, which atomically replaces the old one, and
+    the log is truncated.
+
+    A crash loses at most the changes of the current loop iteration. A line
+    cut short by the crash is ignored on load.
+    """
+
+    def __init__(self, directory: str, compact_after: int = 10000, fsync: bool = False):
+        """Initialize the store.
+
+        Args:
+            directory: Directory of the snapshot and delta log, created if it does not exist
+            compact_after: Write a new snapshot once the delta log has this many lines
+            fsync: Flush every write to disk, to also survive an operating system crash
+        """
+        if compact_after < 1:
+            raise ValueError(f"Invalid compact_after {compact_after}.")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.compact_after = compact_after
+        self.fsync = fsync
+        self.records: Dict[str, Any] = {}
+        self._snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self._log_path = os.path.join(directory, DELTA_LOG_FILE)
+        self._log = None
+        self._log_lines = 0
+        # Changed records, serialized when the loop iteration ends
+        self._dirty: Dict[str, Optional[Callable[[], Any]]] = {}
+        self._flush_handle: Optional[asyncio.Handle] = None
+
+    def load(self) -> Dict[str, Any]:
+        """Read the snapshot and replay the delta log.
+
+        Returns:
+            The records by key
+        """
+        records = {}
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, "rb") as snapshot:
+                records = json.load(snapshot)
+        lines = 0
+        if os.path.exists(self._log_path):
+            with open(self._log_path, "rb") as delta_log:
+                for line in delta_log:
+                    try:
+                        key, record = json.loads(line)
+                    except ValueError:
+                        # Partial write of the last line before a crash
+                        log.warning("delta_log_truncated", directory=self.directory, line=lines + 1)
+                        break
+                    if record is None:
+                        records.pop(key, None)
+                    else:
+                        records[key] = record
+                    lines += 1
+        self.records = records
+        self._log_lines = lines
+        log.info("state_loaded", directory=self.directory, records=len(records), deltas=lines)
+        # Start from a clean snapshot, dropping any partial line
+        self.compact()
+        return records
+
+    def put(self, key: str, serialize: Callable[[], Any]):
+        """Mark a record as changed.
+
+        Args:
+            key: The record's key
+            serialize: Returns the record as JSON data, called once when the change is written
+        """
+        self._dirty[key] = serialize
+        self._schedule_flush()
+
+    def delete(self, key: str):
+        """Mark a record as deleted."""
+        self._dirty[key] = None
+        self._schedule_flush()
+
+    def flush(self):
+        """Write the changed records to the delta log now."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        lines = []
+        for key, serialize in dirty.items():
+            record = serialize() if serialize is not None else None
+            if record is None:
+                self.records.pop(key, None)
+            else:
+                self.records[key] = record
+            lines.append(json.dumps([key, record], separators=(",", ":")))
+        delta_log = self._open_log()
+        delta_log.write(("\n".join(lines) + "\n").encode())
+        delta_log.flush()
+        if self.fsync:
+            os.fsync(delta_log.fileno())
+        self._log_lines += len(lines)
+        if self._log_lines >= self.compact_after:
+            self.compact()
+
+    def compact(self):
+        """Write the current records to a new snapshot and truncate the delta log."""
+        temporary_path = self._snapshot_path + ".tmp"
+        with open(temporary_path, "wb") as snapshot:
+            snapshot.write(json.dumps(self.records, separators=(",", ":")).encode())
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temporary_path, self._snapshot_path)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        open(self._log_path, "wb").close()
+        log.debug("state_compacted", directory=self.directory, records=len(self.records), deltas=self._log_lines)
+        self._log_lines = 0
+
+    def close(self):
+        """Write pending changes and close the delta log."""
+        self.flush()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def _open_log(self):
+        if self._log is None:
+            self._log = open(self._log_path, "ab")
+        return self._log
+
+    def _schedule_flush(self):
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._flush_handle = loop.call_soon(self.flush)
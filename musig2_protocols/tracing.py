@@ -0,0 +1,263 @@
+import json
+import random
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+# DIDComm message header carrying the sender's span, in the W3C traceparent format
+TRACEPARENT = "traceparent"
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_PRODUCER = 4
+SPAN_KIND_CONSUMER = 5
+
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("musig2_current_span", default=None)
+
+
+def current_span() -> Optional["Span"]:
+    """Get the span active in the current task, if any."""
+    return _current_span.get()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Parse a traceparent header into (trace_id, span_id), or None if it is missing or invalid."""
+    if not isinstance(value, str):
+        return None
+    parts = value.split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2]
+
+
+class Span:
+    """A timed operation within a trace. Used as a context manager it becomes the current span."""
+
+    __slots__ = ("name", "agent", "kind", "trace_id", "span_id", "parent_span_id", "start_time", "end_time", "attributes", "status_code", "status_message", "_tracer", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, agent: str, kind: int, trace_id: str, parent_span_id: Optional[str], start_time: int, attributes: Dict[str, Any]):
+        self._tracer = tracer
+        self.name = name
+        self.agent = agent
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_span_id = parent_span_id
+        self.start_time = start_time
+        self.end_time = None
+        self.attributes = attributes
+        self.status_code = STATUS_UNSET
+        self.status_message = None
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        if value is not None:
+            self.attributes[key] = value
+
+    def record_exception(self, exception: BaseException):
+        self.status_code = STATUS_ERROR
+        self.status_message = f"{type(exception).__name__}: {exception}"
+
+    def traceparent(self) -> str:
+        """Get the traceparent header value identifying this span."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def end(self, end_time: int = None):
+        """End the span and hand it to the exporter. Times are Unix epoch nanoseconds."""
+        if self.end_time is None:
+            self.end_time = end_time if end_time is not None else time.time_ns()
+            self._tracer._export(self)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.record_exception(exc)
+        self.end()
+        return False
+
+
+class _NoopSpan:
+    """Returned while tracing is disabled, so instrumented code costs one attribute lookup."""
+
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_exception(self, exception):
+        pass
+
+    def end(self, end_time=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JsonlSpanExporter:
+    """Writes finished spans as OTLP JSON, one ExportTraceServiceRequest per line.
+
+    The file can be read by the OpenTelemetry Collector's otlpjsonfile receiver.
+    Spans are buffered and written in batches, and grouped into one resource
+    per agent (service.name).
+    """
+
+    def __init__(self, path: str, batch_size: int = 512):
+        """Initialize the exporter.
+
+        Args:
+            path: The file to append spans to
+            batch_size: The number of finished spans buffered before a write
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self._buffer: List[Span] = []
+        self._file = open(path, "a")
+
+    def export(self, span: Span):
+        self._buffer.append(span)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered spans."""
+        if not self._buffer:
+            return
+        spans, self._buffer = self._buffer, []
+        by_agent: Dict[str, List[Dict]] = defaultdict(list)
+        for span in spans:
+            by_agent[span.agent or "musig2"].append(_span_to_otlp(span))
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [_attribute("service.name", agent)]},
+                    "scopeSpans": [{"scope": {"name": "musig2_protocols"}, "spans": otlp_spans}],
+                }
+                for agent, otlp_spans in by_agent.items()
+            ]
+        }
+        self._file.write(json.dumps(request, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def _attribute(key: str, value: Any) -> Dict:
+    if isinstance(value, bool):
+        otlp_value = {"boolValue": value}
+    elif isinstance(value, int):
+        # OTLP JSON encodes 64 bit integers as strings
+        otlp_value = {"intValue": str(value)}
+    elif isinstance(value, float):
+        otlp_value = {"doubleValue": value}
+    else:
+        otlp_value = {"stringValue": str(value)}
+    return {"key": key, "value": otlp_value}
+
+
+def _span_to_otlp(span: Span) -> Dict:
+    otlp_span = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_time),
+        "endTimeUnixNano": str(span.end_time),
+        "attributes": [_attribute(key, value) for key, value in span.attributes.items()],
+        "status": {"code": span.status_code},
+    }
+    if span.parent_span_id:
+        otlp_span["parentSpanId"] = span.parent_span_id
+    if span.status_message:
+        otlp_span["status"]["message"] = span.status_message
+    return otlp_span
+
+
+class Tracer:
+    """Creates spans and passes finished ones to an exporter. Disabled until an exporter is set."""
+
+    def __init__(self, exporter: JsonlSpanExporter = None):
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def set_exporter(self, exporter: Optional[JsonlSpanExporter]):
+        """Enable tracing with an exporter, or disable it with None. The previous exporter is flushed."""
+        if self.exporter is not None:
+            self.exporter.flush()
+        self.exporter = exporter
+
+    def start_span(
+        self,
+        name: str,
+        agent: str = None,
+        attributes: Dict[str, Any] = None,
+        parent: Union[Span, Tuple[str, str], None] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        start_time: int = None,
+    ) -> Union[Span, _NoopSpan]:
+        """Start a span. End it with `end()` or use it as a context manager.
+
+        Args:
+            name: The operation name
+            agent: The agent recording the span, inherited from the parent span if not given
+            attributes: Span attributes, None values are dropped
+            parent: A parent span or a (trace_id, span_id) pair from a traceparent header.
+                Defaults to the current span, a new trace is started without one.
+            kind: The OTLP span kind
+            start_time: Start time in Unix epoch nanoseconds, defaults to now
+        """
+        if self.exporter is None:
+            return NOOP_SPAN
+        if parent is None:
+            parent = _current_span.get()
+        if isinstance(parent, Span):
+            trace_id, parent_span_id = parent.trace_id, parent.span_id
+            agent = agent or parent.agent
+        elif parent is not None:
+            trace_id, parent_span_id = parent
+        else:
+            trace_id, parent_span_id = f"{random.getrandbits(128):032x}", None
+        attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+        return Span(self, name, agent, kind, trace_id, parent_span_id, start_time or time.time_ns(), attributes)
+
+    def flush(self):
+        if self.exporter is not None:
+            self.exporter.flush()
+
+    def _export(self, span: Span):
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+
+# Tracer shared by the services and agents in a process
+TRACER = Tracer()
+
+
+def session_attributes(cohort_id: str = None, session_id: str = None) -> Dict[str, str]:
+    """Attributes tying a span to a cohort and signing session."""
+    return {"musig2.cohort_id": cohort_id, "musig2.session_id": session_id}
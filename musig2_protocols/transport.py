@@ -0,0 +1,226 @@
+import ssl
+from typing import Any, Dict, Optional
+from websockets.extensions.permessage_deflate import ClientPerMessageDeflateFactory, ServerPerMessageDeflateFactory
+from .runtime import INTEGER, OPTIONAL_INTEGER, OPTIONAL_NUMBER, OPTIONAL_STRING, check_keys
+from .log import get_logger
+
+
+log = get_logger(__name__)
+
+# websockets' own permessage-deflate settings, used unless a level or window is set
+DEFAULT_WINDOW_BITS = 12
+DEFAULT_MEM_LEVEL = 5
+
+
+class ResumingClientContext(ssl.SSLContext):
+    """Client SSLContext that resumes the last TLS session with each server.
+
+    asyncio does not take a session when it opens a connection, but it wraps
+    the socket with `wrap_bio`, which does. Sessions are kept by server name
+    and handed to the next connection to the same server.
+    """
+
+    def __new__(cls, *args, **kwargs):
+        context = super().__new__(cls, ssl.PROTOCOL_TLS_CLIENT)
+        context.sessions = {}
+        return context
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        if session is None and not server_side:
+            session = self.sessions.get(server_hostname)
+        return super().wrap_bio(incoming, outgoing, server_side, server_hostname, session)
+
+
+class WebsocketTransport:
+    """Websocket settings of a DIDCommService, for its listener and for its connections to other agents.
+
+    The defaults are those of the websockets library. Envelopes are
+    encrypted, so permessage-deflate only saves the base64 overhead of
+    their ciphertext, and every ping costs a frame on every idle connection.
+    """
+
+    KEYS = (
+        "max_size", "max_queue", "write_limit",
+        "compression", "compression_level", "compression_window_bits",
+        "ping_interval", "ping_timeout", "open_timeout", "close_timeout",
+        "tls_certfile", "tls_keyfile", "tls_cafile", "tls_session_tickets",
+    )
+    TYPES = {
+        "max_size": OPTIONAL_INTEGER, "max_queue": OPTIONAL_INTEGER, "write_limit": INTEGER,
+        "compression": (bool,), "compression_level": OPTIONAL_INTEGER, "compression_window_bits": OPTIONAL_INTEGER,
+        "ping_interval": OPTIONAL_NUMBER, "ping_timeout": OPTIONAL_NUMBER, "open_timeout": OPTIONAL_NUMBER, "close_timeout": OPTIONAL_NUMBER,
+        "tls_certfile": OPTIONAL_STRING, "tls_keyfile": OPTIONAL_STRING, "tls_cafile": OPTIONAL_STRING, "tls_session_tickets": INTEGER,
+    }
+
+    def __init__(
+        self,
+        max_size: Optional[int] = 2 ** 20,
+        max_queue: Optional[int] = 16,
+        write_limit: int = 2 ** 15,
+        compression: bool = True,
+        compression_level: int = None,
+        compression_window_bits: int = None,
+        ping_interval: Optional[float] = 20,
+        ping_timeout: Optional[float] = 20,
+        open_timeout: Optional[float] = 10,
+        close_timeout: Optional[float] = 10,
+        tls_certfile: str = None,
+        tls_keyfile: str = None,
+        tls_cafile: str = None,
+        tls_session_tickets: int = 2,
+    ):
+        """Initialize the transport settings.
+
+        Args:
+            max_size: Largest incoming message in bytes, None for no limit. Bounds the envelopes of large cohorts.
+            max_queue: Incoming messages buffered per connection before reading pauses, None for no limit
+            write_limit: Bytes buffered per connection before sends wait for the socket
+            compression: Negotiate permessage-deflate
+            compression_level: zlib level 1-9 of permessage-deflate, websockets' default by default (optional)
+            compression_window_bits: zlib window of permessage-deflate, 9-15, 12 by default (optional)
+            ping_interval: Seconds between keepalive pings on each connection, None to not ping
+            ping_timeout: Seconds to wait for a pong before closing the connection, None to wait forever
+            open_timeout: Seconds to open a connection, including the TLS and websocket handshakes
+            close_timeout: Seconds to wait for a closing handshake
+            tls_certfile: Certificate chain of the listener, PEM (optional)
+            tls_keyfile: Private key of the listener, PEM, if not in tls_certfile (optional)
+            tls_cafile: CAs to verify other agents' certificates with, the system's by default (optional)
+            tls_session_tickets: TLS 1.3 session tickets the listener issues per handshake, 0 to disable resumption
+
+        Raises:
+            ValueError: If a setting is invalid
+        """
+        if max_size is not None and max_size < 1:
+            raise ValueError("max_size must be positive.")
+        if compression_level is not None and not 1 <= compression_level <= 9:
+            raise ValueError("compression_level must be between 1 and 9.")
+        if compression_window_bits is not None and not 9 <= compression_window_bits <= 15:
+            raise ValueError("compression_window_bits must be between 9 and 15.")
+        if tls_keyfile is not None and tls_certfile is None:
+            raise ValueError("tls_keyfile needs tls_certfile.")
+        if tls_session_tickets < 0:
+            raise ValueError("tls_session_tickets must not be negative.")
+        self.max_size = max_size
+        self.max_queue = max_queue
+        self.write_limit = write_limit
+        self.compression = compression
+        self.compression_level = compression_level
+        self.compression_window_bits = compression_window_bits
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.open_timeout = open_timeout
+        self.close_timeout = close_timeout
+        self.tls_certfile = tls_certfile
+        self.tls_keyfile = tls_keyfile
+        self.tls_cafile = tls_cafile
+        self.tls_session_tickets = tls_session_tickets
+        self._server_context: Optional[ssl.SSLContext] = None
+        self._client_context: Optional[ResumingClientContext] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "WebsocketTransport":
+        """Create transport settings from a config section.
+
+        Raises:
+            ValueError: If a setting is unknown or invalid
+        """
+        check_keys("websocket", data, cls.KEYS, cls.TYPES)
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.KEYS}
+
+    def _common_options(self) -> Dict[str, Any]:
+        return {
+            "max_size": self.max_size,
+            "max_queue": self.max_queue,
+            "write_limit": self.write_limit,
+            "ping_interval": self.ping_interval,
+            "ping_timeout": self.ping_timeout,
+            "open_timeout": self.open_timeout,
+            "close_timeout": self.close_timeout,
+        }
+
+    def _compress_settings(self) -> Dict[str, Any]:
+        settings = {"memLevel": DEFAULT_MEM_LEVEL}
+        if self.compression_level is not None:
+            settings["level"] = self.compression_level
+        return settings
+
+    def _tuned_compression(self) -> bool:
+        return self.compression and (self.compression_level is not None or self.compression_window_bits is not None)
+
+    def serve_options(self, tls: bool = False) -> Dict[str, Any]:
+        """Keyword arguments for websockets.serve.
+
+        Args:
+            tls: Listen with TLS, with tls_certfile
+        """
+        options = self._common_options()
+        if not self.compression:
+            options["compression"] = None
+        elif self._tuned_compression():
+            window_bits = self.compression_window_bits or DEFAULT_WINDOW_BITS
+            options["compression"] = None
+            options["extensions"] = [
+                ServerPerMessageDeflateFactory(
+                    server_max_window_bits=window_bits,
+                    client_max_window_bits=window_bits,
+                    compress_settings=self._compress_settings(),
+                )
+            ]
+        if tls:
+            options["ssl"] = self.server_ssl_context()
+        return options
+
+    def connect_options(self, endpoint: str) -> Dict[str, Any]:
+        """Keyword arguments for websockets.connect to an endpoint."""
+        options = self._common_options()
+        if not self.compression:
+            options["compression"] = None
+        elif self._tuned_compression():
+            options["compression"] = None
+            options["extensions"] = [
+                ClientPerMessageDeflateFactory(
+                    client_max_window_bits=self.compression_window_bits or True,
+                    compress_settings=self._compress_settings(),
+                )
+            ]
+        if endpoint.startswith("wss://"):
+            # One context for all connections, so CAs are loaded once and sessions can be resumed
+            options["ssl"] = self.client_ssl_context()
+        return options
+
+    def server_ssl_context(self) -> ssl.SSLContext:
+        """The listener's TLS context, created on first use."""
+        if self._server_context is None:
+            if self.tls_certfile is None:
+                raise ValueError("A TLS listener needs tls_certfile.")
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(self.tls_certfile, self.tls_keyfile)
+            context.num_tickets = self.tls_session_tickets
+            if self.tls_session_tickets == 0:
+                context.options |= ssl.OP_NO_TICKET
+            self._server_context = context
+        return self._server_context
+
+    def client_ssl_context(self) -> ResumingClientContext:
+        """The TLS context of connections to other agents, created on first use."""
+        if self._client_context is None:
+            context = ResumingClientContext()
+            if self.tls_cafile is not None:
+                context.load_verify_locations(self.tls_cafile)
+            else:
+                context.load_default_certs()
+            self._client_context = context
+        return self._client_context
+
+    def remember_session(self, connection) -> None:
+        """Keep the TLS session of a new connection, to resume it when reconnecting to the same server."""
+        transport = getattr(connection, "transport", None)
+        ssl_object = transport.get_extra_info("ssl_object") if transport is not None else None
+        if ssl_object is None or self._client_context is None:
+            return
+        if ssl_object.session is not None and ssl_object.session.has_ticket:
+            self._client_context.sessions[ssl_object.server_hostname] = ssl_object.session
+        log.debug("tls_connected", server=ssl_object.server_hostname, version=ssl_object.version(), resumed=ssl_object.session_reused)
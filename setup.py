@@ -11,5 +11,12 @@ setup(
         "didcomm-messaging[askar, did-peer]",
         "buidl @ git+https://github.com/buidl-bitcoin/buidl-python@c0b7d57"
     ],
+    extras_require={
+        "orjson": ["orjson"],
+        "uvloop": ["uvloop; sys_platform != 'win32'"],
+    },
+    entry_points={
+        "console_scripts": ["musig2-agent=musig2_protocols.launcher:main"],
+    },
     python_requires=">=3.8",
 ) 
\ No newline at end of file
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from buidl.hd import HDPrivateKey, secure_mnemonic
+from buidl.taproot import TapRootMultiSig
+
+from benchmarks.loopback import LoopbackNetwork
+from musig2_protocols.beacon_coordinator import BeaconCoordinator
+from musig2_protocols.beacon_participant import BeaconParticipant
+from musig2_protocols.protocols.keygen.models.cohort import COHORT_SET_STATUS
+from musig2_protocols.protocols.sign.models.signature_authorization import SIGNATURE_COMPLETE, FAILED
+
+pytestmark = pytest.mark.skipif(not hasattr(TapRootMultiSig, "musig_tree"), reason="buidl without MuSig2 support")
+
+PARTICIPANTS = 3
+TIMEOUT = 60
+
+
+async def wait_until(condition, timeout: float = TIMEOUT):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise TimeoutError("Timed out waiting for the protocol.")
+        await asyncio.sleep(0.001)
+
+
+def lose_nonce_secrets_once(participant: BeaconParticipant):
+    """Drop the participant's nonce secrets right after it sends its first nonce contribution."""
+    send_nonce_contribution = participant.send_nonce_contribution
+    lost = []
+
+    async def send_and_forget(cohort, nonce_contribution, signing_session):
+        await send_nonce_contribution(cohort, nonce_contribution, signing_session)
+        if not lost:
+            lost.append(signing_session.id)
+            signing_session.nonce_secrets = None
+
+    participant.send_nonce_contribution = send_and_forget
+    return lost
+
+
+async def restart_after_lost_nonce_secrets():
+    network = LoopbackNetwork()
+    coordinator = await BeaconCoordinator.create(name="Coordinator", port=9500)
+    participants = [
+        await BeaconParticipant.create(root_hdpriv=HDPrivateKey.from_mnemonic(secure_mnemonic()), name=f"Participant-{i}", port=9501 + i)
+        for i in range(PARTICIPANTS)
+    ]
+    actors = [coordinator] + participants
+    for actor in actors:
+        network.attach(actor.didcomm)
+    try:
+        for participant in participants:
+            await participant.subscribe_to_coordinator(coordinator.did)
+        await wait_until(lambda: len(coordinator.subscribers) == PARTICIPANTS)
+
+        cohort = await coordinator.announce_new_cohort(min_participants=PARTICIPANTS)
+        await wait_until(lambda: all(
+            participant.cohorts.get(cohort.id) is not None and participant.cohorts.get(cohort.id).status == COHORT_SET_STATUS
+            for participant in participants
+        ))
+
+        for i, participant in enumerate(participants):
+            await participant.request_cohort_signature(cohort.id, f"update {i}")
+        await wait_until(lambda: len(cohort.pending_signature_requests) == PARTICIPANTS)
+
+        lost = lose_nonce_secrets_once(participants[0])
+        first_session = await coordinator.start_signing_session(cohort.id)
+        await wait_until(lambda: coordinator.active_signing_sessions[cohort.id].status in (SIGNATURE_COMPLETE, FAILED))
+        return first_session, coordinator.active_signing_sessions[cohort.id], lost
+    finally:
+        for actor in actors:
+            await actor.didcomm.cleanup()
+            await actor.didcomm.scheduler.close()
+
+
+def test_restarted_round_reaches_signature_complete():
+    first_session, final_session, lost = asyncio.run(restart_after_lost_nonce_secrets())
+
+    assert lost == [first_session.id]
+    assert final_session.id != first_session.id
+    assert final_session.status == SIGNATURE_COMPLETE
+    assert final_session.processed_requests == first_session.processed_requests